@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+账号批量导入导出
+支持 CSV 和 JSON 两种格式，字段为 account、password、user_name
+"""
+
+import os
+import csv
+import json
+from loguru import logger
+from entity.user import User
+
+# 导入导出使用的字段
+ACCOUNT_FIELDS = ('account', 'password', 'user_name')
+
+# CSV 表头别名（兼容中文表头）
+HEADER_ALIASES = {
+    '资金账号': 'account', '账号': 'account',
+    '密码': 'password',
+    '持有人姓名': 'user_name', '姓名': 'user_name',
+}
+
+
+def _detect_format(path):
+    """根据扩展名判断文件格式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        return 'json'
+    if ext == '.csv':
+        return 'csv'
+    raise ValueError(f"不支持的文件格式: {ext}（仅支持 .csv 和 .json）")
+
+
+def _read_rows(path):
+    """读取原始行数据"""
+    if _detect_format(path) == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError("JSON 文件内容必须是账号数组")
+        return data
+
+    # utf-8-sig 兼容 Excel 导出的带 BOM 文件
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        return [{HEADER_ALIASES.get(key.strip(), key.strip()): value
+                 for key, value in row.items() if key} for row in reader]
+
+
+def validate_record(row):
+    """
+    校验并规范化一条账号记录。
+
+    Args:
+        row (dict): 原始记录。
+
+    Returns:
+        tuple: (记录字典, None) 或 (None, 错误信息)。
+    """
+    if not isinstance(row, dict):
+        return None, "记录格式错误"
+
+    account = str(row.get('account') or '').strip()
+    password = str(row.get('password') or '').strip()
+    user_name = str(row.get('user_name') or '').strip()
+
+    if not account or not password:
+        return None, "账号和密码不能为空"
+    # 账号在券商APP中显示为前4后4、中间打码，少于8位无法匹配
+    if len(account) < 8:
+        return None, f"账号 {account} 长度不足8位"
+    # 密码通过数字键盘输入，只支持数字
+    if not password.isdigit():
+        return None, f"账号 {account} 的密码只能包含数字"
+
+    return {'account': account, 'password': password, 'user_name': user_name}, None
+
+
+def load_accounts_file(path):
+    """
+    读取并校验账号文件。
+
+    Args:
+        path (str): CSV 或 JSON 文件路径。
+
+    Returns:
+        tuple: (有效记录列表, 错误信息列表)。文件内重复的账号只保留第一条。
+    """
+    records = []
+    errors = []
+    seen = set()
+    for line_no, row in enumerate(_read_rows(path), start=1):
+        record, error = validate_record(row)
+        if error:
+            errors.append(f"第 {line_no} 条: {error}")
+            continue
+        if record['account'] in seen:
+            errors.append(f"第 {line_no} 条: 账号 {record['account']} 在文件中重复")
+            continue
+        seen.add(record['account'])
+        records.append(record)
+    return records, errors
+
+
+def import_accounts(path, overwrite=False, chunk_size=500):
+    """
+    从文件批量导入账号。
+
+    Args:
+        path (str): CSV 或 JSON 文件路径。
+        overwrite (bool, optional): 已存在的账号是否覆盖。 Defaults to False.
+        chunk_size (int, optional): 每批写入条数。 Defaults to 500.
+
+    Returns:
+        dict: 导入统计，包含 inserted、updated、skipped、invalid 和 errors。
+    """
+    records, errors = load_accounts_file(path)
+    summary = User.bulk_import(records, overwrite=overwrite, chunk_size=chunk_size)
+    summary['invalid'] = len(errors)
+    summary['errors'] = errors
+    logger.info("导入账号完成: 新增 {}, 覆盖 {}, 跳过 {}, 无效 {}",
+                summary['inserted'], summary['updated'], summary['skipped'], summary['invalid'])
+    return summary
+
+
+def export_accounts(path):
+    """
+    导出全部账号到文件（逐行写出，不一次性加载到内存）。
+
+    Args:
+        path (str): CSV 或 JSON 文件路径。
+
+    Returns:
+        int: 导出的账号数量。
+    """
+    count = 0
+    if _detect_format(path) == 'json':
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('[')
+            for record in User.iter_export():
+                f.write(',\n' if count else '\n')
+                f.write(json.dumps(record, ensure_ascii=False))
+                count += 1
+            f.write('\n]\n')
+    else:
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=ACCOUNT_FIELDS)
+            writer.writeheader()
+            for record in User.iter_export():
+                writer.writerow(record)
+                count += 1
+    logger.info("已导出 {} 个账号到 {}", count, path)
+    return count
+
+
+# 性能测试：python -m account_io
+if __name__ == "__main__":
+    import time
+    import tempfile
+    from entity.base_model import db, create_tables, DB_TIMEOUT
+
+    bench_dir = tempfile.mkdtemp()
+    db.init(os.path.join(bench_dir, 'bench.db'), timeout=DB_TIMEOUT)
+    create_tables([User])
+
+    csv_path = os.path.join(bench_dir, 'accounts.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(ACCOUNT_FIELDS)
+        for i in range(10000):
+            writer.writerow([f"{300000000000 + i}", '123456', f"用户{i}"])
+
+    started = time.perf_counter()
+    result = import_accounts(csv_path)
+    print(f"导入 {result['inserted']} 个账号: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    result = import_accounts(csv_path, overwrite=True)
+    print(f"覆盖导入 {result['updated']} 个账号: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    exported = export_accounts(os.path.join(bench_dir, 'accounts.json'))
+    print(f"导出 {exported} 个账号: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    db.close()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+常驻 adb shell 通道
+每台设备保持一个 `adb shell` 进程，命令写入 stdin，通过结束标记分隔每条命令的输出
+"""
+
+import queue
+import uuid
+import threading
+import subprocess
+from loguru import logger
+
+
+class AdbShellError(Exception):
+    """shell 通道执行失败（进程退出或超时）"""
+
+
+class AdbShellChannel:
+    """单台设备的常驻 shell 通道，可被多个线程共享"""
+
+    def __init__(self, adb_path, serial):
+        """
+        初始化 AdbShellChannel。
+
+        Args:
+            adb_path (str): adb.exe 的路径。
+            serial (str): 设备序列号，例如 127.0.0.1:62001。
+        """
+        self.adb_path = adb_path
+        self.serial = serial
+        self.process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def is_alive(self):
+        """shell 进程是否仍在运行"""
+        return self.process is not None and self.process.poll() is None
+
+    def _open(self):
+        """启动 adb shell 进程和输出读取线程"""
+        self.close()
+        logger.info("打开常驻 adb shell 通道: {}", self.serial)
+        self.process = subprocess.Popen(
+            [self.adb_path, '-s', self.serial, 'shell'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0
+        )
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_output,
+                                  args=(self.process.stdout, self._lines),
+                                  daemon=True)
+        reader.start()
+
+    @staticmethod
+    def _read_output(stream, lines):
+        """后台读取 shell 输出，按行放入队列；进程结束时放入 None"""
+        try:
+            for raw in iter(stream.readline, b''):
+                lines.put(raw.decode('utf-8', errors='ignore').rstrip('\r\n'))
+        except Exception:
+            pass
+        finally:
+            lines.put(None)
+
+    def run(self, command, timeout=10):
+        """
+        在常驻 shell 中执行一条命令。
+
+        Args:
+            command (str): shell 命令，例如 "input tap 100 200"。
+            timeout (float, optional): 等待输出的最长秒数。 Defaults to 10.
+
+        Returns:
+            tuple: (退出码, 输出文本)
+
+        Raises:
+            AdbShellError: shell 进程退出或执行超时。超时后通道会被关闭，下次调用自动重建。
+        """
+        with self._lock:
+            if not self.is_alive():
+                self._open()
+
+            # close() 可能在其他线程（取消回调）中执行并把 self.process 置空，这里只使用本次打开的进程；
+            # 进程被结束后写入失败，或读取线程放入 None，命令随即返回
+            process = self.process
+            marker = f"__ADB_DONE_{uuid.uuid4().hex}__"
+            try:
+                process.stdin.write(f"{command}\necho {marker} $?\n".encode('utf-8'))
+                process.stdin.flush()
+            except (OSError, ValueError) as e:
+                self.close()
+                raise AdbShellError(f"写入 shell 通道失败: {e}")
+
+            output = []
+            lines = self._lines
+            while True:
+                try:
+                    line = lines.get(timeout=timeout)
+                except queue.Empty:
+                    self.close()
+                    raise AdbShellError(f"shell 命令超时 ({timeout}s): {command}")
+                if line is None:
+                    self.close()
+                    raise AdbShellError(f"shell 通道已断开: {command}")
+                # 输出不以换行结尾时（printf、cat 没有末尾换行的文件）标记会接在最后一行后面
+                position = line.find(marker)
+                if position >= 0:
+                    if position:
+                        output.append(line[:position])
+                    code = line[position + len(marker):].strip()
+                    return (int(code) if code.isdigit() else -1), '\n'.join(output)
+                output.append(line)
+
+    def close(self):
+        """关闭 shell 进程并回收。可在其他线程中调用，用于打断正在执行的命令，因此不获取 run() 持有的锁"""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.close()
+                process.kill()
+            process.wait(timeout=5)
+        except Exception as e:
+            logger.warning("关闭 adb shell 通道失败: {}", str(e))
+
+
+_channels = {}
+# 每个通道的使用者（id），最后一个使用者释放时才关闭通道
+_channel_users = {}
+_channels_lock = threading.Lock()
+
+
+def get_shell_channel(adb_path, serial, user=None):
+    """
+    获取（或创建）设备的常驻 shell 通道。
+
+    Args:
+        adb_path (str): adb.exe 的路径。
+        serial (str): 设备序列号。
+        user (object, optional): 使用者，登记后需调用 release_shell_channel 释放。 Defaults to None.
+    """
+    key = (adb_path, serial)
+    with _channels_lock:
+        channel = _channels.get(key)
+        if channel is None:
+            channel = AdbShellChannel(adb_path, serial)
+            _channels[key] = channel
+        if user is not None:
+            _channel_users.setdefault(key, set()).add(id(user))
+        return channel
+
+
+def release_shell_channel(adb_path, serial, user):
+    """
+    释放使用者对通道的登记，没有其他使用者时关闭通道。
+    同一设备可能同时有多个控制器（界面的主控制器、连接检查时临时创建的控制器），
+    临时控制器断开时不能关闭正在被其他控制器使用的通道。
+
+    Args:
+        adb_path (str): adb.exe 的路径。
+        serial (str): 设备序列号。
+        user (object): get_shell_channel 时登记的使用者。
+    """
+    key = (adb_path, serial)
+    with _channels_lock:
+        users = _channel_users.get(key, set())
+        users.discard(id(user))
+        if users:
+            return
+        _channel_users.pop(key, None)
+        channel = _channels.get(key)
+    if channel is not None:
+        channel.close()
+
+
+def close_shell_channels():
+    """关闭全部 shell 通道"""
+    with _channels_lock:
+        channels = list(_channels.values())
+        _channels.clear()
+        _channel_users.clear()
+    for channel in channels:
+        channel.close()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+超时与取消
+CancelToken 从界面一路传到 SimpleEmulator，所有等待和设备调用都会检查它；
+run_process 为子进程加上硬超时，超时或取消时结束整个进程树并回收
+"""
+
+import os
+import signal
+import threading
+import subprocess
+from loguru import logger
+
+# 单次 uiautomator2 RPC 的默认超时（秒）
+RPC_TIMEOUT = 15
+
+# 等待子进程时检查取消的间隔（秒）
+_POLL_INTERVAL = 0.1
+
+
+class Cancelled(Exception):
+    """任务已被取消"""
+
+
+class CancelToken:
+    """协作式取消标记，可被多个线程共享"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """请求取消，并执行已登记的回调（例如关闭 shell 通道）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("执行取消回调失败: {}", str(e))
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """已取消时抛出 Cancelled"""
+        if self._event.is_set():
+            raise Cancelled("任务已取消")
+
+    def sleep(self, seconds):
+        """可被取消打断的 sleep，取消时抛出 Cancelled"""
+        if self._event.wait(seconds):
+            raise Cancelled("任务已取消")
+
+    def on_cancel(self, callback):
+        """登记取消时执行的回调；已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+def _kill_process_tree(process):
+    """结束进程及其子进程（shell=True 时 adb 是 shell 的子进程）"""
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+def run_process(command, timeout, cancel_token=None, shell=True, text=True):
+    """
+    执行外部命令，带硬超时并响应取消。
+
+    Args:
+        command (str | list): 要执行的命令。
+        timeout (float): 最长执行秒数。
+        cancel_token (CancelToken, optional): 取消标记。 Defaults to None.
+        shell (bool, optional): 是否通过 shell 执行。 Defaults to True.
+        text (bool, optional): 输出按 UTF-8 解码为文本，False 时返回原始字节。 Defaults to True.
+
+    Returns:
+        subprocess.CompletedProcess: 执行结果。
+
+    Raises:
+        subprocess.TimeoutExpired: 超时，进程树已被结束并回收。
+        Cancelled: 执行期间被取消，进程树已被结束并回收。
+    """
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    kwargs = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        # 独立进程组，超时时可以连同子进程一起结束
+        kwargs['start_new_session'] = True
+
+    if text:
+        kwargs.update(encoding='utf-8', errors='ignore')
+    process = subprocess.Popen(command, shell=shell, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, **kwargs)
+    remaining = timeout
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=min(_POLL_INTERVAL, max(remaining, 0)))
+            return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            remaining -= _POLL_INTERVAL
+            cancelled = cancel_token is not None and cancel_token.is_cancelled()
+            if not cancelled and remaining > 0:
+                continue
+
+            _kill_process_tree(process)
+            try:
+                # 读完管道并回收子进程，避免僵尸进程
+                process.communicate(timeout=5)
+            except subprocess.TimeoutExpired:
+                logger.warning("进程 {} 结束后仍未退出", process.pid)
+            if cancelled:
+                raise Cancelled(f"命令已取消: {command}")
+            raise subprocess.TimeoutExpired(command, timeout)
+
+
+def guard_device(device, get_token, rpc_timeout=RPC_TIMEOUT):
+    """
+    给 uiautomator2 设备对象的每次 JSON-RPC 调用加上取消检查和默认超时。
+
+    Args:
+        device: uiautomator2 设备对象。
+        get_token (callable): 返回当前 CancelToken 的函数（每个任务的取消标记不同）。
+        rpc_timeout (float, optional): 未指定超时的调用使用的超时秒数。
+
+    Returns:
+        device: 传入的设备对象。
+    """
+    call = getattr(device, '_jsonrpc_call', None)
+    if call is None:
+        return device
+
+    def guarded_call(method, params=None, http_timeout=None, *args, **kwargs):
+        get_token().raise_if_cancelled()
+        return call(method, [] if params is None else params,
+                    http_timeout or rpc_timeout, *args, **kwargs)
+
+    try:
+        device._jsonrpc_call = guarded_call
+    except AttributeError:
+        logger.debug("当前 uiautomator2 版本不支持为 RPC 设置超时")
+    return device
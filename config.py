@@ -149,6 +149,16 @@ class Config:
                     # 确保 _config_data 中有 coordinates，如果没有则添加默认值
                     if "coordinates" not in self._config_data:
                         self._config_data["coordinates"] = self._get_default_coordinates()
+                    if "schedule" not in self._config_data:
+                        self._config_data["schedule"] = self._get_default_schedule()
+                    if "metrics" not in self._config_data:
+                        self._config_data["metrics"] = self._get_default_metrics()
+                    if "profiling" not in self._config_data:
+                        self._config_data["profiling"] = self._get_default_profiling()
+                    if "stall_detector" not in self._config_data:
+                        self._config_data["stall_detector"] = self._get_default_stall_detector()
+                    if "execution" not in self._config_data:
+                        self._config_data["execution"] = self._get_default_execution()
 
             else:
                 # 如果配置文件不存在，初始化 _config_data 并保存
@@ -157,7 +167,12 @@ class Config:
                     "simulator_path": self.default_simulator_path,
                     "broker_package": self.broker_package_name,
                     "simulator_exe_path": self.simulator_exe_path,
-                    "coordinates": self._get_default_coordinates()
+                    "coordinates": self._get_default_coordinates(),
+                    "schedule": self._get_default_schedule(),
+                    "metrics": self._get_default_metrics(),
+                    "profiling": self._get_default_profiling(),
+                    "stall_detector": self._get_default_stall_detector(),
+                    "execution": self._get_default_execution()
                 }
                 self.save_config()
 
@@ -174,7 +189,12 @@ class Config:
             "simulator_path": self.default_simulator_path,
             "broker_package": self.broker_package_name,
             "simulator_exe_path": self.simulator_exe_path,
-            "coordinates": self._get_default_coordinates()
+            "coordinates": self._get_default_coordinates(),
+            "schedule": self._get_default_schedule(),
+            "metrics": self._get_default_metrics(),
+            "profiling": self._get_default_profiling(),
+            "stall_detector": self._get_default_stall_detector(),
+            "execution": self._get_default_execution()
         }
 
     def _get_default_coordinates(self):
@@ -185,6 +205,76 @@ class Config:
             "confirm_x": 197, "confirm_y": 916
         }
 
+    def _get_default_schedule(self):
+        """返回默认定时申购配置"""
+        return {
+            "fire_time": "09:30:00",  # 申购开放时间
+            "lead_seconds": 90,        # 提前多少秒开始启动APP和登录
+            "use_device_clock": False  # 是否按设备时钟计算触发时间
+        }
+
+    def get_schedule(self):
+        """获取定时申购配置（缺失的项使用默认值）"""
+        schedule = self._get_default_schedule()
+        schedule.update(self._config_data.get('schedule', {}))
+        return schedule
+
+    def _get_default_metrics(self):
+        """返回默认运行指标配置"""
+        return {
+            "enabled": True,   # 是否在本机端口提供 /metrics
+            "port": 9108,      # 监听端口（只监听 127.0.0.1）
+            "dump_file": ""    # 每批申购结束后把指标写入该文本文件，留空则不写
+        }
+
+    def get_metrics_config(self):
+        """获取运行指标配置（缺失的项使用默认值）"""
+        metrics = self._get_default_metrics()
+        metrics.update(self._config_data.get('metrics', {}))
+        return metrics
+
+    def _get_default_profiling(self):
+        """返回默认性能分析配置"""
+        return {
+            "mode": "off",             # off / cprofile / sample
+            "output_dir": "profiles",  # 每个任务一份报告
+            "interval": 0.005          # sample 模式的采样间隔（秒）
+        }
+
+    def get_profiling_config(self):
+        """获取性能分析配置（缺失的项使用默认值）"""
+        profiling = self._get_default_profiling()
+        profiling.update(self._config_data.get('profiling', {}))
+        return profiling
+
+    def _get_default_stall_detector(self):
+        """返回默认界面卡顿检测配置"""
+        return {
+            "enabled": True,   # 界面线程卡顿时记录调用栈
+            "threshold": 0.2   # 卡顿阈值（秒）
+        }
+
+    def get_stall_detector_config(self):
+        """获取界面卡顿检测配置（缺失的项使用默认值）"""
+        stall_detector = self._get_default_stall_detector()
+        stall_detector.update(self._config_data.get('stall_detector', {}))
+        return stall_detector
+
+    def _get_default_execution(self):
+        """返回默认申购执行方式配置"""
+        return {
+            "mode": "thread",      # thread: 界面进程内依次执行; process: 每台设备一个子进程
+            "ports": [],           # process 模式使用的设备 adb 端口，留空则使用当前连接的设备
+            "task_timeout": 300,   # process 模式下单个账号的超时秒数，超时后结束并重启该设备的进程
+            "max_restarts": 3      # 设备进程连续重启超过该次数后不再使用
+        }
+
+    def get_execution_config(self):
+        """获取申购执行方式配置（缺失的项使用默认值）"""
+        execution = self._get_default_execution()
+        execution.update(self._config_data.get('execution', {}))
+        return execution
+
     def save_config(self):
         """保存配置到文件"""
         try:
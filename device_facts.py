@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+设备信息缓存
+按设备序列号缓存APP版本、屏幕尺寸和密度、SDK版本、atx-agent 版本，
+设备重启（boot_id 变化）或APP版本变化时失效，申购流程直接读取，不再每个账号查询设备
+"""
+
+import re
+import threading
+from loguru import logger
+from json_store import load_json, update_json
+
+DEVICE_FACTS_FILE = 'device_facts.json'
+
+BOOT_ID_COMMAND = 'cat /proc/sys/kernel/random/boot_id'
+
+# 一次 shell 调用读取全部设备信息，各段之间用分隔行隔开
+_SEPARATOR = '__FACTS_SEP__'
+_DEVICE_COMMANDS = [
+    ('boot_id', BOOT_ID_COMMAND),
+    ('sdk', 'getprop ro.build.version.sdk'),
+    ('size', 'wm size'),
+    ('density', 'wm density'),
+    ('agent_version', '/data/local/tmp/atx-agent version 2>/dev/null'),
+]
+
+
+def _app_version_command(package):
+    return f'dumpsys package {package} | grep -m 1 versionName'
+
+
+def _batch(commands):
+    """把多条命令拼成一条，输出按分隔行切分"""
+    return f'; echo {_SEPARATOR}; '.join(commands)
+
+
+def _split(output, count):
+    parts = [part.strip() for part in output.split(_SEPARATOR)]
+    return parts + [''] * (count - len(parts))
+
+
+def parse_wm_value(output):
+    """解析 wm size / wm density 的输出，有 Override 时以 Override 为准"""
+    values = dict(re.findall(r'(Physical|Override) \w+: (\S+)', output))
+    return values.get('Override') or values.get('Physical')
+
+
+def parse_version_name(output):
+    """解析 dumpsys package 中的 versionName，未安装时返回 None"""
+    match = re.search(r'versionName=(\S+)', output)
+    return match.group(1) if match else None
+
+
+class DeviceFactsCache:
+    """按设备序列号持久化的设备信息"""
+
+    def __init__(self, cache_file=DEVICE_FACTS_FILE):
+        """
+        初始化 DeviceFactsCache。
+
+        Args:
+            cache_file (str, optional): 缓存文件路径。 Defaults to DEVICE_FACTS_FILE.
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._facts = self._load()
+
+    def _load(self):
+        """从缓存文件加载"""
+        return load_json(self.cache_file, '设备信息缓存')
+
+    def _save(self, serial):
+        """把一台设备的信息合并到缓存文件（保留其他设备进程写入的设备），调用方持有锁"""
+        facts = self._facts[serial]
+        data = update_json(self.cache_file, lambda data: data.__setitem__(serial, facts), '设备信息缓存')
+        if data is not None:
+            self._facts = data
+
+    def get(self, serial):
+        """获取已缓存的设备信息，不存在返回 None"""
+        with self._lock:
+            facts = self._facts.get(serial)
+            return dict(facts, apps=dict(facts.get('apps', {}))) if facts else None
+
+    def put(self, serial, facts):
+        """缓存设备信息并立即写入文件"""
+        with self._lock:
+            self._facts[serial] = facts
+            self._save(serial)
+
+    def load(self, serial, shell):
+        """
+        连接设备后调用一次：boot_id 未变且缓存中APP版本未变时直接使用缓存，否则重新读取。
+
+        验证只需一次 shell 调用（读取 boot_id 和已缓存APP的版本号）。
+
+        Args:
+            serial (str): 设备序列号。
+            shell (callable): 在设备上执行 shell 命令并返回输出的函数。
+
+        Returns:
+            dict: 设备信息，包含 boot_id、sdk、screen、density、agent_version、apps。
+        """
+        cached = self.get(serial)
+        if cached:
+            packages = sorted(cached.get('apps', {}))
+            output = shell(_batch([BOOT_ID_COMMAND] + [_app_version_command(p) for p in packages]))
+            boot_id, *versions = _split(output, len(packages) + 1)
+            if boot_id and boot_id == cached.get('boot_id'):
+                apps = {package: parse_version_name(version)
+                        for package, version in zip(packages, versions)}
+                if apps == cached['apps']:
+                    return cached
+                logger.info("{} 的APP版本已变化，重新读取设备信息", serial)
+            else:
+                logger.info("{} 已重启，重新读取设备信息", serial)
+            packages = [package for package, version in cached.get('apps', {}).items() if version]
+        else:
+            packages = []
+
+        return self.refresh(serial, shell, packages)
+
+    def refresh(self, serial, shell, packages=()):
+        """
+        从设备读取全部信息（一次 shell 调用）并写入缓存。
+
+        Args:
+            serial (str): 设备序列号。
+            shell (callable): 执行 shell 命令的函数。
+            packages (iterable, optional): 同时读取版本号的APP包名。
+
+        Returns:
+            dict: 设备信息。
+        """
+        packages = sorted(packages)
+        commands = [command for _, command in _DEVICE_COMMANDS]
+        commands += [_app_version_command(package) for package in packages]
+        values = _split(shell(_batch(commands)), len(commands))
+
+        raw = dict(zip((name for name, _ in _DEVICE_COMMANDS), values))
+        size = parse_wm_value(raw['size'])
+        density = parse_wm_value(raw['density'])
+        facts = {
+            'boot_id': raw['boot_id'],
+            'sdk': int(raw['sdk']) if raw['sdk'].isdigit() else None,
+            'screen': [int(value) for value in size.split('x')] if size else None,
+            'density': int(density) if density and density.isdigit() else None,
+            'agent_version': raw['agent_version'] or None,
+            'apps': {package: parse_version_name(output)
+                     for package, output in zip(packages, values[len(_DEVICE_COMMANDS):])},
+        }
+        logger.info("设备信息 {}: SDK {}，屏幕 {}，密度 {}，atx-agent {}", serial, facts['sdk'],
+                    facts['screen'], facts['density'], facts['agent_version'])
+        if facts['boot_id']:
+            self.put(serial, facts)
+        return facts
+
+    def launch_component(self, serial, shell, package):
+        """
+        获取APP启动页的组件名（包名/Activity），首次解析后缓存，设备信息失效时一并重新解析。
+
+        Args:
+            serial (str): 设备序列号。
+            shell (callable): 执行 shell 命令的函数。
+            package (str): APP包名。
+
+        Returns:
+            str: 例如 "com.hexin.plat.android/.AndroidLogoActivity"，无法解析时返回 None。
+        """
+        facts = self.get(serial)
+        component = (facts or {}).get('launchers', {}).get(package)
+        if component:
+            return component
+
+        output = shell(f'cmd package resolve-activity --brief '
+                       f'-c android.intent.category.LAUNCHER {package}')
+        lines = [line.strip() for line in output.splitlines() if '/' in line]
+        component = lines[-1] if lines else None
+        if facts and component:
+            with self._lock:
+                self._facts[serial].setdefault('launchers', {})[package] = component
+                self._save(serial)
+        return component
+
+    def app_version(self, serial, shell, package):
+        """
+        获取APP版本号：已缓存时直接返回，否则查询一次并写入缓存。
+
+        Args:
+            serial (str): 设备序列号。
+            shell (callable): 执行 shell 命令的函数。
+            package (str): APP包名。
+
+        Returns:
+            str: 版本号，未安装时返回 None。
+        """
+        facts = self.get(serial)
+        if facts and facts.get('apps', {}).get(package):
+            return facts['apps'][package]
+
+        version = parse_version_name(shell(_app_version_command(package)))
+        if facts and version:
+            with self._lock:
+                self._facts[serial].setdefault('apps', {})[package] = version
+                self._save(serial)
+        return version
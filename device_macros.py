@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+设备端宏
+把一串点击写成 shell 脚本推送到设备，整段操作在设备上执行、由设备计时，主机只需一次往返
+"""
+
+# 宏脚本存放目录（adb shell 用户可写）
+MACRO_DIR = '/data/local/tmp'
+
+# 宏名称 -> 脚本内容。脚本执行成功时最后输出 OK
+MACROS = {
+    # 用法: autosub_login.sh 密码框x 密码框y 键盘弹出等待毫秒数 按键间隔毫秒数 登录x 登录y 数字x 数字y ...
+    # 旧版 toolbox 的 sleep 不接受小数，等待一律用整数毫秒：优先 usleep，没有时用向上取整的整数秒 sleep，
+    # 都失败时退出（不在键盘弹出前点击数字），由调用方改为逐个点击输入
+    'autosub_login': '''#!/system/bin/sh
+pause() {
+    usleep $(($1 * 1000)) 2>/dev/null || sleep $((($1 + 999) / 1000)) || exit 4
+}
+fx=$1; fy=$2; keypad_delay=$3; gap=$4; lx=$5; ly=$6
+shift 6
+input tap $fx $fy || exit 1
+pause $keypad_delay
+while [ $# -ge 2 ]; do
+    input tap $1 $2 || exit 2
+    pause $gap
+    shift 2
+done
+input tap $lx $ly || exit 3
+echo OK
+''',
+}
+
+
+def macro_path(name):
+    """宏脚本在设备上的路径"""
+    return f'{MACRO_DIR}/{name}.sh'
+
+
+def push_command(name):
+    """
+    生成把宏脚本写入设备的 shell 命令（通过 heredoc 写入，不需要单独执行 adb push）。
+
+    Args:
+        name (str): 宏名称。
+
+    Returns:
+        str: shell 命令。
+    """
+    path = macro_path(name)
+    return f"cat > {path} <<'__AUTOSUB_EOF__'\n{MACROS[name]}__AUTOSUB_EOF__\nchmod 755 {path}"
+
+
+def login_macro_args(field, submit, key_points, keypad_delay=1.0, gap=0.2):
+    """
+    生成登录宏的参数。
+
+    Args:
+        field (tuple): 密码框中心坐标。
+        submit (tuple): 登录按钮中心坐标。
+        key_points (list): 依次点击的数字键坐标。
+        keypad_delay (float, optional): 点击密码框后等待键盘弹出的秒数。 Defaults to 1.0.
+        gap (float, optional): 两次按键之间的间隔秒数。 Defaults to 0.2.
+
+    Returns:
+        list: 参数列表（等待时间换算为整数毫秒）。
+    """
+    args = [*field, round(keypad_delay * 1000), round(gap * 1000), *submit]
+    for x, y in key_points:
+        args.extend((x, y))
+    return [str(arg) for arg in args]
@@ -0,0 +1,559 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+设备进程池
+每台设备的申购流程在独立的子进程中执行（uiautomator2 会话、阻塞等待都在子进程里），
+某台设备卡死或会话泄漏只影响它自己的进程，多台模拟器可以同时利用多个CPU核。
+
+父进程（界面或命令行）通过管道下发任务、接收日志和结果，结果由父进程保存到数据库；
+任务超时时先请求取消，仍不结束就结束该进程并重启一个新的，任务记为失败（失败步骤 timeout）。
+
+用法: python device_pool.py --ports 62001,62025 [--force] [--timeout 300] [--fake]
+"""
+
+import time
+import queue
+import threading
+import collections
+import multiprocessing
+from multiprocessing import connection
+from loguru import logger
+from cancellation import CancelToken, Cancelled
+from profiling import profile_job
+from issue_calendar import NO_ISSUE_MESSAGE
+from entity.base_model import db_writer
+from entity.subscription_result import SubscriptionResult
+from metrics import ACCOUNTS_PROCESSED, FAILURES, STEP_SECONDS, BATCH_PENDING, DEVICE_WORKER_RESTARTS
+
+# 请求取消后等待任务自行结束的秒数，超过后结束进程
+CANCEL_GRACE = 5
+# 结束进程时等待退出的秒数，超过后强制结束
+KILL_WAIT = 5
+
+RESTART_REASONS = {'timeout': '任务超时', 'exited': '意外退出', 'cancelled': '取消后未结束'}
+
+
+class DeviceSession:
+    """子进程中的设备会话：固定连接一台设备，依次执行申购任务"""
+
+    def __init__(self, simulator_path, port):
+        """
+        初始化 DeviceSession。
+
+        Args:
+            simulator_path (str): 夜神模拟器 bin 目录。
+            port (str): 设备的 adb 端口。
+        """
+        # 在子进程中才导入，父进程不需要 uiautomator2
+        from simple_emulator import SimpleEmulator
+        self.emulator = SimpleEmulator(simulator_path)
+        self.emulator.ports = [port]
+
+    def run(self, task, token):
+        """
+        执行一个申购任务。
+
+        Args:
+            task (dict): 申购参数（与 AdbWorker 的 params 相同）。
+            token (CancelToken): 取消标记。
+
+        Returns:
+            dict: 执行情况，格式同 SimpleEmulator.last_run。
+        """
+        emulator = self.emulator
+        emulator.set_cancel_token(token)
+        emulator.last_run = None
+        try:
+            with profile_job(f"subscribe_{task.get('account', '')}"):
+                if not emulator.ensure_connection():
+                    return {'outcome': 'failed', 'failed_step': 'connect', 'duration': 0, 'steps': {},
+                            'message': '无法连接到设备'}
+                emulator.subscription(task, force=task.get('force', False))
+            return emulator.last_run or {'outcome': 'error', 'failed_step': None, 'duration': 0, 'steps': {}}
+        except Cancelled:
+            return emulator.last_run or {'outcome': 'cancelled', 'failed_step': 'connect', 'duration': 0,
+                                         'steps': {}}
+        except Exception as e:
+            logger.error("申购出错: {}", str(e))
+            return {'outcome': 'error', 'failed_step': emulator.current_step, 'duration': 0, 'steps': {},
+                    'message': str(e)}
+        finally:
+            emulator.set_cancel_token()
+
+    def close(self):
+        self.emulator.disconnect()
+
+
+class FakeSession:
+    """
+    假设备会话，用于在没有设备时调试进程池：每个任务等待固定秒数后成功。
+    账号以 hang 开头时忽略取消一直阻塞（模拟卡死的设备），以 crash 开头时进程直接退出。
+    """
+
+    def __init__(self, simulator_path, port, seconds=1.0):
+        self.port = port
+        self.seconds = seconds
+
+    def run(self, task, token):
+        account = task.get('account', '')
+        started = time.perf_counter()
+        logger.info("假设备 {} 执行账号 {}", self.port, account)
+        if account.startswith('hang'):
+            time.sleep(3600)
+        if account.startswith('crash'):
+            import os
+            os._exit(1)
+        try:
+            token.sleep(self.seconds)
+        except Cancelled:
+            return {'outcome': 'cancelled', 'failed_step': 'fake', 'duration': 0, 'steps': {}}
+        elapsed = round(time.perf_counter() - started, 3)
+        return {'outcome': 'success', 'failed_step': None, 'duration': elapsed, 'steps': {'fake': elapsed}}
+
+    def close(self):
+        pass
+
+
+def worker_main(port, simulator_path, conn, options):
+    """
+    设备子进程入口：收到任务就执行，把日志、开始和结果通过管道发回父进程。
+
+    Args:
+        port (str): 设备的 adb 端口。
+        simulator_path (str): 夜神模拟器 bin 目录。
+        conn (multiprocessing.connection.Connection): 与父进程通信的管道。
+        options (dict): fake（使用假设备）、fake_seconds、profiling（性能分析配置）。
+    """
+    send_lock = threading.Lock()
+
+    def send(kind, payload=None):
+        # 日志可能来自心跳等其他线程，发送需要加锁
+        with send_lock:
+            try:
+                conn.send((kind, payload))
+            except (OSError, EOFError):
+                pass
+
+    # 日志转发给父进程统一输出
+    logger.remove()
+    logger.add(lambda message: send('log', message.record['message']), level='INFO', format='{message}')
+    if options.get('profiling'):
+        import profiling
+        profiling.configure(**options['profiling'])
+
+    tasks = queue.Queue()
+    current = {'token': CancelToken()}
+
+    def listen():
+        # 单独的线程接收父进程的消息，任务执行中也能收到取消请求
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                message = None
+            if message is None:
+                current['token'].cancel()
+                tasks.put(None)
+                return
+            kind, payload = message
+            if kind == 'task':
+                tasks.put(payload)
+            elif kind == 'cancel':
+                current['token'].cancel()
+
+    threading.Thread(target=listen, name="pool-listener", daemon=True).start()
+
+    if options.get('fake'):
+        session = FakeSession(simulator_path, port, options.get('fake_seconds', 1.0))
+    else:
+        session = DeviceSession(simulator_path, port)
+    send('ready')
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            token = current['token'] = CancelToken()
+            send('started')
+            send('result', session.run(task, token))
+    finally:
+        session.close()
+
+
+class DeviceProcess:
+    """父进程中记录的一个设备子进程的状态"""
+
+    def __init__(self, port, process, conn, restarts=0):
+        self.port = port
+        self.process = process
+        self.conn = conn
+        # 已重启的次数，完成一个任务后清零
+        self.restarts = restarts
+        self.ready = False
+        self.retired = False
+        self.task = None
+        # 进程启动或任务开始的时间，用于判断超时
+        self.since = time.monotonic()
+        self.cancel_at = None
+
+
+class DevicePool:
+    """
+    设备进程池：每台设备一个子进程，任务交给空闲的设备执行。
+
+    调用方循环调用 poll() 取得事件，直到 done 为 True；事件为 (类型, 端口, 内容)：
+        log        子进程的日志
+        started    任务开始，内容为任务
+        result     任务结束，内容为 (任务, 执行情况)；进程超时或退出时由池生成
+        restarted  进程已结束并重启，内容为原因
+        retired    进程连续重启失败，不再使用，内容为原因
+    """
+
+    def __init__(self, simulator_path, ports, task_timeout=300, max_restarts=3, options=None):
+        """
+        初始化 DevicePool。
+
+        Args:
+            simulator_path (str): 夜神模拟器 bin 目录。
+            ports (list): 设备的 adb 端口，每个端口一个子进程。
+            task_timeout (float, optional): 单个任务（以及进程启动）的超时秒数。 Defaults to 300.
+            max_restarts (int, optional): 连续重启超过该次数后不再使用该设备。 Defaults to 3.
+            options (dict, optional): 传给子进程的选项，见 worker_main。 Defaults to None.
+        """
+        # spawn 在各平台行为一致，子进程不继承父进程的界面、数据库连接和线程
+        self.context = multiprocessing.get_context('spawn')
+        self.simulator_path = simulator_path
+        self.ports = [str(port) for port in ports]
+        self.task_timeout = task_timeout
+        self.max_restarts = max_restarts
+        self.options = options or {}
+        self.pending = collections.deque()
+        self.devices = {}
+        self.cancelled = False
+
+    def start(self):
+        for port in self.ports:
+            self._spawn(port)
+        logger.info("设备进程池已启动: {}", ', '.join(self.ports))
+
+    def _spawn(self, port, restarts=0):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=worker_main, name=f"device-{port}", daemon=True,
+                                       args=(port, self.simulator_path, child_conn, self.options))
+        process.start()
+        child_conn.close()
+        self.devices[port] = DeviceProcess(port, process, parent_conn, restarts)
+
+    def submit(self, task):
+        """提交一个申购任务（dict，与 AdbWorker 的 params 相同）"""
+        self.pending.append(task)
+
+    @property
+    def running(self):
+        """正在执行的任务数"""
+        return sum(1 for device in self.devices.values() if device.task is not None)
+
+    @property
+    def done(self):
+        """所有任务都已结束"""
+        return not self.pending and not self.running
+
+    def skip_pending(self):
+        """取出所有尚未开始的任务，返回这些任务"""
+        skipped = list(self.pending)
+        self.pending.clear()
+        return skipped
+
+    def cancel(self):
+        """停止：未开始的任务不再执行，正在执行的任务请求取消（超过宽限时间后结束进程）"""
+        self.cancelled = True
+        now = time.monotonic()
+        for device in self.devices.values():
+            if device.task is not None and device.cancel_at is None:
+                self._send(device, ('cancel', None))
+                device.cancel_at = now
+        return self.skip_pending()
+
+    def poll(self, timeout=0.5):
+        """
+        等待并返回事件，同时分派任务、处理超时和意外退出的进程。
+
+        Args:
+            timeout (float, optional): 没有事件时最多等待的秒数。 Defaults to 0.5.
+
+        Returns:
+            list: [(类型, 端口, 内容)]。
+        """
+        events = []
+        self._dispatch(events)
+        live = {device.conn: device for device in self.devices.values() if not device.retired}
+        if live:
+            for conn in connection.wait(list(live), timeout):
+                device = live[conn]
+                try:
+                    while conn.poll():
+                        kind, payload = conn.recv()
+                        events.extend(self._handle(device, kind, payload))
+                except (EOFError, OSError):
+                    events.extend(self._replace(device, 'exited'))
+        elif self.pending:
+            # 没有可用的设备，剩余任务无法执行
+            for task in self.skip_pending():
+                events.append(('result', None, (task, {'outcome': 'failed', 'failed_step': 'worker',
+                                                       'duration': 0, 'steps': {},
+                                                       'message': '没有可用的设备进程'})))
+        events.extend(self._check_timeouts())
+        self._dispatch(events)
+        return events
+
+    def _handle(self, device, kind, payload):
+        if kind == 'ready':
+            device.ready = True
+            device.since = time.monotonic()
+        elif kind == 'started':
+            return [('started', device.port, device.task)]
+        elif kind == 'log':
+            return [('log', device.port, payload)]
+        elif kind == 'result':
+            task, device.task, device.cancel_at = device.task, None, None
+            device.since = time.monotonic()
+            device.restarts = 0
+            return [('result', device.port, (task, payload))]
+        return []
+
+    def _dispatch(self, events):
+        if self.cancelled:
+            return
+        for device in self.devices.values():
+            if not self.pending:
+                return
+            if device.retired or not device.ready or device.task is not None:
+                continue
+            task = self.pending.popleft()
+            if not self._send(device, ('task', task)):
+                self.pending.appendleft(task)
+                events.extend(self._replace(device, 'exited'))
+                continue
+            device.task = task
+            device.since = time.monotonic()
+
+    def _send(self, device, message):
+        try:
+            device.conn.send(message)
+            return True
+        except (OSError, EOFError):
+            return False
+
+    def _check_timeouts(self):
+        events = []
+        now = time.monotonic()
+        for device in list(self.devices.values()):
+            if device.retired:
+                continue
+            if device.cancel_at is not None and now - device.cancel_at > CANCEL_GRACE:
+                overdue = now - device.since > self.task_timeout
+                events.extend(self._replace(device, 'timeout' if overdue else 'cancelled'))
+            elif device.task is not None and device.cancel_at is None \
+                    and now - device.since > self.task_timeout:
+                # 先请求取消，让流程有机会关闭APP；宽限时间内仍不结束再结束进程
+                logger.warning("设备 {} 任务超时（{} 秒），请求取消", device.port, self.task_timeout)
+                self._send(device, ('cancel', None))
+                device.cancel_at = now
+            elif not device.ready and now - device.since > self.task_timeout:
+                events.extend(self._replace(device, 'timeout'))
+            elif not device.process.is_alive():
+                events.extend(self._replace(device, 'exited'))
+        return events
+
+    def _kill(self, device):
+        process = device.process
+        if process.is_alive():
+            process.terminate()
+            process.join(KILL_WAIT)
+            if process.is_alive():
+                process.kill()
+                process.join(KILL_WAIT)
+        device.conn.close()
+
+    def _replace(self, device, reason):
+        """结束进程，把正在执行的任务记为失败，然后重启一个新进程（或不再使用该设备）"""
+        self._kill(device)
+        DEVICE_WORKER_RESTARTS.inc(reason=reason)
+        events = []
+        if device.task is not None:
+            outcome = 'cancelled' if self.cancelled else 'failed'
+            events.append(('result', device.port, (device.task, {
+                'outcome': outcome, 'failed_step': reason,
+                'duration': round(time.monotonic() - device.since, 3), 'steps': {},
+                'message': f"设备进程{RESTART_REASONS[reason]}，已结束",
+            })))
+            device.task = None
+        message = RESTART_REASONS[reason]
+        if self.cancelled or device.restarts >= self.max_restarts:
+            device.retired = True
+            if not self.cancelled:
+                logger.error("设备 {} 进程连续 {} 次重启失败，不再使用", device.port, device.restarts)
+                events.append(('retired', device.port, message))
+        else:
+            logger.warning("设备 {} 进程{}，重启", device.port, message)
+            self._spawn(device.port, device.restarts + 1)
+            events.append(('restarted', device.port, message))
+        return events
+
+    def close(self):
+        """通知所有子进程退出，超时未退出的直接结束"""
+        for device in self.devices.values():
+            if not device.retired:
+                self._send(device, None)
+        deadline = time.monotonic() + KILL_WAIT
+        for device in self.devices.values():
+            if not device.retired:
+                device.process.join(max(deadline - time.monotonic(), 0))
+                self._kill(device)
+        logger.info("设备进程池已关闭")
+
+
+def record_result(task, run_info):
+    """
+    在父进程中保存一个账号的申购结果，并计入运行指标（子进程的指标不会汇总到父进程）。
+
+    Returns:
+        Future: 数据库写线程的 Future，任务没有批次ID时返回 None。
+    """
+    outcome = run_info.get('outcome', 'error')
+    ACCOUNTS_PROCESSED.inc(outcome=outcome)
+    if outcome not in ('success', 'skipped'):
+        FAILURES.inc(step=run_info.get('failed_step') or 'unknown')
+    for step, seconds in (run_info.get('steps') or {}).items():
+        STEP_SECONDS.observe(seconds, step=step)
+    if not task.get('run_id'):
+        return None
+    return db_writer.submit(
+        SubscriptionResult.record,
+        run_id=task['run_id'],
+        account=task.get('account', ''),
+        outcome=outcome,
+        failed_step=run_info.get('failed_step'),
+        duration=run_info.get('duration', 0),
+        message=run_info.get('message'),
+        steps=run_info.get('steps'),
+    )
+
+
+def run_batch(pool, tasks, report=logger.info, cancel_token=None):
+    """
+    把一批任务交给进程池执行，直到全部结束或被取消；结果在本进程保存。
+
+    某个账号确认今天没有可申购的新股后，其余未开始的账号记为跳过（勾选重新申购的任务除外）。
+
+    Args:
+        pool (DevicePool): 已启动的进程池。
+        tasks (list): 申购任务。
+        report (callable, optional): 进度输出，接收一行文字。 Defaults to logger.info.
+        cancel_token (CancelToken, optional): 取消后停止批次。 Defaults to None.
+
+    Returns:
+        collections.Counter: 各结果的账号数，未处理的账号计为 not_started。
+    """
+    for task in tasks:
+        pool.submit(task)
+    counts = collections.Counter()
+
+    def report_failure(done):
+        if done.exception():
+            report(f"保存申购结果失败: {done.exception()}")
+
+    def save(task, run_info):
+        counts[run_info.get('outcome', 'error')] += 1
+        future = record_result(task, run_info)
+        if future:
+            future.add_done_callback(report_failure)
+
+    while not pool.done:
+        if cancel_token and cancel_token.is_cancelled() and not pool.cancelled:
+            counts['not_started'] += len(pool.cancel())
+            report("正在停止申购...")
+        for kind, port, payload in pool.poll():
+            prefix = f"[{port}] " if port else ""
+            if kind == 'log':
+                report(prefix + payload)
+            elif kind == 'started':
+                report(f"{prefix}开始为账号 {payload.get('account')} 执行申购...")
+            elif kind in ('restarted', 'retired'):
+                report(f"{prefix}设备进程{payload}，" + ("已重启" if kind == 'restarted' else "不再使用"))
+            elif kind == 'result':
+                task, run_info = payload
+                save(task, run_info)
+                message = run_info.get('message')
+                report(f"{prefix}账号 {task.get('account')} 申购结束: {run_info.get('outcome', 'error')}"
+                       + (f"（{message}）" if message else ""))
+                if message == NO_ISSUE_MESSAGE and not task.get('force'):
+                    # 今天没有可申购的新股，剩余账号不必再启动APP和登录
+                    skipped = pool.skip_pending()
+                    for task in skipped:
+                        save(task, {'outcome': 'skipped', 'failed_step': None, 'duration': 0, 'steps': {},
+                                    'message': NO_ISSUE_MESSAGE})
+                    if skipped:
+                        report(f"{NO_ISSUE_MESSAGE}，剩余 {len(skipped)} 个账号已跳过")
+        BATCH_PENDING.set(len(pool.pending) + pool.running)
+    BATCH_PENDING.set(0)
+    return counts
+
+
+if __name__ == "__main__":
+    # 不经过界面，用进程池为全部账号执行申购
+    multiprocessing.freeze_support()
+    import argparse
+    from datetime import datetime
+    from config import Config
+    from entity.base_model import create_tables
+    from entity.user import User
+    from entity.subscription_ledger import SubscriptionLedger
+
+    parser = argparse.ArgumentParser(description="用设备进程池为全部账号执行申购")
+    parser.add_argument('--ports', help="设备的 adb 端口，逗号分隔（默认使用配置中的 execution.ports）")
+    parser.add_argument('--timeout', type=float, help="单个账号的超时秒数（默认使用配置）")
+    parser.add_argument('--force', action='store_true', help="重新申购今天已完成的账号")
+    parser.add_argument('--fake', action='store_true', help="使用假设备调试进程池（账号 hang*/crash* 模拟卡死/崩溃）")
+    parser.add_argument('--accounts', help="只处理这些账号，逗号分隔（--fake 时直接作为账号列表）")
+    args = parser.parse_args()
+
+    config = Config()
+    execution = config.get_execution_config()
+    ports = args.ports.split(',') if args.ports else execution['ports']
+    if not ports:
+        parser.error("没有指定设备端口，请使用 --ports 或在配置中设置 execution.ports")
+
+    run_id = datetime.now().strftime('%Y%m%d%H%M%S')
+    if args.fake:
+        accounts = args.accounts.split(',') if args.accounts else [f"fake{i:02d}" for i in range(8)]
+        tasks = [{'account': account, 'force': args.force} for account in accounts]
+    else:
+        create_tables([User, SubscriptionResult, SubscriptionLedger])
+        users = list(User.select())
+        if args.accounts:
+            users = [user for user in users if user.account in args.accounts.split(',')]
+        if not args.force:
+            completed = SubscriptionLedger.completed_accounts()
+            users = [user for user in users if user.account not in completed]
+        tasks = [{'account': user.account, 'password': user.password, 'user_name': user.user_name,
+                  'broker_package': config.get_broker_package_name(), 'run_id': run_id, 'force': args.force}
+                 for user in users]
+
+    pool = DevicePool(config.get_simulator_path(), ports,
+                      task_timeout=args.timeout or execution['task_timeout'],
+                      max_restarts=execution['max_restarts'],
+                      options={'fake': args.fake, 'profiling': config.get_profiling_config()})
+    cancel_token = CancelToken()
+    started = time.perf_counter()
+    pool.start()
+    try:
+        counts = run_batch(pool, tasks, print, cancel_token)
+    except KeyboardInterrupt:
+        cancel_token.cancel()
+        counts = run_batch(pool, [], print, cancel_token)
+    finally:
+        pool.close()
+        db_writer.stop()
+    print(f"{len(tasks)} 个账号，{len(ports)} 台设备，耗时 {time.perf_counter() - started:.1f} 秒: "
+          + '，'.join(f"{outcome} {count}" for outcome, count in sorted(counts.items())))
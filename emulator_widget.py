@@ -9,6 +9,7 @@ import time
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QLabel, QFrame)
 from PyQt6.QtCore import QTimer, QThread, pyqtSignal, Qt
 from loguru import logger
+from ui.screen_preview import AdbFrameSource, ScreenPreview
 
 try:
     import win32gui
@@ -19,6 +20,268 @@ except ImportError:
     logger.warning("win32gui 未安装，无法嵌入模拟器窗口")
 
 
+def is_emulator_running():
+    """检查模拟器是否正在运行"""
+    if not HAS_WIN32:
+        return False
+
+    def enum_windows_callback(hwnd, windows):
+        if win32gui.IsWindowVisible(hwnd):
+            window_title = win32gui.GetWindowText(hwnd)
+
+            # 使用相同的匹配逻辑
+            title_matches = [
+                "夜神模拟器" in window_title,
+                "Nox" in window_title,
+                "NoxPlayer" in window_title,
+                "雷电模拟器" in window_title,
+                "LDPlayer" in window_title,
+                "BlueStacks" in window_title,
+                "Android" in window_title and "Emulator" in window_title
+            ]
+
+            if any(title_matches):
+                windows.append(hwnd)
+        return True
+
+    windows = []
+    win32gui.EnumWindows(enum_windows_callback, windows)
+    result = len(windows) > 0
+    logger.info("模拟器运行检查结果: {}", "运行中" if result else "未运行")
+    return result
+
+
+def find_adb_path():
+    """
+    查找 adb：优先使用配置的模拟器目录，其次是夜神模拟器的默认安装目录，最后是 PATH 中的 adb。
+
+    Returns:
+        str: adb 路径，找不到时返回 None。
+    """
+    import os
+    import shutil
+
+    # 尝试从配置文件读取ADB路径
+    adb_path = None
+    try:
+        import json
+        if os.path.exists('app_config.json'):
+            with open('app_config.json', 'r', encoding='utf-8') as f:
+                config = json.load(f)
+                simulator_path = config.get('simulator_path')
+                if simulator_path:
+                    adb_path = os.path.join(simulator_path, 'adb.exe')
+    except Exception:
+        pass
+
+    # 如果没有配置，使用默认路径
+    if not adb_path or not os.path.exists(adb_path):
+        adb_path = None
+        possible_paths = [
+            "D:\\Program Files\\Nox\\bin\\adb.exe",
+            "C:\\Program Files\\Nox\\bin\\adb.exe",
+            "C:\\Program Files (x86)\\Nox\\bin\\adb.exe"
+        ]
+        for path in possible_paths:
+            if os.path.exists(path):
+                adb_path = path
+                break
+
+    return adb_path or shutil.which('adb')
+
+
+def check_adb_available():
+    """检查ADB是否可用（说明模拟器后台已启动）"""
+    try:
+        import subprocess
+
+        adb_path = find_adb_path()
+        if not adb_path:
+            return False
+
+        # 检查ADB设备连接
+        result = subprocess.run(
+            [adb_path, 'devices'],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+
+        # 检查是否有设备连接
+        if result.returncode == 0:
+            lines = result.stdout.strip().split('\n')
+            for line in lines[1:]:  # 跳过标题行
+                if 'device' in line and 'offline' not in line:
+                    logger.info("检测到ADB设备连接: {}", line.strip())
+                    return True
+
+        return False
+
+    except Exception as e:
+        logger.warning("检查ADB状态失败: {}", str(e))
+        return False
+
+
+def start_emulator():
+    """启动夜神模拟器"""
+    try:
+        import subprocess
+        import os
+
+        # 常见的夜神模拟器安装路径
+        possible_paths = [
+            "D:\\Program Files\\Nox\\bin\\Nox.exe",
+            "C:\\Program Files\\Nox\\bin\\Nox.exe",
+            "C:\\Program Files (x86)\\Nox\\bin\\Nox.exe",
+            "D:\\Nox\\bin\\Nox.exe",
+            "C:\\Nox\\bin\\Nox.exe"
+        ]
+
+        # 尝试从配置文件读取路径
+        try:
+            import json
+            if os.path.exists('app_config.json'):
+                with open('app_config.json', 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                    simulator_path = config.get('simulator_path')
+                    if simulator_path:
+                        nox_exe = os.path.join(simulator_path, '..', 'Nox.exe')
+                        if os.path.exists(nox_exe):
+                            possible_paths.insert(0, nox_exe)
+        except Exception:
+            pass
+
+        # 查找并启动模拟器
+        for nox_path in possible_paths:
+            if os.path.exists(nox_path):
+                logger.info("启动夜神模拟器: {}", nox_path)
+                subprocess.Popen([nox_path], shell=True)
+                return True
+
+        logger.error("未找到夜神模拟器")
+        return False
+
+    except Exception as e:
+        logger.error("启动模拟器失败: {}", str(e))
+        return False
+
+
+def restore_emulator_windows():
+    """恢复所有可能被最小化的模拟器窗口"""
+    if not HAS_WIN32:
+        return
+
+    logger.info("尝试恢复被最小化的模拟器窗口...")
+
+    def enum_windows_callback(hwnd, windows):
+        if win32gui.IsWindow(hwnd):
+            try:
+                window_title = win32gui.GetWindowText(hwnd)
+                class_name = win32gui.GetClassName(hwnd)
+
+                # 检查是否是模拟器相关窗口
+                is_emulator_window = any([
+                    "夜神模拟器" in window_title,
+                    "Nox" in window_title,
+                    "NoxPlayer" in window_title,
+                    class_name == "SnapshotWnd",
+                    "雷电模拟器" in window_title,
+                    "LDPlayer" in window_title,
+                    "BlueStacks" in window_title
+                ])
+
+                if is_emulator_window:
+                    # 检查窗口状态
+                    placement = win32gui.GetWindowPlacement(hwnd)
+                    if placement[1] == win32con.SW_SHOWMINIMIZED:  # 窗口被最小化
+                        logger.info("发现被最小化的模拟器窗口: {} ({})", window_title, class_name)
+                        # 恢复窗口
+                        win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
+                        win32gui.SetForegroundWindow(hwnd)
+                        windows.append(hwnd)
+                    elif not win32gui.IsWindowVisible(hwnd):  # 窗口不可见
+                        logger.info("发现隐藏的模拟器窗口: {} ({})", window_title, class_name)
+                        # 显示窗口
+                        win32gui.ShowWindow(hwnd, win32con.SW_SHOW)
+                        windows.append(hwnd)
+
+            except Exception as e:
+                pass  # 忽略获取窗口信息失败的情况
+        return True
+
+    try:
+        windows = []
+        win32gui.EnumWindows(enum_windows_callback, windows)
+        if windows:
+            logger.info("成功恢复了 {} 个模拟器窗口", len(windows))
+        else:
+            logger.info("没有找到需要恢复的模拟器窗口，尝试启动夜神模拟器主界面")
+            # 尝试启动夜神模拟器主界面
+            try:
+                import subprocess
+                import os
+
+                # 夜神模拟器主程序路径
+                possible_paths = [
+                    "D:\\Program Files\\Nox\\bin\\Nox.exe",
+                    "C:\\Program Files\\Nox\\bin\\Nox.exe",
+                    "C:\\Program Files (x86)\\Nox\\bin\\Nox.exe"
+                ]
+
+                for nox_path in possible_paths:
+                    if os.path.exists(nox_path):
+                        logger.info("启动夜神模拟器主界面: {}", nox_path)
+                        subprocess.Popen([nox_path], shell=False)
+                        break
+                else:
+                    logger.warning("未找到夜神模拟器主程序")
+
+            except Exception as e:
+                logger.error("启动夜神模拟器主界面失败: {}", str(e))
+
+    except Exception as e:
+        logger.error("恢复模拟器窗口时出错: {}", str(e))
+
+
+def probe_emulator():
+    """
+    检查模拟器状态，未运行时启动模拟器（窗口枚举和 adb 调用较慢，需在后台线程执行）。
+
+    Returns:
+        str: 'running' 窗口已存在，'adb' 后台已启动（ADB可用），'started' 已启动模拟器，'failed' 启动失败。
+    """
+    if is_emulator_running():
+        return 'running'
+    if check_adb_available():
+        return 'adb'
+    return 'started' if start_emulator() else 'failed'
+
+
+class EmulatorCheckWorker(QThread):
+    """在后台执行模拟器状态检查、启动和窗口恢复，结果通过信号交回界面线程"""
+    result_ready = pyqtSignal(str, object)  # (任务类型, 结果)
+
+    def __init__(self, task):
+        """
+        初始化 EmulatorCheckWorker。
+
+        Args:
+            task (str): 'probe' 检查并启动模拟器，'adb' 检查ADB设备，'restore' 恢复最小化的模拟器窗口。
+        """
+        super().__init__()
+        self.task = task
+
+    def run(self):
+        if self.task == 'probe':
+            result = probe_emulator()
+        elif self.task == 'adb':
+            result = check_adb_available()
+        else:
+            restore_emulator_windows()
+            result = None
+        self.result_ready.emit(self.task, result)
+
+
 class EmulatorEmbedWorker(QThread):
     """模拟器嵌入工作线程"""
     window_found = pyqtSignal(int)  # 找到窗口时发出信号，传递窗口句柄
@@ -154,6 +417,12 @@ class EmulatorWidget(QWidget):
         super().__init__(parent)
         self.emulator_hwnd = None
         self.embed_worker = None
+        self.check_workers = []  # 正在执行的后台检查任务
+        self.last_embed_error = None
+        # 无法嵌入窗口时改为显示 adb 画面预览
+        self.preview = None
+        self.adb_path = None
+        self.serial = None
         self.setup_ui()
 
         # 自动启动模拟器并嵌入
@@ -196,6 +465,7 @@ class EmulatorWidget(QWidget):
         # 在frame中添加提示标签
         frame_layout = QVBoxLayout(self.emulator_frame)
         frame_layout.setContentsMargins(0, 0, 0, 0)  # 移除边距
+        self.frame_layout = frame_layout
         self.placeholder_label = QLabel("正在启动夜神模拟器...\n请稍候")
         self.placeholder_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.placeholder_label.setStyleSheet("""
@@ -215,168 +485,91 @@ class EmulatorWidget(QWidget):
 
         layout.addWidget(self.emulator_frame, 1)  # 给模拟器区域最大空间
 
+    def set_device(self, adb_path, serial=None):
+        """
+        设置画面预览使用的设备（连接模拟器成功后由主窗口调用）。
+
+        Args:
+            adb_path (str): adb 路径。
+            serial (str, optional): 设备序列号。 Defaults to None.
+        """
+        self.adb_path = adb_path
+        self.serial = serial
+        if self.preview:
+            self.preview.grabber.source.adb_path = adb_path
+            self.preview.grabber.source.serial = serial
+
+    def show_preview(self):
+        """
+        显示 adb 画面预览（不能嵌入模拟器窗口时使用，任何平台都可用）。
+
+        Returns:
+            bool: 是否已显示预览，找不到 adb 时返回 False。
+        """
+        if self.preview is None:
+            adb_path = self.adb_path or find_adb_path()
+            if not adb_path:
+                return False
+            self.preview = ScreenPreview(AdbFrameSource(adb_path, self.serial))
+            self.frame_layout.addWidget(self.preview)
+        self.placeholder_label.hide()
+        self.preview.show()
+        self.status_label.setText("设备画面预览（点击画面可操作设备）")
+        return True
+
     def auto_start_and_embed(self):
         """自动启动模拟器并嵌入 - 智能方案"""
         if not HAS_WIN32:
+            if self.show_preview():
+                return
             self.status_label.setText("模拟器嵌入功能不可用 (需要 pywin32)")
             self.placeholder_label.setText("模拟器嵌入功能需要安装 pywin32 库\n\n请运行: pip install pywin32")
             return
 
         self.status_label.setText("正在检查模拟器状态...")
-
-        # 首先检查模拟器是否已经运行
-        if self.is_emulator_running():
+        self.run_check('probe')
+
+    def run_check(self, task):
+        """在后台线程中执行检查任务，完成后由 on_check_finished 处理结果"""
+        worker = EmulatorCheckWorker(task)
+        worker.result_ready.connect(self.on_check_finished)
+        worker.finished.connect(lambda: self.check_workers.remove(worker))
+        self.check_workers.append(worker)
+        worker.start()
+
+    def on_check_finished(self, task, result):
+        """后台检查完成（界面线程）"""
+        if task == 'probe':
+            self.on_emulator_probed(result)
+        elif task == 'adb':
+            self.show_adb_state(result)
+
+    def on_emulator_probed(self, state):
+        """根据模拟器状态安排恢复窗口和嵌入"""
+        if state == 'running':
             self.status_label.setText("模拟器已运行，正在嵌入...")
             # 即使模拟器在运行，也等待一下确保窗口完全加载
             QTimer.singleShot(5000, self.start_embed_emulator)
+        elif state == 'adb':
+            self.status_label.setText("模拟器后台运行中，正在查找界面...")
+            self.placeholder_label.setText("模拟器正在加载中...\n\n✓ ADB连接已就绪\n✓ 申购功能可用\n\n正在查找主界面...")
+            # ADB可用说明模拟器在启动，立即尝试恢复窗口并查找
+            QTimer.singleShot(2000, self.restore_emulator_windows)  # 2秒后先恢复窗口
+            QTimer.singleShot(5000, self.start_embed_emulator)  # 等待5秒
+        elif state == 'started':
+            self.status_label.setText("正在启动模拟器...")
+            self.placeholder_label.setText("正在启动夜神模拟器...\n这可能需要1-2分钟时间")
+            # 启动后等待更长时间，先恢复窗口再查找
+            QTimer.singleShot(40000, self.restore_emulator_windows)  # 40秒后先恢复窗口
+            QTimer.singleShot(45000, self.start_embed_emulator)  # 等待45秒
         else:
-            # 检查ADB是否可用（说明模拟器后台已启动）
-            if self.check_adb_available():
-                self.status_label.setText("模拟器后台运行中，正在查找界面...")
-                self.placeholder_label.setText("模拟器正在加载中...\n\n✓ ADB连接已就绪\n✓ 申购功能可用\n\n正在查找主界面...")
-                # ADB可用说明模拟器在启动，立即尝试恢复窗口并查找
-                QTimer.singleShot(2000, self.restore_emulator_windows)  # 2秒后先恢复窗口
-                QTimer.singleShot(5000, self.start_embed_emulator)  # 等待5秒
-            else:
-                self.status_label.setText("正在启动模拟器...")
-                self.placeholder_label.setText("正在启动夜神模拟器...\n这可能需要1-2分钟时间")
-                # 启动模拟器
-                if self.start_emulator():
-                    # 启动后等待更长时间，先恢复窗口再查找
-                    QTimer.singleShot(40000, self.restore_emulator_windows)  # 40秒后先恢复窗口
-                    QTimer.singleShot(45000, self.start_embed_emulator)  # 等待45秒
-                else:
-                    self.status_label.setText("模拟器启动失败")
-                    self.placeholder_label.setText("无法启动夜神模拟器\n请检查模拟器是否正确安装")
-
-    def is_emulator_running(self):
-        """检查模拟器是否正在运行"""
-        if not HAS_WIN32:
-            return False
+            self.status_label.setText("模拟器启动失败")
+            self.placeholder_label.setText("无法启动夜神模拟器\n请检查模拟器是否正确安装")
 
-        def enum_windows_callback(hwnd, windows):
-            if win32gui.IsWindowVisible(hwnd):
-                window_title = win32gui.GetWindowText(hwnd)
-
-                # 使用相同的匹配逻辑
-                title_matches = [
-                    "夜神模拟器" in window_title,
-                    "Nox" in window_title,
-                    "NoxPlayer" in window_title,
-                    "雷电模拟器" in window_title,
-                    "LDPlayer" in window_title,
-                    "BlueStacks" in window_title,
-                    "Android" in window_title and "Emulator" in window_title
-                ]
-
-                if any(title_matches):
-                    windows.append(hwnd)
-            return True
-
-        windows = []
-        win32gui.EnumWindows(enum_windows_callback, windows)
-        result = len(windows) > 0
-        logger.info("模拟器运行检查结果: {}", "运行中" if result else "未运行")
-        return result
-
-    def check_adb_available(self):
-        """检查ADB是否可用（说明模拟器后台已启动）"""
-        try:
-            import subprocess
-            import os
-
-            # 尝试从配置文件读取ADB路径
-            adb_path = None
-            try:
-                import json
-                if os.path.exists('app_config.json'):
-                    with open('app_config.json', 'r', encoding='utf-8') as f:
-                        config = json.load(f)
-                        simulator_path = config.get('simulator_path')
-                        if simulator_path:
-                            adb_path = os.path.join(simulator_path, 'adb.exe')
-            except Exception:
-                pass
-
-            # 如果没有配置，使用默认路径
-            if not adb_path or not os.path.exists(adb_path):
-                possible_paths = [
-                    "D:\\Program Files\\Nox\\bin\\adb.exe",
-                    "C:\\Program Files\\Nox\\bin\\adb.exe",
-                    "C:\\Program Files (x86)\\Nox\\bin\\adb.exe"
-                ]
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        adb_path = path
-                        break
-
-            if not adb_path:
-                return False
-
-            # 检查ADB设备连接
-            result = subprocess.run(
-                [adb_path, 'devices'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-
-            # 检查是否有设备连接
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                for line in lines[1:]:  # 跳过标题行
-                    if 'device' in line and 'offline' not in line:
-                        logger.info("检测到ADB设备连接: {}", line.strip())
-                        return True
-
-            return False
-
-        except Exception as e:
-            logger.warning("检查ADB状态失败: {}", str(e))
-            return False
-
-    def start_emulator(self):
-        """启动夜神模拟器"""
-        try:
-            import subprocess
-            import os
-
-            # 常见的夜神模拟器安装路径
-            possible_paths = [
-                "D:\\Program Files\\Nox\\bin\\Nox.exe",
-                "C:\\Program Files\\Nox\\bin\\Nox.exe",
-                "C:\\Program Files (x86)\\Nox\\bin\\Nox.exe",
-                "D:\\Nox\\bin\\Nox.exe",
-                "C:\\Nox\\bin\\Nox.exe"
-            ]
-
-            # 尝试从配置文件读取路径
-            try:
-                import json
-                if os.path.exists('app_config.json'):
-                    with open('app_config.json', 'r', encoding='utf-8') as f:
-                        config = json.load(f)
-                        simulator_path = config.get('simulator_path')
-                        if simulator_path:
-                            nox_exe = os.path.join(simulator_path, '..', 'Nox.exe')
-                            if os.path.exists(nox_exe):
-                                possible_paths.insert(0, nox_exe)
-            except Exception:
-                pass
-
-            # 查找并启动模拟器
-            for nox_path in possible_paths:
-                if os.path.exists(nox_path):
-                    logger.info("启动夜神模拟器: {}", nox_path)
-                    subprocess.Popen([nox_path], shell=True)
-                    return True
-
-            logger.error("未找到夜神模拟器")
-            return False
-
-        except Exception as e:
-            logger.error("启动模拟器失败: {}", str(e))
-            return False
+    def restore_emulator_windows(self):
+        """在后台恢复所有可能被最小化的模拟器窗口"""
+        if HAS_WIN32:
+            self.run_check('restore')
 
     def start_embed_emulator(self):
         """开始嵌入模拟器"""
@@ -426,7 +619,8 @@ class EmulatorWidget(QWidget):
 
         except Exception as e:
             logger.error("嵌入窗口失败: {}", str(e))
-            self.status_label.setText(f"嵌入失败: {str(e)}")
+            if not self.show_preview():
+                self.status_label.setText(f"嵌入失败: {str(e)}")
 
         finally:
             pass  # 按钮已移除，无需操作
@@ -435,34 +629,43 @@ class EmulatorWidget(QWidget):
         """发生错误时的处理"""
         # 检查是否是因为找不到窗口
         if "未找到模拟器窗口" in error_msg:
-            # 检查ADB是否可用
-            if self.check_adb_available():
-                self.status_label.setText("模拟器运行中 (ADB已连接)")
-                self.placeholder_label.setText(
-                    "✓ 模拟器后台运行正常\n"
-                    "✓ ADB连接已建立\n"
-                    "✓ 申购功能完全可用\n\n"
-                    "模拟器主界面可能最小化了\n"
-                    "您可以直接使用左侧的申购功能\n\n"
-                    "如需查看模拟器界面，\n"
-                    "请手动打开夜神模拟器窗口\n\n"
-                    "💡 提示：点击此状态区域可重新尝试嵌入"
-                )
-            else:
-                self.status_label.setText("模拟器连接失败")
-                self.placeholder_label.setText(
-                    f"无法连接到模拟器\n\n"
-                    f"错误信息: {error_msg}\n\n"
-                    f"请检查:\n"
-                    f"1. 夜神模拟器是否已安装\n"
-                    f"2. 模拟器是否正常启动\n"
-                    f"3. 防火墙是否阻止连接\n\n"
-                    f"💡 提示：点击此状态区域可重新尝试"
-                )
+            # 在后台检查ADB是否可用，结果由 show_adb_state 显示
+            self.last_embed_error = error_msg
+            self.status_label.setText("未找到模拟器窗口，正在检查ADB连接...")
+            self.run_check('adb')
         else:
             self.status_label.setText(f"嵌入失败: {error_msg}")
             self.placeholder_label.setText(f"无法嵌入模拟器\n\n{error_msg}\n\n💡 提示：点击此状态区域可重新尝试")
-        
+
+    def show_adb_state(self, adb_available):
+        """找不到模拟器窗口时，根据ADB连接情况给出提示"""
+        error_msg = self.last_embed_error
+        if adb_available and self.show_preview():
+            return
+        if adb_available:
+            self.status_label.setText("模拟器运行中 (ADB已连接)")
+            self.placeholder_label.setText(
+                "✓ 模拟器后台运行正常\n"
+                "✓ ADB连接已建立\n"
+                "✓ 申购功能完全可用\n\n"
+                "模拟器主界面可能最小化了\n"
+                "您可以直接使用左侧的申购功能\n\n"
+                "如需查看模拟器界面，\n"
+                "请手动打开夜神模拟器窗口\n\n"
+                "💡 提示：点击此状态区域可重新尝试嵌入"
+            )
+        else:
+            self.status_label.setText("模拟器连接失败")
+            self.placeholder_label.setText(
+                f"无法连接到模拟器\n\n"
+                f"错误信息: {error_msg}\n\n"
+                f"请检查:\n"
+                f"1. 夜神模拟器是否已安装\n"
+                f"2. 模拟器是否正常启动\n"
+                f"3. 防火墙是否阻止连接\n\n"
+                f"💡 提示：点击此状态区域可重新尝试"
+            )
+
     def embed_window(self, hwnd):
         """嵌入窗口"""
         if not HAS_WIN32:
@@ -553,6 +756,8 @@ class EmulatorWidget(QWidget):
 
             # 保存窗口句柄
             self.emulator_hwnd = hwnd
+            if self.preview:
+                self.preview.hide()
             self.status_label.setText("模拟器已嵌入")
 
             logger.info("模拟器窗口嵌入成功")
@@ -677,82 +882,6 @@ class EmulatorWidget(QWidget):
         # 重新启动嵌入过程
         QTimer.singleShot(2000, self.start_embed_emulator)
 
-    def restore_emulator_windows(self):
-        """恢复所有可能被最小化的模拟器窗口"""
-        if not HAS_WIN32:
-            return
-
-        logger.info("尝试恢复被最小化的模拟器窗口...")
-
-        def enum_windows_callback(hwnd, windows):
-            if win32gui.IsWindow(hwnd):
-                try:
-                    window_title = win32gui.GetWindowText(hwnd)
-                    class_name = win32gui.GetClassName(hwnd)
-
-                    # 检查是否是模拟器相关窗口
-                    is_emulator_window = any([
-                        "夜神模拟器" in window_title,
-                        "Nox" in window_title,
-                        "NoxPlayer" in window_title,
-                        class_name == "SnapshotWnd",
-                        "雷电模拟器" in window_title,
-                        "LDPlayer" in window_title,
-                        "BlueStacks" in window_title
-                    ])
-
-                    if is_emulator_window:
-                        # 检查窗口状态
-                        placement = win32gui.GetWindowPlacement(hwnd)
-                        if placement[1] == win32con.SW_SHOWMINIMIZED:  # 窗口被最小化
-                            logger.info("发现被最小化的模拟器窗口: {} ({})", window_title, class_name)
-                            # 恢复窗口
-                            win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-                            win32gui.SetForegroundWindow(hwnd)
-                            windows.append(hwnd)
-                        elif not win32gui.IsWindowVisible(hwnd):  # 窗口不可见
-                            logger.info("发现隐藏的模拟器窗口: {} ({})", window_title, class_name)
-                            # 显示窗口
-                            win32gui.ShowWindow(hwnd, win32con.SW_SHOW)
-                            windows.append(hwnd)
-
-                except Exception as e:
-                    pass  # 忽略获取窗口信息失败的情况
-            return True
-
-        try:
-            windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)
-            if windows:
-                logger.info("成功恢复了 {} 个模拟器窗口", len(windows))
-            else:
-                logger.info("没有找到需要恢复的模拟器窗口，尝试启动夜神模拟器主界面")
-                # 尝试启动夜神模拟器主界面
-                try:
-                    import subprocess
-                    import os
-
-                    # 夜神模拟器主程序路径
-                    possible_paths = [
-                        "D:\\Program Files\\Nox\\bin\\Nox.exe",
-                        "C:\\Program Files\\Nox\\bin\\Nox.exe",
-                        "C:\\Program Files (x86)\\Nox\\bin\\Nox.exe"
-                    ]
-
-                    for nox_path in possible_paths:
-                        if os.path.exists(nox_path):
-                            logger.info("启动夜神模拟器主界面: {}", nox_path)
-                            subprocess.Popen([nox_path], shell=False)
-                            break
-                    else:
-                        logger.warning("未找到夜神模拟器主程序")
-
-                except Exception as e:
-                    logger.error("启动夜神模拟器主界面失败: {}", str(e))
-
-        except Exception as e:
-            logger.error("恢复模拟器窗口时出错: {}", str(e))
-            
     def resizeEvent(self, event):
         """窗口大小改变时调整模拟器窗口"""
         super().resizeEvent(event)
@@ -764,4 +893,8 @@ class EmulatorWidget(QWidget):
         if self.embed_worker and self.embed_worker.isRunning():
             self.embed_worker.stop()
             self.embed_worker.wait()
+        for worker in list(self.check_workers):
+            worker.wait(5000)
+        if self.preview:
+            self.preview.stop()
         super().closeEvent(event)
@@ -1,12 +1,248 @@
 import peewee
 import os
+import queue
+import threading
+from concurrent.futures import Future
+from loguru import logger
 
 # 数据库路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(current_dir, 'mydatabase.db')
 
-db = peewee.SqliteDatabase(db_path)
+# 连接参数：WAL 模式允许读写并发，synchronous=normal 在 WAL 下已足够安全
+DB_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -16 * 1024,  # 16MB 页缓存
+    'temp_store': 'memory',
+    'foreign_keys': 1,
+}
+# 数据库被锁时的最长等待秒数
+DB_TIMEOUT = 10
+
+# 连接按线程保存（thread_safe 默认开启），每个线程使用自己的连接
+db = peewee.SqliteDatabase(db_path, pragmas=DB_PRAGMAS, timeout=DB_TIMEOUT)
 
 class BaseModel(peewee.Model):
     class Meta:
-        database = db
\ No newline at end of file
+        database = db
+
+
+def write_transaction(database=None):
+    """
+    写事务：开始时就获取写锁（BEGIN IMMEDIATE）。
+
+    普通事务先读后写时需要把读锁升级为写锁，与其他写入者冲突时 SQLite 直接返回
+    "database is locked"，不会按 busy timeout 等待；一开始就获取写锁则会正常排队等待。
+    """
+    return (database or db).atomic(lock_type='IMMEDIATE')
+
+
+class DatabaseWriter:
+    """
+    单独的写线程：后台线程的写操作放入队列，由该线程依次执行。
+
+    调用方只需要入队，不会因为等待数据库锁而阻塞；所有后台写入串行执行，
+    多个设备线程同时保存结果也不会出现 "database is locked"。
+    队列中积压的多条写操作合并到一个事务中提交，每条使用独立的保存点，互不影响。
+    """
+
+    # 一个事务中最多合并的写操作数
+    batch_size = 100
+
+    def __init__(self, database=None):
+        """
+        初始化 DatabaseWriter。
+
+        Args:
+            database (peewee.SqliteDatabase, optional): 数据库，默认使用全局 db。
+        """
+        self.database = database or db
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        提交一个写操作。
+
+        Args:
+            func (callable): 在写线程中执行的函数，例如 SubscriptionResult.record。
+
+        Returns:
+            concurrent.futures.Future: 执行结果，需要时可以调用 result() 等待。
+        """
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((future, func, args, kwargs))
+        return future
+
+    def flush(self, timeout=None):
+        """等待此前提交的写操作全部完成"""
+        self.submit(lambda: None).result(timeout)
+
+    def stop(self, timeout=5):
+        """处理完队列中的写操作后停止写线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join(timeout)
+
+    def _run(self):
+        self.database.connect(reuse_if_open=True)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    return
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._execute(batch)
+                        return
+                    batch.append(item)
+                self._execute(batch)
+        finally:
+            self.database.close()
+
+    def _execute(self, batch, retry=True):
+        """在一个写事务中执行一批写操作；事务失败（例如等待写锁超时）时整批重试一次"""
+        done = []
+        try:
+            with write_transaction(self.database):
+                for future, func, args, kwargs in batch:
+                    # 重试时跳过已经失败或已取消的写操作
+                    if future.done():
+                        continue
+                    if not future.running() and not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with self.database.atomic():
+                            result = func(*args, **kwargs)
+                        done.append((future, result))
+                    except Exception as e:
+                        logger.error("数据库写入失败: {}", str(e))
+                        future.set_exception(e)
+        except Exception as e:
+            # 事务没有开始或提交失败：本批的写操作都没有生效
+            pending = [item for item in batch if not item[0].done()]
+            if retry and pending:
+                logger.warning("数据库事务失败，重试一次: {}", str(e))
+                self._execute(pending, retry=False)
+                return
+            logger.error("数据库事务提交失败: {}", str(e))
+            for future, *_ in pending:
+                future.set_exception(e)
+            return
+        for future, result in done:
+            future.set_result(result)
+
+
+# 全局写线程，后台线程保存数据时使用
+db_writer = DatabaseWriter()
+
+
+def create_tables(models):
+    """
+    启动时统一创建表和索引，只需调用一次。
+
+    旧数据中存在重复记录时对应的唯一索引无法创建：其余的表和索引照常创建，
+    最后抛出 IntegrityError 提示清理重复数据（缺少唯一索引时按账号去重和 upsert 都会失效）。
+
+    Args:
+        models (list): 需要创建的模型类列表。
+
+    Raises:
+        peewee.IntegrityError: 有唯一索引因重复数据无法创建。
+    """
+    failed = []
+    for model in models:
+        model._schema.create_table(safe=True)
+        for index in model._meta.fields_to_index():
+            try:
+                db.execute(model._schema._create_index(index, safe=True))
+            except peewee.IntegrityError as e:
+                logger.error("表 {} 的唯一索引 {} 创建失败，请清理重复数据: {}",
+                             model._meta.table_name, index._name, str(e))
+                failed.append(f"{model._meta.table_name}.{index._name}")
+    if failed:
+        raise peewee.IntegrityError(f"存在重复数据，唯一索引无法创建: {', '.join(failed)}，请清理重复数据后重新启动")
+
+
+if __name__ == "__main__":
+    # 并发写入压力测试: python -m entity.base_model [线程数] [每线程写入数]
+    import sys
+    import time
+    import tempfile
+    from entity.subscription_result import SubscriptionResult
+
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    # 以 -m 运行时本模块与 entity.base_model 是两个模块对象，模型需要显式绑定到这里的 db
+    db.init(os.path.join(tempfile.mkdtemp(), 'stress.db'), pragmas=DB_PRAGMAS, timeout=DB_TIMEOUT)
+    db.bind([SubscriptionResult])
+    create_tables([SubscriptionResult])
+
+    errors = []
+    read_latency = []
+    stop_reading = threading.Event()
+
+    def queued_writer(index):
+        # 模拟设备线程：通过写线程保存结果
+        futures = [db_writer.submit(SubscriptionResult.record, run_id='stress', account=f'q{index}-{n}',
+                                    outcome='success', duration=1.0, steps={'login': 0.5})
+                   for n in range(per_thread)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(str(e))
+
+    def direct_writer(index):
+        # 模拟直接写库的线程：每次一个 IMMEDIATE 事务
+        with db.connection_context():
+            for n in range(per_thread):
+                try:
+                    with write_transaction():
+                        SubscriptionResult.record(run_id='stress', account=f'd{index}-{n}', outcome='failed')
+                except Exception as e:
+                    errors.append(str(e))
+
+    def reader():
+        with db.connection_context():
+            while not stop_reading.is_set():
+                start = time.perf_counter()
+                SubscriptionResult.select().where(SubscriptionResult.run_id == 'stress').count()
+                read_latency.append(time.perf_counter() - start)
+                time.sleep(0.005)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=queued_writer, args=(i,)) for i in range(threads_count)]
+    workers += [threading.Thread(target=direct_writer, args=(i,)) for i in range(threads_count // 2)]
+    reading = threading.Thread(target=reader)
+    reading.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    db_writer.stop()
+    stop_reading.set()
+    reading.join()
+    elapsed = time.perf_counter() - started
+
+    expected = (threads_count + threads_count // 2) * per_thread
+    with db.connection_context():
+        written = SubscriptionResult.select().count()
+    locked = sum('locked' in error for error in errors)
+    print(f"写入 {written}/{expected} 条，用时 {elapsed:.2f}s，{written / elapsed:.0f} 条/秒")
+    print(f"错误 {len(errors)} 个（database is locked: {locked} 个）")
+    print(f"读取 {len(read_latency)} 次，最长 {max(read_latency) * 1000:.1f}ms")
@@ -0,0 +1,46 @@
+import peewee
+from datetime import date, datetime
+
+from entity.base_model import BaseModel, write_transaction
+
+
+# 申购台账：每个账号每个交易日一条，申购成功后写入，重跑批次时据此跳过已完成的账号
+class SubscriptionLedger(BaseModel):
+    # 主键
+    id = peewee.AutoField(primary_key=True)
+    # 资金账号
+    account = peewee.CharField()
+    # 交易日
+    trade_date = peewee.DateField(default=date.today)
+    # 完成申购的批次ID
+    run_id = peewee.CharField(null=True)
+    # 完成时间
+    completed_at = peewee.DateTimeField(default=datetime.now)
+
+    # 指定表名称和索引
+    class Meta:
+        table_name = 't_subscription_ledger'
+        indexes = (
+            (('account', 'trade_date'), True),
+        )
+
+    # 账号在某个交易日是否已完成申购
+    @classmethod
+    def is_completed(cls, account, day=None):
+        day = day or date.today()
+        return cls.select().where((cls.account == account) & (cls.trade_date == day)).exists()
+
+    # 某个交易日已完成申购的账号集合
+    @classmethod
+    def completed_accounts(cls, day=None):
+        day = day or date.today()
+        return {row.account for row in cls.select(cls.account).where(cls.trade_date == day)}
+
+    # 标记账号已完成申购；重复标记不会报错，保留第一次的记录
+    @classmethod
+    def mark_completed(cls, account, run_id=None, day=None):
+        with write_transaction(cls._meta.database):
+            return (cls.insert(account=account, trade_date=day or date.today(), run_id=run_id,
+                               completed_at=datetime.now())
+                    .on_conflict_ignore()
+                    .execute())
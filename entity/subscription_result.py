@@ -0,0 +1,84 @@
+import json
+import peewee
+from datetime import date, datetime
+
+from entity.base_model import BaseModel
+
+
+# 申购结果记录
+class SubscriptionResult(BaseModel):
+    # 主键
+    id = peewee.AutoField(primary_key=True)
+    # 批次ID，同一次"开始自动申购"的所有账号共用
+    run_id = peewee.CharField(index=True)
+    # 资金账号
+    account = peewee.CharField()
+    # 执行日期
+    run_date = peewee.DateField(default=date.today)
+    # 完成时间
+    created_at = peewee.DateTimeField(default=datetime.now)
+    # 结果：success / failed / error / cancelled / skipped
+    outcome = peewee.CharField()
+    # 失败时所在的步骤
+    failed_step = peewee.CharField(null=True)
+    # 总耗时（秒）
+    duration = peewee.FloatField(default=0)
+    # 附加信息
+    message = peewee.TextField(null=True)
+    # 各步骤耗时，JSON 格式 {步骤: 秒}
+    steps = peewee.TextField(null=True)
+
+    # 指定表名称和索引
+    class Meta:
+        table_name = 't_subscription_result'
+        indexes = (
+            (('account', 'run_date'), False),
+        )
+
+    # 记录一次申购结果
+    @classmethod
+    def record(cls, run_id, account, outcome, failed_step=None, duration=0, message=None, steps=None):
+        return cls.create(run_id=run_id, account=account, outcome=outcome,
+                          failed_step=failed_step, duration=duration, message=message,
+                          steps=json.dumps(steps, ensure_ascii=False) if steps else None)
+
+    # 查询某天每个账号的最新结果，返回 {账号: 结果}
+    @classmethod
+    def today_status(cls, day=None):
+        day = day or date.today()
+        latest = (cls.select(peewee.fn.MAX(cls.id))
+                  .where(cls.run_date == day)
+                  .group_by(cls.account))
+        return {result.account: result for result in cls.select().where(cls.id.in_(latest))}
+
+    # 查询某个账号的历史结果（按时间倒序）
+    @classmethod
+    def history(cls, account, limit=30):
+        return (cls.select()
+                .where(cls.account == account)
+                .order_by(cls.run_date.desc(), cls.id.desc())
+                .limit(limit))
+
+    # 最近一个批次的ID
+    @classmethod
+    def latest_run_id(cls):
+        latest = cls.select(cls.run_id).order_by(cls.id.desc()).first()
+        return latest.run_id if latest else None
+
+    # 逐行读取某个批次的结果（按完成顺序），attempts 为该账号当天截至本条的申购次数
+    # 使用游标迭代，不会一次性把整个批次读入内存
+    @classmethod
+    def iter_run(cls, run_id):
+        earlier = cls.alias()
+        attempts = (earlier.select(peewee.fn.COUNT(earlier.id))
+                    .where((earlier.account == cls.account)
+                           & (earlier.run_date == cls.run_date)
+                           & (earlier.id <= cls.id)))
+        query = (cls.select(cls, attempts.alias('attempts'))
+                 .where(cls.run_id == run_id)
+                 .order_by(cls.id))
+        return query.iterator()
+
+    # 解析步骤耗时
+    def step_times(self):
+        return json.loads(self.steps) if self.steps else {}
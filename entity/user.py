@@ -1,25 +1,19 @@
 import peewee
 
-from entity.base_model import BaseModel
+from entity.base_model import BaseModel, write_transaction
 
 
 # 用户类
 class User(BaseModel):
     # 主键
     id = peewee.AutoField(primary_key=True)
-    # 账户名
-    account = peewee.CharField()
+    # 账户名（唯一索引，按账号查询和查重都走索引）
+    account = peewee.CharField(unique=True)
     # 密码
     password = peewee.CharField()
     # 姓名
     user_name = peewee.CharField()
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # 在模型初始化时检查表是否存在
-        if not User.table_exists():
-            super()._meta.database.create_tables([User])
-
     # 指定表名称
     class Meta:
         table_name = 't_user'  # 指定表名称
@@ -38,5 +32,89 @@ class User(BaseModel):
     @classmethod
     def get_all_user(cls):
         return cls.select()
+
+    # 批量导入用户
+    @classmethod
+    def bulk_import(cls, records, overwrite=False, chunk_size=500):
+        """
+        在单个事务中分批导入用户。
+
+        每批先用一次 IN 查询找出已存在的账号，再用一条 insert_many 写入。
+
+        Args:
+            records (list): 字典列表，包含 account、password、user_name。
+            overwrite (bool, optional): 账号已存在时是否覆盖密码和姓名。 Defaults to False.
+            chunk_size (int, optional): 每批条数（受 SQLite 变量数量限制）。 Defaults to 500.
+
+        Returns:
+            dict: {'inserted': 新增数, 'updated': 覆盖数, 'skipped': 跳过数}
+        """
+        summary = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        with write_transaction(cls._meta.database):
+            for start in range(0, len(records), chunk_size):
+                chunk = records[start:start + chunk_size]
+                accounts = [record['account'] for record in chunk]
+                existing = {account for (account,) in
+                            cls.select(cls.account).where(cls.account.in_(accounts)).tuples()}
+
+                if overwrite:
+                    (cls.insert_many(chunk)
+                        .on_conflict(conflict_target=[cls.account],
+                                     preserve=[cls.password, cls.user_name])
+                        .execute())
+                    summary['updated'] += len(existing)
+                    summary['inserted'] += len(chunk) - len(existing)
+                else:
+                    new_records = [record for record in chunk if record['account'] not in existing]
+                    if new_records:
+                        cls.insert_many(new_records).execute()
+                    summary['inserted'] += len(new_records)
+                    summary['skipped'] += len(existing)
+        return summary
+
+    # 按主键顺序流式导出用户
+    @classmethod
+    def iter_export(cls):
+        query = (cls.select(cls.account, cls.password, cls.user_name)
+                 .order_by(cls.id)
+                 .dicts())
+        return query.iterator()
 #User.create_user(302319669271,280114,"雷国荣")
-#User.delete_by_id(6)
\ No newline at end of file
+#User.delete_by_id(6)
+
+
+# 性能测试：python -m entity.user
+if __name__ == "__main__":
+    import os
+    import time
+    import tempfile
+    from entity.base_model import db, create_tables, DB_PRAGMAS, DB_TIMEOUT
+
+    count = 10000
+    bench_dir = tempfile.mkdtemp()
+    db.init(os.path.join(bench_dir, 'bench.db'), pragmas=DB_PRAGMAS, timeout=DB_TIMEOUT)
+    create_tables([User])
+
+    rows = [{'account': f"{300000000000 + i}", 'password': '123456', 'user_name': f"用户{i}"}
+            for i in range(count)]
+    with db.atomic():
+        for start in range(0, count, 500):
+            User.insert_many(rows[start:start + 500]).execute()
+
+    started = time.perf_counter()
+    users = list(User.select())
+    load_cost = time.perf_counter() - started
+    print(f"加载 {len(users)} 个账号: {load_cost * 1000:.1f} ms")
+
+    # 旧实现在每个实例化的模型上执行一次 table_exists()
+    started = time.perf_counter()
+    for _ in users:
+        User.table_exists()
+    print(f"旧实现额外的 table_exists 查询开销: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    for i in range(0, count, 10):
+        User.get_user_by_account(f"{300000000000 + i}")
+    print(f"按账号查询 {count // 10} 次: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    db.close()
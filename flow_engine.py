@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+声明式申购流程引擎
+根据 flows.py 中的状态定义执行申购，启动时先识别当前屏幕，直接跳到对应步骤
+"""
+
+import time
+from loguru import logger
+from device_macros import login_macro_args
+
+
+class FlowEngine:
+    """按流程定义驱动 SimpleEmulator 执行申购"""
+
+    # 等待状态时的轮询间隔（秒）
+    poll_interval = 0.3
+
+    def __init__(self, emulator, flow):
+        """
+        初始化 FlowEngine。
+
+        Args:
+            emulator (SimpleEmulator): 已连接的模拟器对象。
+            flow (dict): 流程定义，见 flows.py。
+        """
+        self.emulator = emulator
+        self.flow = flow
+        self.package = flow['package']
+        self.states = flow['states']
+        self.selectors = emulator.get_selectors(self.package)
+        # run 在 stop_before 处暂停时对应的状态
+        self.paused_state = None
+        # run 因 empty 选择器提前结束时对应的状态（例如今天没有可申购的新股）
+        self.empty_state = None
+        # 当前APP版本，备选选择器按该版本的历史命中排序
+        self.app_version = None
+        # 已输入密码并点击登录时对应的密码框选择器，用于判断登录是否失败
+        self.password_field = None
+
+    @property
+    def device(self):
+        return self.emulator.device
+
+    def is_foreground(self):
+        """APP是否在前台"""
+        try:
+            return self.device.app_current().get('package') == self.package
+        except Exception:
+            return False
+
+    def detect_state(self, context):
+        """
+        识别当前屏幕所处的状态。
+
+        APP不在前台时从头开始；否则获取一次界面层级，从流程末尾往前匹配，
+        命中的最靠后的状态即为起点。依赖账号的状态只有会话账号一致时才会命中。
+
+        Args:
+            context (dict): 本次申购的上下文。
+
+        Returns:
+            int: 起始状态的下标。
+        """
+        if not self.is_foreground():
+            return 0
+
+        first_detectable = next((index for index, state in enumerate(self.states)
+                                 if state.get('detect')), 0)
+        try:
+            hierarchy = self.device.dump_hierarchy()
+        except Exception as e:
+            logger.warning("获取界面层级失败: {}", str(e))
+            return first_detectable
+
+        for index in range(len(self.states) - 1, first_detectable - 1, -1):
+            state = self.states[index]
+            if not state.get('detect'):
+                continue
+            if state.get('account_bound') and self.emulator.session_account != context['account']:
+                continue
+            if self.selectors.find_in_hierarchy(hierarchy, state['detect']):
+                return index
+        return first_detectable
+
+    def run(self, context, stop_before=None):
+        """
+        执行流程。
+
+        Args:
+            context (dict): 本次申购的上下文（account、password、masked_account、app_version）。
+            stop_before (str, optional): 到达该状态时停止，不执行它的动作（用于提前就位）。
+
+        Returns:
+            bool: 流程是否全部完成（或已到达 stop_before 状态）。
+        """
+        self.app_version = context.get('app_version')
+        start = self.detect_state(context)
+        if start:
+            logger.info("当前已处于 {} 状态，跳过之前的步骤", self.states[start]['name'])
+
+        for state in self.states[start:]:
+            name = state['name']
+            self.emulator.begin_step(name)
+
+            if state.get('detect'):
+                hit = self.wait_for_state(state)
+                if not hit:
+                    logger.error("等待{}状态超时 ({}秒)", name, state.get('timeout', 10))
+                    self.check_login_failed()
+                    return False
+                # 输入密码后的下一个状态已出现，登录成功
+                self.password_field = None
+                if hit in state.get('empty', ()):
+                    logger.info("{} 状态无事可做 ({})，流程结束", name, hit)
+                    self.empty_state = state
+                    return False
+
+            if name == stop_before:
+                logger.info("已到达 {} 状态，暂停流程", name)
+                self.paused_state = state
+                return True
+
+            action = getattr(self, f"action_{state['action']}")
+            if not action(state, context):
+                return False
+
+        return True
+
+    def check_login_failed(self):
+        """
+        输入密码后仍停在登录界面时认为登录失败：键盘布局可能不对（输入了错误的数字），
+        删除布局缓存，下次输入密码时重新校准。
+        """
+        field, self.password_field = self.password_field, None
+        if not field:
+            return
+        try:
+            still_login = self.selectors.exists(field)
+        except Exception:
+            return
+        if still_login:
+            logger.warning("登录后仍停留在密码输入界面，键盘布局可能有误")
+            self.emulator.invalidate_keypad_layout(self.package, self.app_version)
+
+    def ranked(self, names):
+        """按当前APP版本的历史命中次数排列备选选择器"""
+        return self.emulator.selector_ranking.order(self.package, self.app_version, names)
+
+    def record_hit(self, names, winner):
+        """记录备选选择器中实际命中的一个"""
+        self.emulator.selector_ranking.record(self.package, self.app_version, names, winner)
+
+    def wait_for_state(self, state):
+        """
+        等待状态出现，期间关闭该状态声明的弹窗。
+
+        全部识别选择器同时等待、共用同一个超时（最坏情况是一个超时而不是 N 个），
+        同时出现多个时优先历史上命中的写法。empty 选择器一并等待，优先级排在最后。
+
+        Returns:
+            str: 命中的选择器名称，超时返回 None。
+        """
+        empty = state.get('empty', [])
+        name = self.selectors.wait_any(self.ranked(state['detect']) + empty, state.get('timeout', 10),
+                                       dismiss=state.get('dismiss'),
+                                       poll_interval=self.poll_interval,
+                                       sleep=self.emulator.sleep)
+        if name and name not in empty:
+            self.record_hit(state['detect'], name)
+        return name
+
+    # ---- 动作 ----
+
+    def action_launch_app(self, state, context):
+        """
+        启动APP并等待其进入前台。
+
+        APP已在前台时 detect_state 不会从该状态开始，这里只处理冷/热启动：
+        优先用 am start -W（启动页显示后返回），失败时退回 app_start 加轮询。
+        """
+        self.emulator.session_account = None
+        logger.info("启动 {}", self.package)
+        if self.emulator.launch_app(self.package, state.get('timeout', 15)):
+            return True
+
+        self.device.app_start(self.package, wait=True)
+
+        deadline = time.monotonic() + state.get('timeout', 15)
+        while time.monotonic() < deadline:
+            if self.is_foreground():
+                logger.info("{} 已成功打开", self.package)
+                return True
+            self.emulator.sleep(0.5)
+
+        logger.error("APP启动超时或失败")
+        return False
+
+    def action_click_first(self, state, context):
+        """点击目标中第一个存在的元素"""
+        name = self.selectors.click_first_of(self.ranked(state['targets']))
+        if not name:
+            logger.error("{}: 未找到可点击的元素 {}", state['name'], state['targets'])
+            return False
+        self.record_hit(state['targets'], name)
+        logger.info("{}: 点击 {}", state['name'], name)
+        return True
+
+    def action_select_account(self, state, context):
+        """在账号列表中点击与当前账号匹配的项"""
+        account_selector = self.selectors.get(state['targets'][0])
+        account_count = account_selector.count
+        logger.info("找到 {} 个账号", account_count)
+
+        for i in range(account_count):
+            try:
+                element_text = account_selector[i].get_text().strip()
+            except Exception:
+                continue
+            logger.info("检查账号 {}: {}", i + 1, element_text)
+
+            if element_text == context['masked_account']:
+                logger.info("找到匹配账号【{}】,准备点击", context['account'])
+                account_selector[i].click()
+                self.emulator.session_account = context['account']
+                return True
+
+        logger.error("没有找到匹配的账号")
+        return False
+
+    def action_enter_password(self, state, context):
+        """
+        点击密码框，用数字键盘输入密码后点击登录。
+
+        键盘布局已校准时整段点击交给设备端宏执行（一次界面层级 + 一次 shell 调用），
+        否则逐步点击并在键盘弹出后校准布局。
+        """
+        field, submit = state['targets']
+        keypad_layout = self.emulator.get_cached_keypad_layout(self.package, context['app_version'])
+        if keypad_layout:
+            entered = self.enter_password_by_macro(field, submit, keypad_layout, context)
+            if entered:
+                self.password_field = field
+                return True
+            # 宏执行过（可能已输入部分数字）时先清空密码框，否则逐步点击会接在后面提交错误的密码
+            if entered is False and not self.clear_password(field, context):
+                return False
+            logger.warning("设备端宏输入失败，改为逐步点击")
+        logger.info("点击密码框")
+        if not self.selectors.click_if_exists(field):
+            logger.error("密码框未出现")
+            return False
+        # 等待数字键盘弹出
+        self.emulator.sleep(1)
+
+        # 键盘布局按分辨率和版本校准后缓存
+        logger.info("开始输入密码")
+        keypad_layout = self.emulator.get_keypad_layout(self.package, context['app_version'])
+        for key in context['password']:
+            x, y = self.emulator.num_to_coordinate(key, keypad_layout)
+            logger.info("点击坐标: ({}, {})", x, y)
+            self.device.click(x, y)
+            self.emulator.sleep(0.2)
+
+        if not self.selectors.click_if_exists(submit):
+            logger.error("找不到登录按钮")
+            return False
+        logger.info("点击登录按钮成功")
+        self.password_field = field
+        return True
+
+    def clear_password(self, field, context):
+        """
+        设备端宏中途失败后清空密码框。
+
+        Returns:
+            bool: 已清空返回 True；密码框已不在当前界面（登录可能已经提交）时返回 False，不再重复输入。
+        """
+        if not self.selectors.exists(field):
+            logger.error("密码框已不在当前界面，登录可能已提交，不再重复输入密码")
+            return False
+        if not self.selectors.click_if_exists(field):
+            return False
+        # 自绘数字键盘不一定有删除键坐标，直接按删除键（多按几次保证删完）
+        deletes = ' '.join(['67'] * (len(context['password']) + 4))
+        self.emulator.shell(f"input keyevent {deletes}")
+        return True
+
+    def enter_password_by_macro(self, field, submit, keypad_layout, context):
+        """
+        在设备上一次执行：点击密码框、等待键盘、逐个点击数字、点击登录。
+
+        Returns:
+            bool | None: 宏执行成功返回 True，执行失败返回 False；
+                找不到密码框或登录按钮、宏没有执行时返回 None。
+        """
+        try:
+            points = self.selectors.locate_in_hierarchy(self.device.dump_hierarchy(), [field, submit])
+        except Exception as e:
+            logger.warning("获取界面层级失败: {}", str(e))
+            return None
+        if field not in points or submit not in points:
+            return None
+
+        key_points = [self.emulator.num_to_coordinate(key, keypad_layout) for key in context['password']]
+        logger.info("通过设备端宏输入密码并登录")
+        return self.emulator.run_macro('autosub_login',
+                                       login_macro_args(points[field], points[submit], key_points))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+申购流程定义
+每个券商APP的流程由若干状态组成，按顺序执行。状态字段说明：
+    name          状态名称，同时作为步骤名记录耗时
+    detect        识别该状态的选择器名称（任一存在即认为处于该状态）
+    dismiss       等待该状态期间需要顺手关闭的弹窗
+    action        进入该状态后执行的动作（FlowEngine 中的 action_<名称> 方法）
+    targets       动作使用的选择器
+    timeout       等待该状态出现的最长秒数
+    account_bound 该状态依赖已选中的账号，只有当前会话账号一致时才允许直接跳入
+    empty         与 detect 同时等待，先出现时表示该状态下无事可做（例如今天没有可申购的新股），流程提前结束
+"""
+
+from selector_registry import HEXIN_PACKAGE, POPUP_SELECTORS, TRADE_TAB_SELECTORS, NO_ISSUE_SELECTORS
+
+HEXIN_FLOW = {
+    'package': HEXIN_PACKAGE,
+    'states': [
+        {'name': 'launch', 'action': 'launch_app', 'timeout': 15},
+        {'name': 'home', 'detect': TRADE_TAB_SELECTORS, 'dismiss': POPUP_SELECTORS,
+         'action': 'click_first', 'targets': TRADE_TAB_SELECTORS, 'timeout': 20},
+        {'name': 'account_list', 'detect': ['account_item'],
+         'action': 'select_account', 'targets': ['account_item'], 'timeout': 10},
+        {'name': 'login', 'detect': ['password_edit'], 'account_bound': True,
+         'action': 'enter_password', 'targets': ['password_edit', 'login_button'], 'timeout': 5},
+        {'name': 'apply', 'detect': ['option_apply'], 'dismiss': ['lottery_popup_cancel'],
+         'empty': NO_ISSUE_SELECTORS, 'account_bound': True,
+         'action': 'click_first', 'targets': ['option_apply'], 'timeout': 10},
+    ],
+    # 每个账号完成后关闭APP，下一个账号从干净的状态开始
+    'stop_app_after': True,
+}
+
+# 包名 -> 流程定义
+FLOWS = {
+    HEXIN_PACKAGE: HEXIN_FLOW,
+}
+
+
+def get_flow(package):
+    """获取券商APP的流程定义，未定义时返回 None"""
+    return FLOWS.get(package)
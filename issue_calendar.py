@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+当日无新股记录
+某个账号在申购界面看到"今天没有可申购的新股"后，按券商APP记录当天日期，
+同一天的其余账号不再启动APP和登录，直接跳过
+"""
+
+import os
+import threading
+from datetime import date
+from loguru import logger
+from json_store import load_json, update_json
+
+ISSUE_CALENDAR_FILE = 'issue_calendar.json'
+
+# 跳过账号时记录的原因
+NO_ISSUE_MESSAGE = '今天没有可申购的新股'
+
+
+class IssueCalendar:
+    """按券商APP包名记录最近一个没有可申购新股的日期"""
+
+    def __init__(self, cache_file=ISSUE_CALENDAR_FILE):
+        """
+        初始化 IssueCalendar。
+
+        Args:
+            cache_file (str, optional): 持久化文件路径。 Defaults to ISSUE_CALENDAR_FILE.
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._empty_days = self._load()
+
+    def _load(self):
+        """从文件加载，并记下文件的修改时间"""
+        self._mtime = self._file_mtime()
+        return load_json(self.cache_file, '无新股记录')
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.cache_file)
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """文件被其他进程（例如进程模式下的设备进程）更新过时重新加载（调用方持有锁）"""
+        if self._file_mtime() != self._mtime:
+            self._empty_days = self._load()
+
+    def _save(self, package, day):
+        """把一条记录合并到文件中（调用方持有锁）"""
+        data = update_json(self.cache_file, lambda data: data.__setitem__(package, day), '无新股记录')
+        if data is not None:
+            self._empty_days = data
+            self._mtime = self._file_mtime()
+
+    def is_empty(self, package, day=None):
+        """
+        某天是否已确认没有可申购的新股。
+
+        Args:
+            package (str): 券商APP包名。
+            day (date, optional): 日期，默认今天。
+
+        Returns:
+            bool: 已确认没有时返回 True。
+        """
+        day = (day or date.today()).isoformat()
+        with self._lock:
+            if self._empty_days.get(package) != day:
+                self._refresh()
+            return self._empty_days.get(package) == day
+
+    def mark_empty(self, package, day=None):
+        """记录某天没有可申购的新股（默认今天）"""
+        day = (day or date.today()).isoformat()
+        with self._lock:
+            if self._empty_days.get(package) == day:
+                return
+            self._empty_days[package] = day
+            self._save(package, day)
+        logger.info("{} 今天没有可申购的新股，当天其余账号将直接跳过", package)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+本地 JSON 缓存文件的读写
+进程模式下多个设备进程同时读写同一个缓存文件：读写都在跨进程文件锁内进行，
+写入时先读取磁盘上的最新内容再合并本次修改，写到临时文件后原子替换，
+不会丢失其他进程的更新，也不会留下写了一半的文件
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+from loguru import logger
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def file_lock(path):
+    """
+    跨进程的排他文件锁（锁文件为 <path>.lock）。
+
+    Args:
+        path (str): 被保护的文件路径。
+    """
+    with open(f"{path}.lock", 'a+b') as lock_file:
+        if os.name == 'nt':
+            lock_file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 自身会重试约10秒，仍拿不到时继续等待
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _replace(source, target, attempts=5):
+    """原子替换；Windows 上目标文件正被杀毒软件等打开时稍后重试"""
+    for attempt in range(attempts):
+        try:
+            os.replace(source, target)
+            return
+        except PermissionError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05)
+
+
+def load_json(path, description='缓存'):
+    """
+    读取 JSON 缓存文件。
+
+    Args:
+        path (str): 文件路径。
+        description (str, optional): 日志中的名称。 Defaults to '缓存'.
+
+    Returns:
+        dict: 文件内容，不存在或读取失败时返回空字典。
+    """
+    try:
+        with file_lock(path):
+            return _read(path)
+    except Exception as e:
+        logger.warning("读取{}失败: {}", description, str(e))
+        return {}
+
+
+def update_json(path, change, description='缓存'):
+    """
+    修改 JSON 缓存文件：在文件锁内读取磁盘上的最新内容，调用 change(data) 合并本次修改后原子写回。
+
+    Args:
+        path (str): 文件路径。
+        change (callable): 接收文件内容（dict）并就地修改的函数。
+        description (str, optional): 日志中的名称。 Defaults to '缓存'.
+
+    Returns:
+        dict: 写回后的完整内容（包含其他进程的更新），失败时返回 None。
+    """
+    try:
+        with file_lock(path):
+            try:
+                data = _read(path)
+            except ValueError as e:
+                # 旧版本非原子写入留下的损坏文件，丢弃后重建
+                logger.warning("{}文件已损坏，重新创建: {}", description, str(e))
+                data = {}
+            change(data)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            _replace(temp_path, path)
+            return data
+    except Exception as e:
+        logger.warning("保存{}失败: {}", description, str(e))
+        return None
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+密码数字键盘布局校准
+按设备分辨率和APP版本定位一次数字键坐标，并缓存到本地文件
+"""
+
+import re
+import threading
+import xml.etree.ElementTree as ET
+from loguru import logger
+from json_store import load_json, update_json
+
+# 键盘布局缓存文件
+KEYPAD_CACHE_FILE = 'keypad_cache.json'
+
+# 默认键盘布局（原始分辨率下手工测量的坐标，仅在校准失败时使用）
+DEFAULT_KEYPAD_LAYOUT = {
+    '1': (66, 723), '2': (205, 721), '3': (328, 720),
+    '4': (64, 792), '5': (201, 785), '6': (332, 783),
+    '7': (66, 853), '8': (201, 846), '9': (326, 852),
+    '0': (197, 916)
+}
+
+DIGITS = '0123456789'
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+
+def parse_bounds(bounds):
+    """
+    解析 uiautomator 层级中的 bounds 字符串。
+
+    Args:
+        bounds (str): 形如 "[x1,y1][x2,y2]" 的字符串。
+
+    Returns:
+        tuple: (x1, y1, x2, y2)，解析失败返回 None。
+    """
+    match = _BOUNDS_PATTERN.match(bounds or '')
+    if not match:
+        return None
+    return tuple(int(v) for v in match.groups())
+
+
+def center_of(rect):
+    """返回矩形中心点坐标"""
+    x1, y1, x2, y2 = rect
+    return ((x1 + x2) // 2, (y1 + y2) // 2)
+
+
+def locate_keys(hierarchy_xml):
+    """
+    从界面层级中定位数字键。
+
+    优先匹配文本为单个数字的节点；同一数字有多个节点时取最靠下的一个
+    （键盘位于屏幕底部）。如果键盘是自绘控件没有子节点，则根据键盘容器
+    的区域按标准 3x4 九宫格推算各键位置。
+
+    Args:
+        hierarchy_xml (str): device.dump_hierarchy() 的返回值。
+
+    Returns:
+        dict: {数字: (x, y)}，无法定位全部数字时返回 None。
+    """
+    try:
+        root = ET.fromstring(hierarchy_xml)
+    except ET.ParseError as e:
+        logger.warning("解析界面层级失败: {}", str(e))
+        return None
+
+    layout = {}
+    keyboard_rect = None
+    for node in root.iter('node'):
+        rect = parse_bounds(node.get('bounds'))
+        if not rect or rect[2] <= rect[0] or rect[3] <= rect[1]:
+            continue
+
+        text = (node.get('text') or node.get('content-desc') or '').strip()
+        if len(text) == 1 and text in DIGITS:
+            point = center_of(rect)
+            if text not in layout or point[1] > layout[text][1]:
+                layout[text] = point
+            continue
+
+        resource_id = (node.get('resource-id') or '').lower()
+        if 'keyboard' in resource_id or 'keypad' in resource_id:
+            # 取面积最大的键盘容器
+            if keyboard_rect is None or _area(rect) > _area(keyboard_rect):
+                keyboard_rect = rect
+
+    if len(layout) == len(DIGITS):
+        return layout
+
+    if keyboard_rect:
+        logger.info("未找到独立的数字键节点，按键盘区域 {} 推算布局", keyboard_rect)
+        return grid_layout(keyboard_rect)
+
+    return None
+
+
+def grid_layout(rect):
+    """
+    按标准电话键盘（1-9 三行，0 位于第四行中间）推算数字键坐标。
+
+    Args:
+        rect (tuple): 键盘区域 (x1, y1, x2, y2)。
+
+    Returns:
+        dict: {数字: (x, y)}
+    """
+    x1, y1, x2, y2 = rect
+    cell_w = (x2 - x1) / 3
+    cell_h = (y2 - y1) / 4
+    layout = {}
+    for index, digit in enumerate('123456789'):
+        row, col = divmod(index, 3)
+        layout[digit] = (int(x1 + cell_w * (col + 0.5)), int(y1 + cell_h * (row + 0.5)))
+    layout['0'] = (int(x1 + cell_w * 1.5), int(y1 + cell_h * 3.5))
+    return layout
+
+
+def is_plausible(layout, screen_size=None):
+    """
+    检查布局是否合理：十个数字齐全、坐标互不相同，并且都在屏幕范围内。
+
+    Args:
+        layout (dict): {数字: (x, y)}。
+        screen_size (tuple, optional): (宽, 高)，为空时不检查是否超出屏幕。
+
+    Returns:
+        bool: 布局合理返回 True。
+    """
+    if not layout or set(layout) != set(DIGITS):
+        return False
+    points = [tuple(point) for point in layout.values()]
+    if len(set(points)) != len(points):
+        return False
+    if screen_size and all(screen_size):
+        width, height = screen_size
+        return all(0 <= x < width and 0 <= y < height for x, y in points)
+    return True
+
+
+def _area(rect):
+    return (rect[2] - rect[0]) * (rect[3] - rect[1])
+
+
+class KeypadLayoutCache:
+    """按分辨率和APP版本缓存的数字键盘布局"""
+
+    def __init__(self, cache_file=KEYPAD_CACHE_FILE):
+        """
+        初始化 KeypadLayoutCache。
+
+        Args:
+            cache_file (str, optional): 缓存文件路径。 Defaults to KEYPAD_CACHE_FILE.
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._layouts = self._load()
+
+    @staticmethod
+    def make_key(width, height, package, app_version):
+        """生成缓存键"""
+        return f"{package}@{app_version}:{width}x{height}"
+
+    @staticmethod
+    def _parse(data):
+        return {key: {digit: tuple(point) for digit, point in layout.items()}
+                for key, layout in data.items()}
+
+    def _load(self):
+        """从缓存文件加载布局"""
+        return self._parse(load_json(self.cache_file, '键盘布局缓存'))
+
+    def _save(self, change):
+        """把修改合并到缓存文件（保留其他设备进程写入的布局），调用方持有锁"""
+        data = update_json(self.cache_file, change, '键盘布局缓存')
+        if data is not None:
+            self._layouts = self._parse(data)
+
+    def get(self, key):
+        """获取已缓存的布局，不存在返回 None"""
+        with self._lock:
+            return self._layouts.get(key)
+
+    def put(self, key, layout):
+        """缓存布局并立即写入文件"""
+        with self._lock:
+            self._layouts[key] = dict(layout)
+            self._save(lambda data: data.__setitem__(key, dict(layout)))
+
+    def invalidate(self, key):
+        """删除某个布局（例如点击结果不符合预期时）"""
+        with self._lock:
+            if self._layouts.pop(key, None) is not None:
+                self._save(lambda data: data.pop(key, None))
+                logger.warning("键盘布局缓存已失效，下次输入密码时重新校准: {}", key)
+
+    def lookup(self, key, screen_size=None):
+        """获取已缓存的布局；布局不合理（重复或超出屏幕的按键）时删除并返回 None"""
+        layout = self.get(key)
+        if layout and not is_plausible(layout, screen_size):
+            logger.warning("缓存的键盘布局不合理: {}", layout)
+            self.invalidate(key)
+            return None
+        return layout
+
+    def calibrate(self, device, package, app_version, screen_size=None):
+        """
+        获取当前设备的数字键盘布局，未缓存时从界面层级校准一次。
+
+        调用前数字键盘必须已经显示在屏幕上（即已点击密码框）。
+
+        Args:
+            device: uiautomator2 设备对象。
+            package (str): 券商APP包名。
+            app_version (str): APP版本号。
+            screen_size (tuple, optional): (宽, 高)，为空时从设备读取。
+
+        Returns:
+            dict: {数字: (x, y)}，校准失败时返回默认布局。
+        """
+        width, height = screen_size or device.window_size()
+        key = self.make_key(width, height, package, app_version)
+
+        layout = self.lookup(key, (width, height))
+        if layout:
+            return layout
+
+        logger.info("键盘布局未缓存 ({})，开始校准...", key)
+        try:
+            layout = locate_keys(device.dump_hierarchy())
+        except Exception as e:
+            logger.warning("校准键盘布局失败: {}", str(e))
+            layout = None
+
+        if not layout:
+            logger.warning("无法定位数字键盘，使用默认布局")
+            return dict(DEFAULT_KEYPAD_LAYOUT)
+        if not is_plausible(layout, (width, height)):
+            # 例如按 keyboard 容器推算出的九宫格落在屏幕外，不缓存，下次重新校准
+            logger.warning("校准结果不合理，本次使用默认布局: {}", layout)
+            return dict(DEFAULT_KEYPAD_LAYOUT)
+
+        logger.info("键盘布局校准完成: {}", layout)
+        self.put(key, layout)
+        return layout
@@ -2,20 +2,34 @@ import sys
 import os
 import subprocess
 import time
+import threading
+import multiprocessing
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget,
                              QMessageBox, QLabel, QHBoxLayout, QTextEdit, QDialog,
                              QFormLayout, QSpinBox, QDialogButtonBox, QTabWidget,
                              QLineEdit, QFileDialog, QGridLayout, QMenuBar, QMenu,
                              QTableWidget, QTableWidgetItem, QHeaderView, QSplitter,
-                             QFrame)
+                             QFrame, QCheckBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt6.QtGui import QPixmap
 import subprocess
 import json
 from config import Config
 from simulator import SimulatorController # 假设模拟器控制逻辑在 SimulatorController 中
+from datetime import datetime
 from entity.user import User
+from entity.subscription_result import SubscriptionResult
+from entity.subscription_ledger import SubscriptionLedger
+from entity.base_model import create_tables, db_writer
 from workers.adb_worker import AdbWorker # 从 workers 子目录导入
+from workers.report_worker import ReportWorker
+from workers.pool_worker import PoolWorker
+from scheduler import parse_fire_time
+from metrics import REGISTRY, BATCH_PENDING, ACCOUNTS_PROCESSED, MetricsServer
+from issue_calendar import NO_ISSUE_MESSAGE
+import profiling
+from profiling import StallDetector
+from cancellation import CancelToken
 
 # --- 从 ui 目录导入对话框 ---
 from ui.account_dialog import AccountDialog
@@ -40,6 +54,11 @@ class MainWindow(QMainWindow):
         self.simulator = SimulatorController() # 使用 SimulatorController
         self.adb_path = self.simulator.adb_path # 从 SimulatorController 获取 adb_path
         self.adb_worker = None # 初始化adb工作线程为空
+        self.report_worker = None # 批次报告生成线程
+        self.pool_worker = None # 进程模式的申购批次线程
+        self.fire_at = None # 定时申购的触发时间戳，None 表示立即申购
+        self.force = False # 本批次是否重新申购今天已完成的账号
+        self.cancel_token = CancelToken() # 当前批次的取消标记
 
         # --- 修改顺序：先初始化UI，再初始化数据库 ---
         # 创建UI界面 (移到前面)
@@ -49,15 +68,58 @@ class MainWindow(QMainWindow):
         self.init_database()
         # --- 顺序修改结束 ---
 
+        # 性能分析（默认关闭；环境变量 AUTOSUB_PROFILE 已开启时以环境变量为准）
+        if not profiling.is_enabled():
+            profiling.configure(**self.config.get_profiling_config())
+
+        # 本机指标服务，供监控系统抓取
+        self.metrics_server = None
+        self.start_metrics_server()
+
+        # 界面卡顿检测：界面线程阻塞超过阈值时记录调用栈
+        self.stall_detector = None
+        self.start_stall_detector()
+
         # 启动时检查模拟器连接状态
         self.check_emulator_status()
 
+    def start_metrics_server(self):
+        """按配置启动 /metrics 服务"""
+        metrics_config = self.config.get_metrics_config()
+        if not metrics_config['enabled']:
+            return
+        self.metrics_server = MetricsServer(metrics_config['port'])
+        if self.metrics_server.start():
+            self.log_message(f"运行指标: http://127.0.0.1:{self.metrics_server.port}/metrics")
+        else:
+            self.metrics_server = None
+
+    def start_stall_detector(self):
+        """按配置启动界面线程卡顿检测"""
+        stall_config = self.config.get_stall_detector_config()
+        if not stall_config['enabled']:
+            return
+        self.stall_detector = StallDetector(threading.get_ident(), stall_config['threshold'])
+        self.stall_timer = QTimer(self)
+        self.stall_timer.timeout.connect(self.stall_detector.beat)
+        self.stall_timer.start(max(int(self.stall_detector.beat_interval * 1000), 10))
+        self.stall_detector.start()
+
+    def dump_metrics(self):
+        """把指标写入配置的文本文件"""
+        dump_file = self.config.get_metrics_config()['dump_file']
+        if not dump_file:
+            return
+        try:
+            REGISTRY.dump(dump_file)
+        except OSError as e:
+            self.log_message(f"写入指标文件失败: {e}")
+
     def init_database(self):
         """初始化数据库连接和创建表"""
         try:
-            # 确保 User 模型关联的数据库已初始化
-            # Peewee 通常在模型定义时处理数据库连接
-            User.create_table(safe=True) # safe=True 表示如果表已存在则不会报错
+            # 启动时统一建表和索引，模型实例化时不再检查表是否存在
+            create_tables([User, SubscriptionResult, SubscriptionLedger])
             self.log_message("数据库初始化成功")
         # except peewee.PeeweeException as db_err: # 捕获更具体的异常
         except Exception as e: # 保留通用异常捕获作为后备
@@ -102,6 +164,22 @@ class MainWindow(QMainWindow):
         self.subscribe_btn.setEnabled(False)
         button_layout.addWidget(self.subscribe_btn)
 
+        self.schedule_btn = QPushButton("定时申购")
+        self.schedule_btn.setToolTip("提前登录第一个账号并停在申购界面，到设置的时间立即申购")
+        self.schedule_btn.clicked.connect(self.start_scheduled_subscription)
+        self.schedule_btn.setEnabled(False)
+        button_layout.addWidget(self.schedule_btn)
+
+        self.stop_btn = QPushButton("停止申购")
+        self.stop_btn.clicked.connect(self.stop_subscription)
+        self.stop_btn.setEnabled(False)
+        button_layout.addWidget(self.stop_btn)
+
+        self.force_checkbox = QCheckBox("重新申购今天已完成的账号")
+        self.force_checkbox.setToolTip("默认跳过今天已申购成功的账号，重跑批次时只处理失败的账号")
+        self.force_checkbox.setEnabled(False)
+        button_layout.addWidget(self.force_checkbox)
+
         left_layout.addLayout(button_layout)
 
         # --- 日志区域 ---
@@ -125,8 +203,8 @@ class MainWindow(QMainWindow):
         """在日志区域显示消息"""
         # 确保 self.log_output 存在
         if hasattr(self, 'log_output'):
+            # 不在这里调用 processEvents：重入事件循环会打乱信号处理顺序，耗时操作应放到后台线程
             self.log_output.append(message)
-            QApplication.processEvents() # 处理事件，确保界面更新
         else:
             print(f"日志控件未初始化，无法记录: {message}") # 添加备用打印
 
@@ -140,7 +218,6 @@ class MainWindow(QMainWindow):
         # 确保 self.status_label 存在
         if hasattr(self, 'status_label'):
             self.status_label.setText(f"状态：{message}")
-            QApplication.processEvents() # 确保界面更新
         else:
             print(f"状态标签未初始化，无法更新: {message}") # 添加备用打印
 
@@ -165,8 +242,35 @@ class MainWindow(QMainWindow):
         # 启动后台线程执行连接
         self.run_adb_command('connect') # AdbWorker 需要能处理 'connect' 命令
 
+    def set_subscribe_enabled(self, enabled):
+        """同时启用/禁用立即申购和定时申购按钮"""
+        self.subscribe_btn.setEnabled(enabled)
+        self.schedule_btn.setEnabled(enabled)
+        self.force_checkbox.setEnabled(enabled)
+
     def start_subscription(self):
         """开始执行自动申购流程"""
+        self.fire_at = None
+        self.begin_subscription()
+
+    def start_scheduled_subscription(self):
+        """定时申购：第一个账号提前就位，到点触发，其余账号随后依次申购"""
+        schedule = self.config.get_schedule()
+        try:
+            fire_at = parse_fire_time(schedule['fire_time'])
+        except ValueError:
+            QMessageBox.warning(self, "配置错误", f"定时申购时间格式错误: {schedule['fire_time']}，应为 HH:MM:SS")
+            return
+        if fire_at <= time.time():
+            QMessageBox.warning(self, "时间已过", f"今天的申购时间 {schedule['fire_time']} 已过。")
+            return
+
+        self.fire_at = fire_at
+        self.log_message(f"定时申购: {schedule['fire_time']} 触发，提前 {schedule['lead_seconds']} 秒准备")
+        self.begin_subscription()
+
+    def begin_subscription(self):
+        """为全部账号依次执行申购"""
         if not self.adb_path:
             QMessageBox.warning(self, "配置错误", "请先在设置中配置夜神模拟器bin目录。")
             return
@@ -178,55 +282,141 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "无账号", "请先在账号管理中添加至少一个账号。")
                 return
 
+            # 跳过今天已申购成功的账号（台账），勾选“重新申购”时全部处理
+            self.force = self.force_checkbox.isChecked()
+            if not self.force:
+                completed = SubscriptionLedger.completed_accounts()
+                pending = [user for user in users if user.account not in completed]
+                if len(pending) < len(users):
+                    self.log_message(f"跳过今天已完成申购的 {len(users) - len(pending)} 个账号")
+                if not pending:
+                    QMessageBox.information(self, "无需申购", "所有账号今天都已完成申购。")
+                    return
+                users = pending
+
             self.log_message(f"准备为 {len(users)} 个账号执行自动申购流程...")
-            self.subscribe_btn.setEnabled(False) # 执行期间禁用按钮
+            self.set_subscribe_enabled(False) # 执行期间禁用按钮
+            self.cancel_token = CancelToken()
+            self.stop_btn.setEnabled(True)
 
             # --- 实现多账号循环 ---
+            # 批次ID，用于关联本次所有账号的申购结果
+            self.run_id = datetime.now().strftime('%Y%m%d%H%M%S')
             self.current_user_index = 0
             self.users_to_process = users
-            self.process_next_user() # 开始处理第一个用户
+            if self.config.get_execution_config()['mode'] == 'process':
+                self.start_device_pool(users)
+            else:
+                self.process_next_user() # 开始处理第一个用户
 
         # except peewee.PeeweeException as db_err: # 捕获具体数据库异常
         except Exception as e:
             self.log_message(f"获取账号信息失败: {e}")
             QMessageBox.critical(self, "数据库错误", f"无法获取账号信息: {str(e)}")
-            self.subscribe_btn.setEnabled(True) # 出错时恢复按钮
+            self.set_subscribe_enabled(True) # 出错时恢复按钮
+
+    def stop_subscription(self):
+        """停止当前批次：正在执行的账号会在1秒内中止，后续账号不再处理"""
+        self.log_message("正在停止申购...")
+        self.stop_btn.setEnabled(False)
+        self.cancel_token.cancel()
+
+    def finish_subscription(self, message):
+        """批次结束（完成或停止）后恢复按钮"""
+        self.log_message(message)
+        self.dump_metrics()
+        self.stop_btn.setEnabled(False)
+        self.set_subscribe_enabled(True)
+        self.generate_report(self.run_id)
+
+    def start_device_pool(self, users):
+        """进程模式：每台设备一个子进程，账号分给空闲的设备同时执行"""
+        execution = self.config.get_execution_config()
+        ports = execution['ports'] or [self.simulator.emulator.connected_port or '62001']
+        if self.fire_at:
+            # 定时申购需要在界面进程中保持APP会话，仍按线程模式执行
+            self.log_message("定时申购不支持进程模式，按线程模式执行")
+            self.process_next_user()
+            return
+        # 子进程各自连接设备，界面进程暂停心跳，避免两边同时重连
+        self.simulator.emulator.stop_heartbeat()
+        tasks = [self.subscription_params(user) for user in users]
+        self.pool_worker = PoolWorker(self.simulator.path, ports, tasks, execution, self.cancel_token,
+                                      self.config.get_profiling_config())
+        self.pool_worker.update_signal.connect(self.log_message)
+        self.pool_worker.finished_signal.connect(self.on_pool_finished)
+        self.pool_worker.start()
+
+    def on_pool_finished(self, success, message):
+        """进程模式的批次结束"""
+        self.pool_worker = None
+        if self.simulator.emulator.is_connected:
+            self.simulator.emulator.start_heartbeat()
+        self.finish_subscription(message)
+
+    def generate_report(self, run_id):
+        """在后台线程中生成批次的 HTML 和 CSV 报告"""
+        if self.report_worker and self.report_worker.isRunning():
+            self.log_message("上一份报告仍在生成中，本批次报告稍后可用 python report.py 生成")
+            return
+        self.report_worker = ReportWorker(run_id)
+        self.report_worker.finished_signal.connect(lambda success, message: self.log_message(message))
+        self.report_worker.start()
 
     # --- 多账号处理辅助函数 ---
     def process_next_user(self):
         """处理下一个用户的申购任务"""
-        if self.current_user_index < len(self.users_to_process):
+        BATCH_PENDING.set(len(self.users_to_process) - self.current_user_index)
+        if self.cancel_token.is_cancelled():
+            BATCH_PENDING.set(0)
+            self.finish_subscription(f"申购已停止，剩余 {len(self.users_to_process) - self.current_user_index} 个账号未处理。")
+        elif self.current_user_index < len(self.users_to_process):
             user = self.users_to_process[self.current_user_index]
             self.log_message(f"开始为账号 {user.account} ({user.user_name or 'N/A'}) 执行申购...")
 
-            # --- 使用 get_coordinate 方法获取坐标 ---
-            select_x = self.config.get_coordinate('select_x', 201) # 提供默认值以防万一
-            select_y = self.config.get_coordinate('select_y', 785)
-            subscribe_x = self.config.get_coordinate('subscribe_x', 332)
-            subscribe_y = self.config.get_coordinate('subscribe_y', 783)
-            confirm_x = self.config.get_coordinate('confirm_x', 197)
-            confirm_y = self.config.get_coordinate('confirm_y', 916)
-            # --- 坐标获取修改结束 ---
-
-            params = {
-                'account': user.account,
-                'password': user.password,
-                'user_name': user.user_name,
-                # 使用获取到的坐标值
-                'select_x': select_x,
-                'select_y': select_y,
-                'subscribe_x': subscribe_x,
-                'subscribe_y': subscribe_y,
-                'confirm_x': confirm_x,
-                'confirm_y': confirm_y,
-                # 传递券商包名给 AdbWorker
-                'broker_package': self.config.get_broker_package_name() # 直接获取包名
-            }
+            params = self.subscription_params(user)
+            cmd_type = 'subscribe'
+            if self.fire_at and self.current_user_index == 0:
+                # 定时申购只对第一个账号生效，它会停在申购界面等待触发
+                schedule = self.config.get_schedule()
+                params.update({
+                    'fire_at': self.fire_at,
+                    'lead_seconds': schedule['lead_seconds'],
+                    'use_device_clock': schedule['use_device_clock'],
+                })
+                cmd_type = 'scheduled_subscribe'
             # 确保 AdbWorker 能接收并处理 'subscribe' 命令及这些参数
-            self.run_adb_command('subscribe', params)
+            self.run_adb_command(cmd_type, params)
         else:
-            self.log_message("所有账号申购流程执行完毕。")
-            self.subscribe_btn.setEnabled(True) # 所有任务完成后恢复按钮
+            self.finish_subscription("所有账号申购流程执行完毕。") # 所有任务完成后恢复按钮
+
+    def subscription_params(self, user):
+        """一个账号的申购参数（线程模式和进程模式共用）"""
+        # --- 使用 get_coordinate 方法获取坐标 ---
+        select_x = self.config.get_coordinate('select_x', 201) # 提供默认值以防万一
+        select_y = self.config.get_coordinate('select_y', 785)
+        subscribe_x = self.config.get_coordinate('subscribe_x', 332)
+        subscribe_y = self.config.get_coordinate('subscribe_y', 783)
+        confirm_x = self.config.get_coordinate('confirm_x', 197)
+        confirm_y = self.config.get_coordinate('confirm_y', 916)
+        # --- 坐标获取修改结束 ---
+
+        return {
+            'account': user.account,
+            'password': user.password,
+            'user_name': user.user_name,
+            # 使用获取到的坐标值
+            'select_x': select_x,
+            'select_y': select_y,
+            'subscribe_x': subscribe_x,
+            'subscribe_y': subscribe_y,
+            'confirm_x': confirm_x,
+            'confirm_y': confirm_y,
+            # 传递券商包名给 AdbWorker
+            'broker_package': self.config.get_broker_package_name(), # 直接获取包名
+            'run_id': self.run_id,
+            'force': self.force
+        }
 
     def run_adb_command(self, cmd_type, params=None):
         """启动后台线程执行ADB命令"""
@@ -240,14 +430,17 @@ class MainWindow(QMainWindow):
              # 根据命令类型决定是否恢复按钮状态
              if cmd_type in ['connect', 'check']:
                  self.connect_btn.setEnabled(True)
-             elif cmd_type == 'subscribe':
+             elif cmd_type in ('subscribe', 'scheduled_subscribe'):
                  # 如果是多账号模式启动失败，需要恢复按钮
                  if self.current_user_index == 0:
-                     self.subscribe_btn.setEnabled(True)
+                     self.set_subscribe_enabled(True)
              return
 
         # 传递 adb_path, cmd_type, params 给 AdbWorker
-        self.adb_worker = AdbWorker(self.adb_path, cmd_type, params)
+        # 申购任务复用同一个控制器，避免每个账号重新连接设备
+        simulator = self.simulator if cmd_type in ('subscribe', 'scheduled_subscribe') else None
+        cancel_token = self.cancel_token if simulator else None
+        self.adb_worker = AdbWorker(self.adb_path, cmd_type, params, simulator, cancel_token)
         self.adb_worker.update_signal.connect(self.log_message)
         self.adb_worker.finished_signal.connect(self.on_adb_finished)
         self.adb_worker.start()
@@ -257,25 +450,29 @@ class MainWindow(QMainWindow):
         self.log_message(f"操作完成 (成功: {success}): {message}")
 
         current_cmd_type = self.adb_worker.cmd_type if self.adb_worker else None
+        serial = self.adb_worker.serial if self.adb_worker else None
         self.adb_worker = None # 清理工作线程引用
 
         if current_cmd_type == 'connect':
             self.connect_btn.setEnabled(True) # 恢复连接按钮
             if success:
                 self.update_status_label("已连接")
-                self.subscribe_btn.setEnabled(True) # 连接成功后启用申购按钮
+                # 画面预览使用 connect 线程连接到的设备（多台设备时需要指定序列号）
+                self.emulator_widget.set_device(self.adb_path, serial)
+                self.set_subscribe_enabled(True) # 连接成功后启用申购按钮
             else:
                 self.update_status_label("连接失败")
-                self.subscribe_btn.setEnabled(False)
+                self.set_subscribe_enabled(False)
         elif current_cmd_type == 'check':
             self.connect_btn.setEnabled(True) # 检查完成后恢复连接按钮
             if success:
                 self.update_status_label("已连接")
-                self.subscribe_btn.setEnabled(True)
+                self.emulator_widget.set_device(self.adb_path, serial)
+                self.set_subscribe_enabled(True)
             else:
                 self.update_status_label("未连接")
-                self.subscribe_btn.setEnabled(False)
-        elif current_cmd_type == 'subscribe':
+                self.set_subscribe_enabled(False)
+        elif current_cmd_type in ('subscribe', 'scheduled_subscribe'):
              # 处理下一个账号
              if success:
                  self.log_message(f"账号 {self.users_to_process[self.current_user_index].account} 申购操作成功。")
@@ -284,9 +481,26 @@ class MainWindow(QMainWindow):
                  self.log_message(f"账号 {self.users_to_process[self.current_user_index].account} 申购操作失败: {message}")
 
              self.current_user_index += 1
+             if not self.force and self.simulator.emulator.issue_calendar.is_empty(
+                     self.config.get_broker_package_name(default="com.hexin.plat.android")):
+                 # 今天没有可申购的新股，剩余账号不必再启动APP和登录
+                 self.skip_remaining_users(NO_ISSUE_MESSAGE)
+                 return
              # 稍微延迟一下再处理下一个，给模拟器反应时间
              QTimer.singleShot(1000, self.process_next_user) # 延迟1秒
 
+    def skip_remaining_users(self, message):
+        """为本批次剩余的账号逐个记录跳过，然后结束批次"""
+        remaining = self.users_to_process[self.current_user_index:]
+        for user in remaining:
+            db_writer.submit(SubscriptionResult.record, run_id=self.run_id, account=user.account,
+                             outcome='skipped', message=message)
+        if remaining:
+            ACCOUNTS_PROCESSED.inc(len(remaining), outcome='skipped')
+        self.current_user_index = len(self.users_to_process)
+        BATCH_PENDING.set(0)
+        self.finish_subscription(f"{message}，剩余 {len(remaining)} 个账号已跳过。")
+
     def open_account_dialog(self):
         """打开账号管理对话框"""
         # AccountDialog 现在是从 ui.account_dialog 导入的
@@ -294,7 +508,13 @@ class MainWindow(QMainWindow):
         dialog.exec() # 使用 exec() 使其成为模态对话框
 
     def open_settings_dialog(self):
-        """打开设置对话框"""
+        """打开设置对话框（申购或连接操作进行中时不能修改，避免替换正在使用的模拟器控制器）"""
+        running = [worker for worker in (self.adb_worker, self.pool_worker) if worker and worker.isRunning()]
+        # 逐个账号执行时两个账号之间没有工作线程，按钮禁用表示批次仍在进行
+        if running or not self.subscribe_btn.isEnabled():
+            QMessageBox.information(self, "操作进行中", "请等待当前申购或连接操作结束后再修改设置。")
+            return
+
         current_path = self.config.get_simulator_path()
         # 从 Config 获取当前包名，如果为空则使用默认值 "com.hexin.plat.android"
         current_package = self.config.get_broker_package_name(default="com.hexin.plat.android")
@@ -312,7 +532,8 @@ class MainWindow(QMainWindow):
                 if path_changed:
                     # 使用 set_simulator_path，它内部会调用 save_config
                     if self.config.set_simulator_path(new_path):
-                        # 更新 simulator 实例和 adb_path
+                        # 停止旧控制器的心跳并断开连接，再更新 simulator 实例和 adb_path
+                        self.simulator.disconnect()
                         self.simulator = SimulatorController() # 重新初始化以读取新路径
                         self.adb_path = self.simulator.adb_path
                         self.log_message("模拟器路径已更新并保存。")
@@ -333,19 +554,36 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """关闭窗口前的处理"""
-        if self.adb_worker and self.adb_worker.isRunning():
+        running = [worker for worker in (self.adb_worker, self.pool_worker) if worker and worker.isRunning()]
+        if running:
             reply = QMessageBox.question(self, '确认退出',
                                        "当前有操作正在进行中，确定要强制退出吗？",
                                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                        QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
+                # 先请求停止，给工作线程一点时间结束设备调用；进程池需要等子进程退出
+                for worker in running:
+                    worker.cancel()
+                    worker.wait(15000 if worker is self.pool_worker else 2000)
                 event.accept()
             else:
                 event.ignore()
         else:
             event.accept()
+
+        if event.isAccepted():
+            # 写完队列中的申购结果再退出
+            db_writer.stop()
+            self.dump_metrics()
+            if self.metrics_server:
+                self.metrics_server.stop()
+            if self.stall_detector:
+                self.stall_timer.stop()
+                self.stall_detector.stop()
 # --- 主程序入口 ---
 if __name__ == '__main__':
+    # 打包为 exe 后，进程模式的设备子进程由此进入工作函数，而不是重新启动界面
+    multiprocessing.freeze_support()
     try:
         app = QApplication(sys.argv)
 
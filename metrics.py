@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标
+进程内的指标注册表，按 Prometheus 文本格式输出，可通过本机 HTTP 端口抓取或写入文本文件
+"""
+
+import os
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from loguru import logger
+
+# 步骤耗时直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _format_labels(names, values, extra=None):
+    """把标签名和值拼成 {a="x",b="y"} 形式"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    """转义标签值中的反斜杠、引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    """数值输出：整数不带小数点"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类，按标签值分别计数"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """标签字典转为按 labelnames 顺序排列的元组"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """返回 [(指标名, 标签文本, 数值)]"""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+    def render(self):
+        """输出该指标的 Prometheus 文本格式"""
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}"
+                     for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    """分桶统计的耗时分布"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # 每个桶的计数（非累计）、总数、总和
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += 1
+            state[2] += value
+
+    def snapshot(self, **labels):
+        """返回 (次数, 总和)"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state[1], state[2]) if state else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2]))
+                           for key, state in self._values.items())
+
+        samples = []
+        for key, (counts, total, value_sum) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                samples.append((f"{self.name}_bucket",
+                                _format_labels(self.labelnames, key, ('le', le)), cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_count", labels, total))
+            samples.append((f"{self.name}_sum", labels, round(value_sum, 6)))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type_name}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """输出全部指标的 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+    def dump(self, path):
+        """
+        把当前指标写入文本文件（先写临时文件再替换，node_exporter textfile 方式读取时不会读到半个文件）。
+
+        Args:
+            path (str): 输出文件路径。
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+REGISTRY = MetricsRegistry()
+
+# ---- 申购流程使用的指标 ----
+ADB_COMMANDS = REGISTRY.counter('autosub_adb_commands_total',
+                                'adb 调用次数（spawn 为新建进程，shell 为常驻通道）', ['kind'])
+U2_RPCS = REGISTRY.counter('autosub_u2_rpc_total', 'uiautomator2 JSON-RPC 调用次数', ['method'])
+RECONNECTS = REGISTRY.counter('autosub_reconnects_total', '设备重连次数', ['source'])
+STEP_SECONDS = REGISTRY.histogram('autosub_step_seconds', '申购各步骤耗时（秒）', ['step'])
+ACCOUNTS_PROCESSED = REGISTRY.counter('autosub_accounts_processed_total',
+                                      '已处理账号数', ['outcome'])
+FAILURES = REGISTRY.counter('autosub_failures_total', '申购失败次数（按失败步骤）', ['step'])
+APP_LAUNCH_SECONDS = REGISTRY.histogram('autosub_app_launch_seconds',
+                                        'am start -W 报告的APP启动耗时（秒，total 为 TotalTime，wait 为 WaitTime）',
+                                        ['measure'])
+BATCH_PENDING = REGISTRY.gauge('autosub_batch_pending_accounts', '当前批次剩余未处理的账号数')
+GUI_STALL_SECONDS = REGISTRY.histogram('autosub_gui_stall_seconds', '界面线程卡顿时长（秒）')
+PREVIEW_FRAMES = REGISTRY.counter('autosub_preview_frames_total',
+                                  '画面预览抓取的帧数（unchanged 为与上一帧相同、未重绘）', ['result'])
+DEVICE_WORKER_RESTARTS = REGISTRY.counter('autosub_device_worker_restarts_total',
+                                          '设备进程重启次数（timeout 为超时被结束，exited 为意外退出）',
+                                          ['reason'])
+
+
+def instrument_device(device):
+    """
+    统计 uiautomator2 设备对象的 JSON-RPC 调用次数。
+
+    uiautomator2 的所有 jsonrpc 调用都经过 device._jsonrpc_call，在实例上包一层计数即可，
+    不支持的版本直接跳过。
+
+    Args:
+        device: uiautomator2 设备对象。
+
+    Returns:
+        device: 传入的设备对象。
+    """
+    call = getattr(device, '_jsonrpc_call', None)
+    if call is None or getattr(call, '_metrics_wrapped', False):
+        return device
+
+    def counted_call(method, *args, **kwargs):
+        U2_RPCS.inc(method=method)
+        return call(method, *args, **kwargs)
+
+    counted_call._metrics_wrapped = True
+    try:
+        device._jsonrpc_call = counted_call
+    except AttributeError:
+        logger.debug("当前 uiautomator2 版本不支持统计 RPC 次数")
+    return device
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics 返回文本格式指标"""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 抓取请求很频繁，不写入日志
+        pass
+
+
+class MetricsServer:
+    """在本机端口上提供 /metrics，供监控系统抓取"""
+
+    def __init__(self, port=9108, host='127.0.0.1', registry=REGISTRY):
+        """
+        初始化 MetricsServer。
+
+        Args:
+            port (int, optional): 监听端口，0 表示随机分配。 Defaults to 9108.
+            host (str, optional): 监听地址，默认只监听本机。 Defaults to '127.0.0.1'.
+            registry (MetricsRegistry, optional): 要输出的注册表。
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """在后台线程中启动 HTTP 服务"""
+        if self._server:
+            return True
+        handler = type('MetricsHandler', (_MetricsHandler,), {'registry': self.registry})
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            logger.error("指标服务启动失败 ({}:{}): {}", self.host, self.port, str(e))
+            return False
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="metrics-http", daemon=True)
+        self._thread.start()
+        logger.info("指标服务已启动: http://{}:{}/metrics", self.host, self.port)
+        return True
+
+    def stop(self):
+        """停止 HTTP 服务"""
+        server, self._server = self._server, None
+        if server:
+            server.shutdown()
+            server.server_close()
+            self._thread.join(timeout=2)
+            self._thread = None
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+任务性能分析
+按需为每个账号的申购任务生成性能报告，默认关闭，关闭时只多一次判断
+    cprofile  确定性分析，输出 pstats 文件（可用 snakeviz 等工具查看）
+    sample    采样分析，输出折叠栈文件（可直接交给 flamegraph.pl / speedscope 生成火焰图）
+另外提供界面线程卡顿检测（StallDetector），独立于上述模式
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+import traceback
+import collections
+from contextlib import contextmanager
+from datetime import datetime
+from loguru import logger
+from metrics import GUI_STALL_SECONDS
+
+PROFILE_MODES = ('off', 'cprofile', 'sample')
+
+# 当前设置，可由环境变量 AUTOSUB_PROFILE 开启（不需要改配置文件）
+_settings = {
+    'mode': os.environ.get('AUTOSUB_PROFILE', 'off'),
+    'output_dir': os.environ.get('AUTOSUB_PROFILE_DIR', 'profiles'),
+    'interval': 0.005,
+}
+
+
+def configure(mode='off', output_dir='profiles', interval=0.005):
+    """
+    设置分析模式。
+
+    Args:
+        mode (str, optional): 'off'、'cprofile' 或 'sample'。 Defaults to 'off'.
+        output_dir (str, optional): 报告输出目录。 Defaults to 'profiles'.
+        interval (float, optional): 采样间隔（秒），仅 sample 模式使用。 Defaults to 0.005.
+    """
+    if mode not in PROFILE_MODES:
+        logger.warning("未知的性能分析模式: {}，已关闭", mode)
+        mode = 'off'
+    _settings.update(mode=mode, output_dir=output_dir, interval=interval)
+
+
+def is_enabled():
+    """是否开启了性能分析"""
+    return _settings['mode'] != 'off'
+
+
+def _report_path(job_name, suffix):
+    """报告文件路径：<输出目录>/<时间>_<任务名>.<后缀>"""
+    os.makedirs(_settings['output_dir'], exist_ok=True)
+    safe_name = re.sub(r'[^\w.-]+', '_', job_name)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(_settings['output_dir'], f"{stamp}_{safe_name}.{suffix}")
+
+
+class StackSampler:
+    """后台线程定期采样目标线程的调用栈，统计为折叠栈"""
+
+    def __init__(self, thread_id, interval=0.005):
+        """
+        初始化 StackSampler。
+
+        Args:
+            thread_id (int): 被采样线程的 ident。
+            interval (float, optional): 采样间隔（秒）。 Defaults to 0.005.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def write_collapsed(self, path):
+        """按 "栈;栈 次数" 的格式写出"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile_job(job_name):
+    """
+    对一个任务做性能分析，报告写入输出目录。未开启时不做任何事。
+
+    Args:
+        job_name (str): 任务名，用作报告文件名的一部分（例如 "subscribe_12345678"）。
+    """
+    mode = _settings['mode']
+    if mode == 'off':
+        yield
+        return
+
+    started = time.perf_counter()
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = _report_path(job_name, 'prof')
+            profiler.dump_stats(path)
+            logger.info("性能报告已保存: {} (耗时 {:.2f}s)", path, time.perf_counter() - started)
+    else:
+        sampler = StackSampler(threading.get_ident(), _settings['interval'])
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            path = _report_path(job_name, 'folded')
+            sampler.write_collapsed(path)
+            logger.info("性能报告已保存: {} ({} 个样本, 耗时 {:.2f}s)", path,
+                        sum(sampler.stacks.values()), time.perf_counter() - started)
+
+
+class StallDetector:
+    """
+    界面线程卡顿检测。
+
+    界面线程的定时器周期性调用 beat()；后台线程发现心跳停止超过阈值时，
+    记录一次界面线程当前的调用栈，恢复后再记录本次卡顿的总时长。
+    """
+
+    def __init__(self, thread_id, threshold=0.2):
+        """
+        初始化 StallDetector。
+
+        Args:
+            thread_id (int): 界面线程的 ident。
+            threshold (float, optional): 卡顿阈值（秒）。 Defaults to 0.2.
+        """
+        self.thread_id = thread_id
+        self.threshold = threshold
+        # 心跳间隔：由界面线程的定时器按此间隔调用 beat()
+        self.beat_interval = threshold / 4
+        self._last_beat = time.perf_counter()
+        self._reported = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._last_beat = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stall-detector", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def beat(self):
+        """界面线程的心跳，由事件循环中的定时器调用"""
+        now = time.perf_counter()
+        with self._lock:
+            stalled = now - self._last_beat - self.beat_interval
+            reported, self._reported = self._reported, False
+            self._last_beat = now
+        if stalled > self.threshold:
+            GUI_STALL_SECONDS.observe(stalled)
+            if reported:
+                logger.warning("界面线程卡顿结束，共 {:.2f} 秒", stalled)
+
+    def _run(self):
+        while not self._stop.wait(self.beat_interval):
+            with self._lock:
+                stalled = time.perf_counter() - self._last_beat - self.beat_interval
+                if stalled <= self.threshold or self._reported:
+                    continue
+                self._reported = True
+            frame = sys._current_frames().get(self.thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else '（无法获取调用栈）\n'
+            logger.warning("界面线程已卡顿 {:.2f} 秒，当前调用栈:\n{}", stalled, stack.rstrip())
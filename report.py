@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批次申购报告
+从数据库逐行读取某个批次的申购结果，生成 HTML 和 CSV 报告。
+账号明细边读边写，内存中只保留汇总数据，上千个账号的批次也不会占用大量内存。
+
+用法: python report.py [批次ID]   （不指定时使用最近一个批次）
+"""
+
+import os
+import csv
+import html
+import heapq
+import shutil
+import tempfile
+from loguru import logger
+from entity.subscription_result import SubscriptionResult
+
+REPORT_DIR = 'reports'
+
+CSV_FIELDS = ('account', 'outcome', 'failed_step', 'duration', 'retries',
+              'created_at', 'message', 'steps')
+
+OUTCOME_LABELS = {
+    'success': '成功', 'failed': '失败', 'error': '出错', 'cancelled': '已取消',
+    'skipped': '已跳过',
+}
+
+# 报告中列出的最慢账号数
+SLOWEST_COUNT = 10
+
+
+class RunSummary:
+    """批次汇总：逐条累加，不保存明细"""
+
+    def __init__(self):
+        self.total = 0
+        self.outcomes = {}
+        self.failed_steps = {}
+        self.retried_accounts = 0
+        self.total_retries = 0
+        self.total_duration = 0.0
+        self.first_finished = None
+        self.last_finished = None
+        self.first_duration = 0.0
+        # 步骤 -> [次数, 总耗时, 最大耗时]
+        self.steps = {}
+        # (耗时, 序号, 账号, 结果) 的小顶堆，保留最慢的几个
+        self._slowest = []
+
+    def add(self, row, retries):
+        self.total += 1
+        self.outcomes[row.outcome] = self.outcomes.get(row.outcome, 0) + 1
+        if row.failed_step:
+            self.failed_steps[row.failed_step] = self.failed_steps.get(row.failed_step, 0) + 1
+        if retries:
+            self.retried_accounts += 1
+            self.total_retries += retries
+        self.total_duration += row.duration or 0
+
+        if self.first_finished is None:
+            self.first_finished = row.created_at
+            self.first_duration = row.duration or 0
+        self.last_finished = row.created_at
+
+        for step, seconds in row.step_times().items():
+            stat = self.steps.setdefault(step, [0, 0.0, 0.0])
+            stat[0] += 1
+            stat[1] += seconds
+            stat[2] = max(stat[2], seconds)
+
+        entry = (row.duration or 0, self.total, row.account, row.outcome)
+        if len(self._slowest) < SLOWEST_COUNT:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    @property
+    def elapsed_seconds(self):
+        """批次墙钟时长：第一个账号开始到最后一个账号完成"""
+        if self.first_finished is None:
+            return 0.0
+        span = (self.last_finished - self.first_finished).total_seconds() + self.first_duration
+        return span if span > 0 else self.total_duration
+
+    @property
+    def accounts_per_hour(self):
+        elapsed = self.elapsed_seconds
+        return self.total * 3600 / elapsed if elapsed else 0.0
+
+
+def _format_steps(steps):
+    return ' / '.join(f"{step} {seconds:.1f}s" for step, seconds in steps.items())
+
+
+def _cell(value):
+    return f"<td>{html.escape(str(value if value is not None else ''))}</td>"
+
+
+def generate_report(run_id=None, output_dir=REPORT_DIR):
+    """
+    生成批次报告。
+
+    Args:
+        run_id (str, optional): 批次ID，默认使用最近一个批次。
+        output_dir (str, optional): 输出目录。 Defaults to REPORT_DIR.
+
+    Returns:
+        tuple: (HTML 路径, CSV 路径)，没有申购记录时返回 None。
+    """
+    run_id = run_id or SubscriptionResult.latest_run_id()
+    if not run_id:
+        logger.warning("没有申购记录，无法生成报告")
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    html_path = os.path.join(output_dir, f"report_{run_id}.html")
+    csv_path = os.path.join(output_dir, f"report_{run_id}.csv")
+
+    summary = RunSummary()
+    # 账号明细先写入临时文件，汇总完成后拼接到 HTML 中
+    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as csv_file, \
+            tempfile.TemporaryFile('w+', encoding='utf-8') as rows_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_FIELDS)
+        for row in SubscriptionResult.iter_run(run_id):
+            retries = max((row.attempts or 1) - 1, 0)
+            steps = row.step_times()
+            summary.add(row, retries)
+            writer.writerow([row.account, row.outcome, row.failed_step or '',
+                             f"{row.duration:.3f}", retries,
+                             row.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                             row.message or '', row.steps or ''])
+            rows_file.write(
+                f'<tr class="{html.escape(row.outcome)}">' + ''.join(_cell(value) for value in (
+                    summary.total, row.account, OUTCOME_LABELS.get(row.outcome, row.outcome),
+                    row.failed_step, f"{row.duration:.1f}", retries,
+                    row.created_at.strftime('%H:%M:%S'), _format_steps(steps), row.message,
+                )) + '</tr>\n')
+
+        rows_file.seek(0)
+        with open(html_path, 'w', encoding='utf-8') as html_file:
+            _write_html(html_file, run_id, summary, rows_file)
+
+    logger.info("批次 {} 报告已生成: {} 个账号，{}，{}", run_id, summary.total, html_path, csv_path)
+    return html_path, csv_path
+
+
+def _write_html(out, run_id, summary, rows_file):
+    """写出 HTML：汇总、步骤耗时、最慢账号，再拼接账号明细"""
+    success = summary.outcomes.get('success', 0)
+    out.write(f"""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8">
+<title>申购报告 {html.escape(run_id)}</title>
+<style>
+body {{ font-family: sans-serif; margin: 24px; }}
+table {{ border-collapse: collapse; margin-bottom: 24px; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; font-size: 13px; }}
+th {{ background: #f0f0f0; }}
+tr.failed td, tr.error td {{ background: #fde8e8; }}
+tr.cancelled td {{ background: #f4f4f4; }}
+</style></head><body>
+<h1>申购报告 {html.escape(run_id)}</h1>
+<table>
+<tr><th>账号数</th><td>{summary.total}</td></tr>
+<tr><th>成功</th><td>{success}（{success * 100 / summary.total if summary.total else 0:.1f}%）</td></tr>
+""")
+    for outcome, count in sorted(summary.outcomes.items()):
+        if outcome != 'success':
+            out.write(f"<tr><th>{html.escape(OUTCOME_LABELS.get(outcome, outcome))}</th><td>{count}</td></tr>\n")
+    out.write(f"""<tr><th>重试账号数 / 重试次数</th><td>{summary.retried_accounts} / {summary.total_retries}</td></tr>
+<tr><th>批次耗时</th><td>{summary.elapsed_seconds / 60:.1f} 分钟</td></tr>
+<tr><th>平均每个账号</th><td>{summary.total_duration / summary.total if summary.total else 0:.1f} 秒</td></tr>
+<tr><th>每小时账号数</th><td>{summary.accounts_per_hour:.1f}</td></tr>
+</table>
+""")
+
+    out.write("<h2>步骤耗时</h2>\n<table><tr><th>步骤</th><th>次数</th><th>平均（秒）</th>"
+              "<th>最长（秒）</th><th>合计（秒）</th><th>失败次数</th></tr>\n")
+    for step, (count, total, longest) in summary.steps.items():
+        out.write(f"<tr>{_cell(step)}{_cell(count)}{_cell(f'{total / count:.2f}')}"
+                  f"{_cell(f'{longest:.2f}')}{_cell(f'{total:.1f}')}"
+                  f"{_cell(summary.failed_steps.get(step, 0))}</tr>\n")
+    out.write("</table>\n")
+
+    out.write("<h2>最慢的账号</h2>\n<table><tr><th>账号</th><th>耗时（秒）</th><th>结果</th></tr>\n")
+    for duration, _, account, outcome in summary.slowest:
+        out.write(f"<tr>{_cell(account)}{_cell(f'{duration:.1f}')}"
+                  f"{_cell(OUTCOME_LABELS.get(outcome, outcome))}</tr>\n")
+    out.write("</table>\n")
+
+    out.write("<h2>账号明细</h2>\n<table><tr><th>#</th><th>账号</th><th>结果</th><th>失败步骤</th>"
+              "<th>耗时（秒）</th><th>重试</th><th>完成时间</th><th>步骤耗时</th><th>信息</th></tr>\n")
+    shutil.copyfileobj(rows_file, out)
+    out.write("</table>\n</body></html>\n")
+
+
+if __name__ == "__main__":
+    import sys
+    from entity.base_model import create_tables
+
+    create_tables([SubscriptionResult])
+    result = generate_report(sys.argv[1] if len(sys.argv) > 1 else None)
+    if result:
+        print(f"HTML: {result[0]}\nCSV: {result[1]}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+定时申购
+在开放时间之前完成启动APP、登录等准备工作，停在申购界面，到点后立即点击申购
+"""
+
+import time
+from datetime import datetime
+from loguru import logger
+from cancellation import Cancelled
+
+
+def parse_fire_time(value, now=None):
+    """
+    把 "HH:MM:SS" 解析为今天对应时刻的时间戳。
+
+    Args:
+        value (str): 触发时间。
+        now (datetime, optional): 当前时间，默认取系统时间。
+
+    Returns:
+        float: 时间戳（秒）。
+    """
+    now = now or datetime.now()
+    fire_time = datetime.strptime(value, '%H:%M:%S').time()
+    return datetime.combine(now.date(), fire_time).timestamp()
+
+
+def measure_clock_offset(emulator, samples=5):
+    """
+    测量设备时钟与本机时钟的偏差，取往返耗时最短的一次采样。
+
+    Args:
+        emulator (SimpleEmulator): 已连接的模拟器。
+        samples (int, optional): 采样次数。 Defaults to 5.
+
+    Returns:
+        tuple: (偏差秒数 = 设备时间 - 本机时间, 往返秒数)，无法测量时返回 (0.0, None)。
+    """
+    best = None
+    for _ in range(samples):
+        sent = time.time()
+        output = emulator.shell('date +%s.%N')
+        received = time.time()
+        try:
+            device_time = float(output)
+        except ValueError:
+            # 部分系统的 date 不支持 %N，只能精确到秒
+            try:
+                device_time = float(emulator.shell('date +%s')) + 0.5
+            except ValueError:
+                continue
+        rtt = received - sent
+        offset = device_time - (sent + received) / 2
+        if best is None or rtt < best[1]:
+            best = (offset, rtt)
+
+    if best is None:
+        logger.warning("无法测量设备时钟偏差")
+        return 0.0, None
+    return best
+
+
+def wait_until(target, spin=0.02, cancel_token=None):
+    """
+    等待到指定时间戳。大部分时间休眠，最后一小段忙等以减少唤醒误差。
+
+    Args:
+        target (float): 目标时间戳（秒）。
+        spin (float, optional): 忙等的时长（秒）。 Defaults to 0.02.
+        cancel_token (CancelToken, optional): 取消标记，取消时抛出 Cancelled。
+
+    Raises:
+        Cancelled: 等待期间被取消。
+    """
+    while True:
+        remaining = target - time.time()
+        if remaining <= 0:
+            return
+        if remaining > spin:
+            if cancel_token:
+                cancel_token.sleep(min(remaining - spin, 1.0))
+            else:
+                time.sleep(min(remaining - spin, 1.0))
+
+
+class SubscriptionScheduler:
+    """单台设备的定时申购：提前就位，到点点击"""
+
+    def __init__(self, emulator, fire_at, lead_seconds=90, use_device_clock=False, force=False):
+        """
+        初始化 SubscriptionScheduler。
+
+        Args:
+            emulator (SimpleEmulator): 模拟器对象。
+            fire_at (float): 触发时间戳（秒）。
+            lead_seconds (int, optional): 提前多少秒开始准备。 Defaults to 90.
+            use_device_clock (bool, optional): 触发时间是否按设备时钟计算。 Defaults to False.
+            force (bool, optional): 今天已完成申购的账号也重新申购。 Defaults to False.
+        """
+        self.emulator = emulator
+        self.fire_at = fire_at
+        self.lead_seconds = lead_seconds
+        self.use_device_clock = use_device_clock
+        self.force = force
+
+    def run(self, user):
+        """
+        为一个账号执行定时申购。
+
+        Args:
+            user (dict | User): 账号信息。
+
+        Returns:
+            bool: 是否申购成功。触发情况记录在 emulator.last_run['fire'] 中。
+
+        Raises:
+            Cancelled: 等待期间被取消（已就位的会话会被关闭）。
+        """
+        self.emulator.last_run = None
+        prepare_at = self.fire_at - self.lead_seconds
+        if time.time() < prepare_at:
+            logger.info("等待到 {} 开始准备申购",
+                        datetime.fromtimestamp(prepare_at).strftime('%H:%M:%S'))
+            wait_until(prepare_at, cancel_token=self.emulator.cancel_token)
+
+        if not self.emulator.ensure_connection():
+            logger.error("无法建立设备连接")
+            return False
+
+        offset, rtt = measure_clock_offset(self.emulator)
+        logger.info("设备时钟偏差 {:.1f} ms，往返 {}", offset * 1000,
+                    f"{rtt * 1000:.1f} ms" if rtt is not None else "未知")
+        target = self.fire_at - offset if self.use_device_clock else self.fire_at
+
+        if not self.emulator.prepare_subscription(user, force=self.force):
+            logger.error("申购准备失败")
+            return False
+        if self.emulator.last_run['outcome'] == 'skipped':
+            # 今天已完成，没有需要触发的会话
+            return True
+
+        if time.time() > target:
+            logger.warning("准备完成时已超过触发时间 {:.0f} ms", (time.time() - target) * 1000)
+        else:
+            logger.info("已停在申购界面，等待 {:.1f} 秒后触发", target - time.time())
+            try:
+                wait_until(target, cancel_token=self.emulator.cancel_token)
+            except Cancelled:
+                self.emulator.release_held()
+                raise
+
+        sent = time.time()
+        success = self.emulator.fire_apply()
+        finished = time.time()
+
+        fire = {
+            'target': datetime.fromtimestamp(target).strftime('%H:%M:%S.%f')[:-3],
+            # 本机发出点击相对目标时间的延迟
+            'send_delay_ms': round((sent - target) * 1000, 1),
+            # 点击调用的耗时
+            'click_ms': round((finished - sent) * 1000, 1),
+            'clock_offset_ms': round(offset * 1000, 1),
+            'rtt_ms': round(rtt * 1000, 1) if rtt is not None else None,
+        }
+        if self.emulator.last_run is not None:
+            self.emulator.last_run['fire'] = fire
+        logger.info("触发延迟 {} ms，点击耗时 {} ms", fire['send_delay_ms'], fire['click_ms'])
+        return success
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+备选选择器排序
+同一个元素有多种写法时，记录每个APP版本上实际命中的写法，下次优先尝试
+"""
+
+import threading
+from loguru import logger
+from json_store import load_json, update_json
+
+SELECTOR_RANK_FILE = 'selector_rank.json'
+
+
+class SelectorRanking:
+    """按包名和APP版本记录各组备选选择器的命中次数"""
+
+    def __init__(self, cache_file=SELECTOR_RANK_FILE):
+        """
+        初始化 SelectorRanking。
+
+        Args:
+            cache_file (str, optional): 持久化文件路径。 Defaults to SELECTOR_RANK_FILE.
+        """
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._hits = self._load()
+
+    @staticmethod
+    def make_key(package, app_version):
+        """生成版本键"""
+        return f"{package}@{app_version}"
+
+    @staticmethod
+    def group_key(names):
+        """一组备选选择器的键（与顺序无关）"""
+        return '|'.join(sorted(names))
+
+    def _load(self):
+        """从文件加载命中记录"""
+        return load_json(self.cache_file, '选择器排序')
+
+    def _save(self, version_key, group_key):
+        """把一组选择器的命中次数合并到文件中（各名称取较大的次数，保留其他进程的记录），调用方持有锁"""
+        hits = self._hits[version_key][group_key]
+
+        def merge(data):
+            saved = data.setdefault(version_key, {}).setdefault(group_key, {})
+            for name, count in hits.items():
+                saved[name] = max(saved.get(name, 0), count)
+
+        data = update_json(self.cache_file, merge, '选择器排序')
+        if data is not None:
+            self._hits = data
+
+    def order(self, package, app_version, names):
+        """
+        按历史命中次数排列备选选择器，没有记录的保持原顺序排在后面。
+
+        Args:
+            package (str): 包名。
+            app_version (str): APP版本号。
+            names (list): 备选选择器名称。
+
+        Returns:
+            list: 排序后的名称。
+        """
+        with self._lock:
+            hits = dict(self._hits.get(self.make_key(package, app_version), {})
+                        .get(self.group_key(names), {}))
+        if not hits:
+            return list(names)
+        return sorted(names, key=lambda name: -hits.get(name, 0))
+
+    def record(self, package, app_version, names, winner):
+        """
+        记录一次命中。只有排在第一的选择器变化时才写文件，其余情况下次数只在内存中累加。
+
+        Args:
+            package (str): 包名。
+            app_version (str): APP版本号。
+            names (list): 这一组备选选择器。
+            winner (str): 实际命中的名称。
+        """
+        if len(names) < 2:
+            return
+        with self._lock:
+            version_key, group_key = self.make_key(package, app_version), self.group_key(names)
+            hits = self._hits.setdefault(version_key, {}).setdefault(group_key, {})
+            previous_first = max(hits, key=hits.get) if hits else None
+            hits[winner] = hits.get(winner, 0) + 1
+            first = max(hits, key=hits.get)
+            if first != previous_first:
+                logger.info("{} 优先使用选择器 {}", self.make_key(package, app_version), first)
+                self._save(version_key, group_key)
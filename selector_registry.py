@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+界面元素选择器注册表
+每个选择器只构建一次，并提供一次设备调用完成"查找+点击"的操作
+"""
+
+import time
+import xml.etree.ElementTree as ET
+from loguru import logger
+from keypad_layout import parse_bounds, center_of
+
+try:
+    from uiautomator2.exceptions import UiObjectNotFoundError
+except ImportError:
+    UiObjectNotFoundError = LookupError
+
+# 同花顺包名
+HEXIN_PACKAGE = 'com.hexin.plat.android'
+
+# 选择器定义：名称 -> uiautomator2 选择条件，xpath 选择器写作 {'xpath': 表达式}
+SELECTOR_SPECS = {
+    HEXIN_PACKAGE: {
+        # 启动弹窗
+        'popup_close_button': {'resourceId': 'com.hexin.plat.android:id/close_button'},
+        'popup_close': {'text': '关闭'},
+        'popup_cancel': {'text': '取消'},
+        'popup_skip': {'text': '跳过'},
+        'popup_later': {'text': '稍后'},
+        'popup_got_it': {'text': '知道了'},
+        # 交易按钮的几种写法（不同版本）
+        'trade_tab_text': {'text': '交易'},
+        'trade_tab_xpath': {'xpath': '//*[@content-desc="交易"]/android.widget.ImageView[1]'},
+        'trade_tab_desc': {'description': '交易'},
+        'trade_tab_id': {'resourceId': 'com.hexin.plat.android:id/tab_trade'},
+        # 交易界面
+        'account_item': {'resourceId': 'com.hexin.plat.android:id/txt_account_value'},
+        'password_edit': {'resourceId': 'com.hexin.plat.android:id/weituo_edit_trade_password'},
+        'login_button': {'resourceId': 'com.hexin.plat.android:id/weituo_btn_login'},
+        'lottery_popup_cancel': {'resourceId': 'com.hexin.plat.android:id/iv_operate_cancel'},
+        'option_apply': {'resourceId': 'com.hexin.plat.android:id/option_apply'},
+        # 申购界面上"今天没有可申购新股"的提示
+        'no_issue_today': {'text': '今日无新股'},
+        'no_issue_empty': {'text': '暂无可申购新股'},
+    },
+}
+
+# 选择条件与界面层级节点属性的对应关系
+HIERARCHY_ATTRIBUTES = {
+    'resourceId': 'resource-id',
+    'text': 'text',
+    'description': 'content-desc',
+    'className': 'class',
+}
+
+# 启动弹窗的关闭按钮，按优先级排列
+POPUP_SELECTORS = ['popup_close_button', 'popup_close', 'popup_cancel',
+                   'popup_skip', 'popup_later', 'popup_got_it']
+
+# 交易按钮的备选选择器
+TRADE_TAB_SELECTORS = ['trade_tab_text', 'trade_tab_xpath', 'trade_tab_desc', 'trade_tab_id']
+
+# 今天没有可申购新股的提示
+NO_ISSUE_SELECTORS = ['no_issue_today', 'no_issue_empty']
+
+
+class SelectorRegistry:
+    """按名称缓存某个设备、某个APP的选择器对象"""
+
+    def __init__(self, device, package):
+        """
+        初始化 SelectorRegistry。
+
+        Args:
+            device: uiautomator2 设备对象。
+            package (str): 券商APP包名，决定使用哪组选择器定义。
+        """
+        self.device = device
+        self.package = package
+        self.specs = SELECTOR_SPECS.get(package, {})
+        self._selectors = {}
+
+    def spec(self, name):
+        """选择器定义，未定义时抛出 KeyError（空定义会匹配任意节点）"""
+        spec = self.specs.get(name)
+        if spec is None:
+            raise KeyError(f"{self.package} 未定义选择器: {name}")
+        return spec
+
+    def get(self, name):
+        """获取选择器对象，首次使用时构建"""
+        selector = self._selectors.get(name)
+        if selector is None:
+            spec = self.spec(name)
+            if 'xpath' in spec:
+                selector = self.device.xpath(spec['xpath'])
+            else:
+                selector = self.device(**spec)
+            self._selectors[name] = selector
+        return selector
+
+    def is_xpath(self, name):
+        """选择器是否为 xpath 类型"""
+        return 'xpath' in self.specs.get(name, {})
+
+    def exists(self, name):
+        """元素当前是否存在"""
+        return self.get(name).exists
+
+    def click_if_exists(self, name):
+        """
+        元素存在时点击，一次设备调用完成查找和点击。
+
+        普通选择器直接调用服务端的 click(selector)，不再先查询 exists、
+        再查询坐标、最后点击；xpath 选择器需要先获取界面层级，退化为 click_exists。
+
+        Args:
+            name (str): 选择器名称。
+
+        Returns:
+            bool: 是否点击成功（元素不存在时返回 False）。
+        """
+        selector = self.get(name)
+        try:
+            if self.is_xpath(name):
+                return bool(selector.click_exists(timeout=0))
+            return bool(self.device.jsonrpc.click(selector.selector))
+        except UiObjectNotFoundError:
+            return False
+
+    def find_in_hierarchy(self, hierarchy_xml, names):
+        """
+        在一次 dump_hierarchy 的结果中查找选择器，不再逐个发起设备调用。
+
+        xpath 选择器不参与匹配。
+
+        Args:
+            hierarchy_xml (str): device.dump_hierarchy() 的返回值。
+            names (list): 选择器名称列表。
+
+        Returns:
+            str: 第一个能匹配到节点的选择器名称，都匹配不到返回 None。
+
+        Raises:
+            KeyError: 名称未定义。
+        """
+        specs = [(name, self.spec(name)) for name in names if not self.is_xpath(name)]
+        if not specs:
+            return None
+        try:
+            nodes = list(ET.fromstring(hierarchy_xml).iter('node'))
+        except ET.ParseError as e:
+            logger.warning("解析界面层级失败: {}", str(e))
+            return None
+
+        for name, spec in specs:
+            if any(self._node_matches(node, spec) for node in nodes):
+                return name
+        return None
+
+    def locate_in_hierarchy(self, hierarchy_xml, names):
+        """
+        在一次 dump_hierarchy 的结果中查找多个选择器的中心坐标。
+
+        Args:
+            hierarchy_xml (str): device.dump_hierarchy() 的返回值。
+            names (list): 选择器名称列表（不支持 xpath）。
+
+        Returns:
+            dict: {名称: (x, y)}，找不到的名称不在结果中。
+
+        Raises:
+            KeyError: 名称未定义。
+        """
+        try:
+            nodes = list(ET.fromstring(hierarchy_xml).iter('node'))
+        except ET.ParseError as e:
+            logger.warning("解析界面层级失败: {}", str(e))
+            return {}
+
+        points = {}
+        for name in names:
+            spec = self.spec(name)
+            for node in nodes:
+                rect = parse_bounds(node.get('bounds'))
+                if rect and self._node_matches(node, spec):
+                    points[name] = center_of(rect)
+                    break
+        return points
+
+    @staticmethod
+    def _node_matches(node, spec):
+        return all(node.get(HIERARCHY_ATTRIBUTES.get(key, key)) == value
+                   for key, value in spec.items())
+
+    def wait_any(self, names, timeout, dismiss=None, poll_interval=0.3, sleep=time.sleep):
+        """
+        同时等待多个备选选择器，共用一个超时，返回最先出现的一个。
+
+        只有一个普通选择器时直接查询 exists；多个时每轮只获取一次界面层级，
+        在其中同时匹配全部备选和需要关闭的弹窗，只点击实际存在的弹窗。
+        xpath 选择器无法在层级中匹配，每轮单独查询。
+
+        Args:
+            names (list): 备选选择器名称，同时出现多个时按列表顺序优先。
+            timeout (float): 最长等待秒数。
+            dismiss (list, optional): 等待期间出现就关闭的弹窗选择器。 Defaults to None.
+            poll_interval (float, optional): 轮询间隔（秒）。 Defaults to 0.3.
+            sleep (callable, optional): 等待函数（可传入可被取消的 sleep）。 Defaults to time.sleep.
+
+        Returns:
+            str: 命中的选择器名称，超时返回 None。
+        """
+        dismiss = dismiss or []
+        plain = [name for name in names if not self.is_xpath(name)]
+        xpaths = [name for name in names if self.is_xpath(name)]
+        plain_dismiss = [name for name in dismiss if not self.is_xpath(name)]
+        xpath_dismiss = [name for name in dismiss if self.is_xpath(name)]
+        use_hierarchy = len(plain) + len(plain_dismiss) > 1
+
+        deadline = time.monotonic() + timeout
+        while True:
+            if use_hierarchy:
+                hit = self._poll_hierarchy(plain, plain_dismiss)
+            else:
+                if plain_dismiss:
+                    self._dismiss(plain_dismiss)
+                hit = next((name for name in plain if self._exists_quietly(name)), None)
+            if hit is None:
+                if xpath_dismiss:
+                    self._dismiss(xpath_dismiss)
+                hit = next((name for name in xpaths if self._exists_quietly(name)), None)
+            if hit is not None:
+                return hit
+
+            if time.monotonic() >= deadline:
+                return None
+            sleep(poll_interval)
+
+    def _poll_hierarchy(self, names, dismiss):
+        """获取一次界面层级：有弹窗先关闭，再匹配备选选择器"""
+        try:
+            hierarchy = self.device.dump_hierarchy()
+        except Exception as e:
+            logger.debug("获取界面层级失败: {}", str(e))
+            return None
+
+        popup = self.find_in_hierarchy(hierarchy, dismiss) if dismiss else None
+        if popup and self.click_if_exists(popup):
+            # 关闭弹窗后界面已变化，下一轮重新获取
+            logger.info("关闭弹窗: {}", popup)
+            return None
+        return self.find_in_hierarchy(hierarchy, names)
+
+    def _dismiss(self, names):
+        closed = self.click_first_of(names)
+        if closed:
+            logger.info("关闭弹窗: {}", closed)
+
+    def _exists_quietly(self, name):
+        try:
+            return self.exists(name)
+        except Exception as e:
+            logger.debug("检查{}时出错: {}", name, str(e))
+            return False
+
+    def click_first_of(self, names):
+        """
+        按顺序尝试点击第一个存在的元素。
+
+        Args:
+            names (list): 选择器名称列表。
+
+        Returns:
+            str: 被点击的选择器名称，都不存在时返回 None。
+        """
+        for name in names:
+            try:
+                if self.click_if_exists(name):
+                    return name
+            except Exception as e:
+                logger.warning("点击{}时出错: {}", name, str(e))
+        return None
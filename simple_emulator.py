@@ -1,8 +1,22 @@
 import os
+import re
 import subprocess
 import time
 import json
+import threading
 from loguru import logger
+from keypad_layout import KeypadLayoutCache, DEFAULT_KEYPAD_LAYOUT
+from selector_ranking import SelectorRanking
+from device_facts import DeviceFactsCache
+from device_macros import MACROS, macro_path, push_command
+from adb_shell import get_shell_channel, release_shell_channel, AdbShellError
+from selector_registry import SelectorRegistry, HEXIN_PACKAGE, POPUP_SELECTORS
+from flows import get_flow
+from flow_engine import FlowEngine
+from metrics import ADB_COMMANDS, RECONNECTS, STEP_SECONDS, APP_LAUNCH_SECONDS, instrument_device
+from cancellation import CancelToken, Cancelled, run_process, guard_device
+from entity.subscription_ledger import SubscriptionLedger
+from issue_calendar import IssueCalendar, NO_ISSUE_MESSAGE
 
 try:
     import uiautomator2 as u2
@@ -18,7 +32,50 @@ class SimpleEmulator:
         self.adb_path = os.path.join(path, "adb.exe")
         self.device = None
         self.connected_port = None
+        # 只连接这些端口（多设备时每个进程固定一台设备），None 表示依次尝试常用端口
+        self.ports = None
         self.is_connected = False
+        # 屏幕尺寸，每次连接后从设备信息缓存读取
+        self.screen_size = None
+        # 设备信息缓存（APP版本、屏幕、SDK等），按序列号持久化，重启或APP升级后失效
+        self.device_facts = DeviceFactsCache()
+        self.facts = None
+        # 本次连接中已推送到设备的宏
+        self._pushed_macros = set()
+        # 数字键盘布局缓存（按分辨率和APP版本）
+        self.keypad_cache = KeypadLayoutCache()
+        # 备选选择器的命中记录（按APP版本），优先尝试历史上命中的写法
+        self.selector_ranking = SelectorRanking()
+        # 最近一次申购的执行情况（结果、失败步骤、各步骤耗时）
+        self.current_step = None
+        self.step_times = {}
+        self._step_started = None
+        self.last_run = None
+        # 选择器注册表，按设备和包名缓存
+        self._selectors = None
+        # 当前APP中已选中（登录）的账号，APP重启后清空
+        self.session_account = None
+        # 已就位、等待 fire_apply 的会话 (流程定义, 暂停的状态)
+        self._held = None
+        # 申购台账（按账号和交易日），今天已完成的账号默认跳过
+        self.ledger = SubscriptionLedger
+        # 当前申购的 (账号, 批次ID)，成功后写入台账
+        self._run_account = None
+        # 当日无新股记录：某个账号确认今天没有新股后，其余账号直接跳过
+        self.issue_calendar = IssueCalendar()
+        # 本次申购在申购界面看到了"没有可申购新股"的提示
+        self._no_issue = False
+        # 连接存活状态缓存：TTL 内认为连接可用，由后台心跳刷新
+        self.liveness_ttl = 5.0
+        self.heartbeat_interval = 2.0
+        self._last_alive = 0.0
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = None
+        self._connection_lock = threading.RLock()
+        # 当前任务的取消标记，由 AdbWorker 在每个任务开始时设置
+        self.cancel_token = CancelToken()
+        # adb 命令的超时（秒）
+        self.command_timeout = 30
         
         # 从配置文件读取模拟器路径
         try:
@@ -30,22 +87,68 @@ class SimpleEmulator:
             logger.error("读取配置文件失败: {}", str(e))
             self.simulator_exe_path = None
     
-    def run_command(self, command):
-        """执行shell命令"""
+    def set_cancel_token(self, token=None):
+        """
+        设置当前任务的取消标记。取消时关闭 shell 通道，正在执行的 shell 命令立即返回。
+
+        Args:
+            token (CancelToken, optional): 取消标记，None 表示换成一个新的（不会被取消的）标记。
+        """
+        self.cancel_token = token or CancelToken()
+        self.cancel_token.on_cancel(self._close_shell_channel)
+
+    def _close_shell_channel(self):
+        if self.serial:
+            get_shell_channel(self.adb_path, self.serial).close()
+
+    def sleep(self, seconds):
+        """可被取消打断的等待，取消时抛出 Cancelled"""
+        self.cancel_token.sleep(seconds)
+
+    def run_command(self, command, timeout=None):
+        """执行shell命令（超时或取消时结束进程并返回空字符串）"""
+        ADB_COMMANDS.inc(kind='spawn')
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding='utf-8',
-                errors='ignore'
-            )
+            result = run_process(command, timeout or self.command_timeout, self.cancel_token)
             return result.stdout.strip()
+        except subprocess.TimeoutExpired:
+            logger.error("执行命令超时 ({}s): {}", timeout or self.command_timeout, command)
+            return ""
+        except Cancelled:
+            logger.warning("命令已取消: {}", command)
+            return ""
         except Exception as e:
             logger.error("执行命令失败 ({}): {}", command, str(e))
             return ""
     
+    @property
+    def serial(self):
+        """当前连接的设备序列号"""
+        return f"127.0.0.1:{self.connected_port}" if self.connected_port else None
+
+    def shell(self, command, timeout=10):
+        """
+        在设备上执行 shell 命令，优先使用常驻 shell 通道，避免每次建立新会话。
+
+        Args:
+            command (str): shell 命令。
+            timeout (float, optional): 超时秒数。 Defaults to 10.
+
+        Returns:
+            str: 命令输出，失败时返回空字符串。
+        """
+        if not self.serial:
+            return self.run_command(f'"{self.adb_path}" shell {command}')
+        ADB_COMMANDS.inc(kind='shell')
+        if self.cancel_token.is_cancelled():
+            return ""
+        try:
+            _, output = get_shell_channel(self.adb_path, self.serial, user=self).run(command, timeout)
+            return output.strip()
+        except AdbShellError as e:
+            logger.warning("shell 命令执行失败: {}", str(e))
+            return ""
+
     def check_adb_connection(self):
         """检查并建立ADB连接"""
         try:
@@ -61,8 +164,8 @@ class SimpleEmulator:
                 if not self.start_nox_emulator():
                     return False
             
-            # 尝试连接到常用端口
-            ports = ['62001', '62025', '62026', '5555']
+            # 尝试连接到指定端口或常用端口
+            ports = self.ports or ['62001', '62025', '62026', '5555']
             for port in ports:
                 if self.try_connect_port(port):
                     self.connected_port = port
@@ -81,12 +184,12 @@ class SimpleEmulator:
         try:
             # 断开可能的旧连接
             self.run_command(f'"{self.adb_path}" disconnect 127.0.0.1:{port}')
-            time.sleep(0.5)
+            self.sleep(0.5)
             
             # 连接
             result = self.run_command(f'"{self.adb_path}" connect 127.0.0.1:{port}')
             if "connected" in result or "already connected" in result:
-                time.sleep(2)
+                self.sleep(2)
                 
                 # 验证连接状态
                 devices = self.run_command(f'"{self.adb_path}" devices')
@@ -101,14 +204,7 @@ class SimpleEmulator:
     def is_nox_running(self):
         """检查夜神模拟器是否运行"""
         try:
-            result = subprocess.run(
-                'tasklist /FI "IMAGENAME eq Nox.exe"',
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding='utf-8',
-                errors='ignore'
-            )
+            result = run_process('tasklist /FI "IMAGENAME eq Nox.exe"', 10, self.cancel_token)
             return "Nox.exe" in result.stdout
         except Exception:
             return False
@@ -143,10 +239,10 @@ class SimpleEmulator:
             
             # 等待启动
             for i in range(30):  # 最多等待30秒
-                time.sleep(2)
+                self.sleep(2)
                 if self.is_nox_running():
                     # 再等待几秒让模拟器完全启动
-                    time.sleep(5)
+                    self.sleep(5)
                     return True
             
             logger.error("模拟器启动超时")
@@ -168,13 +264,17 @@ class SimpleEmulator:
         
         try:
             logger.info("连接到uiautomator2设备...")
-            self.device = u2.connect(f"127.0.0.1:{self.connected_port}")
+            self.device = guard_device(instrument_device(u2.connect(f"127.0.0.1:{self.connected_port}")),
+                                       lambda: self.cancel_token)
             
-            # 简单验证
+            # 简单验证（轻量探测，屏幕尺寸等信息按需读取）
             try:
-                info = self.device.device_info
-                if info:
+                if self.probe_alive():
                     self.is_connected = True
+                    self._pushed_macros.clear()
+                    self.mark_alive()
+                    self.start_heartbeat()
+                    self.load_device_facts()
                     logger.info("uiautomator2连接成功")
                     return True
             except Exception as e:
@@ -190,23 +290,145 @@ class SimpleEmulator:
             self.is_connected = False
             return False
     
-    def ensure_connection(self):
-        """确保连接可用"""
-        if self.is_connected and self.device:
+    def load_device_facts(self):
+        """连接后读取（或验证缓存的）设备信息，一次 shell 调用"""
+        try:
+            self.facts = self.device_facts.load(self.serial, self.shell)
+            if self.facts.get('screen'):
+                self.screen_size = tuple(self.facts['screen'])
+        except Exception as e:
+            logger.warning("读取设备信息失败: {}", str(e))
+            self.facts = None
+
+    def get_app_version(self, package):
+        """APP版本号（来自设备信息缓存），未安装时返回 None"""
+        return self.device_facts.app_version(self.serial, self.shell, package)
+
+    def launch_app(self, package, timeout=15):
+        """
+        通过 `am start -W` 启动APP，命令在启动页显示后才返回，不需要轮询前台APP。
+
+        Args:
+            package (str): APP包名。
+            timeout (float, optional): 最长等待秒数。 Defaults to 15.
+
+        Returns:
+            dict: am start 报告的 Status、LaunchState、TotalTime、WaitTime；
+                无法解析启动页或启动失败时返回 None（调用方应退回其他启动方式）。
+        """
+        component = self.device_facts.launch_component(self.serial, self.shell, package)
+        if not component:
+            logger.warning("无法解析 {} 的启动页", package)
+            return None
+
+        output = self.shell(f'am start -W -n {component}', timeout=timeout)
+        report = dict(re.findall(r'^(\w+): (.+)$', output, re.MULTILINE))
+        if report.get('Status') != 'ok':
+            logger.warning("am start 启动 {} 失败: {}", component, output or '无输出')
+            return None
+
+        for measure, key in (('total', 'TotalTime'), ('wait', 'WaitTime')):
+            if report.get(key, '').isdigit():
+                APP_LAUNCH_SECONDS.observe(int(report[key]) / 1000, measure=measure)
+        logger.info("{} 已启动 ({}): TotalTime {} ms，WaitTime {} ms", package,
+                    report.get('LaunchState', '-'), report.get('TotalTime', '-'),
+                    report.get('WaitTime', '-'))
+        return report
+
+    def probe_alive(self):
+        """轻量存活探测：只查询 atx-agent 中 uiautomator 服务的状态，不发起完整 RPC"""
+        device = self.device
+        return bool(device and device.uiautomator.running())
+
+    def mark_alive(self):
+        """记录最近一次确认连接可用的时间"""
+        self._last_alive = time.monotonic()
+
+    def is_alive_cached(self):
+        """TTL 内的缓存存活状态"""
+        return (self.is_connected and self.device is not None
+                and time.monotonic() - self._last_alive < self.liveness_ttl)
+
+    def start_heartbeat(self):
+        """启动后台心跳线程（已运行时不重复启动）"""
+        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+            return
+        self._heartbeat_stop.clear()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop,
+                                                  name="u2-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        """停止后台心跳线程"""
+        self._heartbeat_stop.set()
+        thread, self._heartbeat_thread = self._heartbeat_thread, None
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=self.heartbeat_interval + 1)
+
+    def _heartbeat_loop(self):
+        """定期探测连接，连续两次失败后主动重连，不等到下一个账号开始时才发现"""
+        failures = 0
+        while not self._heartbeat_stop.wait(self.heartbeat_interval):
+            try:
+                alive = self.probe_alive()
+            except Exception as e:
+                logger.debug("心跳探测失败: {}", str(e))
+                alive = False
+
+            if alive:
+                failures = 0
+                self.mark_alive()
+                continue
+
+            failures += 1
+            if failures < 2:
+                continue
+
+            # 申购流程正在使用设备（持有连接锁）或有已就位的会话时不能替换会话，
+            # 只让缓存的存活状态过期，由下一个账号开始前的 ensure_connection 重连
+            if not self._connection_lock.acquire(blocking=False):
+                self._last_alive = 0.0
+                continue
             try:
-                # 简单测试连接是否还有效
-                self.device.device_info
+                if self._heartbeat_stop.is_set():
+                    break
+                if self._held:
+                    self._last_alive = 0.0
+                    continue
+                logger.warning("心跳检测到连接已断开，主动重连...")
+                RECONNECTS.inc(source='heartbeat')
+                self.is_connected = False
+                self.device = None
+                if self.check_adb_connection() and self.connect_device():
+                    failures = 0
+                    logger.info("心跳重连成功")
+            finally:
+                self._connection_lock.release()
+
+    def ensure_connection(self):
+        """确保连接可用（热路径直接使用心跳维护的缓存状态）"""
+        with self._connection_lock:
+            if self.is_alive_cached():
                 return True
-            except Exception:
+
+            if self.is_connected and self.device:
+                try:
+                    # 缓存过期，做一次轻量探测
+                    if self.probe_alive():
+                        self.mark_alive()
+                        return True
+                except Exception:
+                    pass
                 logger.warning("连接已断开，重新连接...")
+                RECONNECTS.inc(source='on_demand')
                 self.is_connected = False
                 self.device = None
-        
-        # 重新建立连接
-        if self.check_adb_connection():
-            return self.connect_device()
-        
-        return False
+
+            # 重新建立连接
+            if self.check_adb_connection():
+                return self.connect_device()
+
+            return False
     
     def wait_for_element(self, selector, timeout=10, description="元素"):
         """等待元素出现"""
@@ -216,50 +438,51 @@ class SimpleEmulator:
                 if selector.exists:
                     logger.info("{}已出现", description)
                     return True
-                time.sleep(1)
+                self.sleep(1)
+            except Cancelled:
+                raise
             except Exception as e:
                 logger.warning("检查{}时出错: {}", description, str(e))
-                time.sleep(1)
+                self.sleep(1)
 
         logger.error("等待{}秒后{}仍未出现", timeout, description)
         return False
 
+    def get_selectors(self, package=HEXIN_PACKAGE):
+        """获取当前设备的选择器注册表，重连后自动重建"""
+        selectors = self._selectors
+        if selectors is None or selectors.device is not self.device or selectors.package != package:
+            selectors = SelectorRegistry(self.device, package)
+            self._selectors = selectors
+        return selectors
+
     def handle_popups(self, max_attempts=10):
         """处理各种弹窗"""
         logger.info("处理启动弹窗...")
-        popup_selectors = [
-            ("close_button", self.device(resourceId="com.hexin.plat.android:id/close_button")),
-            ("关闭", self.device(text="关闭")),
-            ("取消", self.device(text="取消")),
-            ("跳过", self.device(text="跳过")),
-            ("稍后", self.device(text="稍后")),
-            ("知道了", self.device(text="知道了")),
-        ]
+        selectors = self.get_selectors()
 
         for i in range(max_attempts):
-            popup_found = False
-            for name, selector in popup_selectors:
-                try:
-                    if selector.exists:
-                        logger.info("关闭弹窗: {}", name)
-                        selector.click()
-                        time.sleep(1)
-                        popup_found = True
-                        break
-                except Exception as e:
-                    logger.warning("处理弹窗{}时出错: {}", name, str(e))
-
-            if not popup_found:
+            # 每个候选只需一次设备调用（查找并点击）
+            name = selectors.click_first_of(POPUP_SELECTORS)
+            if not name:
                 break
+            logger.info("关闭弹窗: {}", name)
+            self.sleep(1)
 
         logger.info("弹窗处理完成")
 
     def disconnect(self):
         """断开连接"""
         try:
+            self.stop_heartbeat()
             if self.device:
                 self.device = None
+            if self.serial:
+                # 同一设备的通道可能正被其他控制器使用，只在最后一个使用者断开时关闭
+                release_shell_channel(self.adb_path, self.serial, self)
             self.is_connected = False
+            self.screen_size = None
+            self.facts = None
             logger.info("连接已断开")
         except Exception as e:
             logger.error("断开连接失败: {}", str(e))
@@ -272,25 +495,238 @@ class SimpleEmulator:
         middle_mask = "*" * (len(input_str) - 8)
         return f"{first_4}{middle_mask}{last_4}"
 
-    def num_to_coordinate(self, number):
+    def num_to_coordinate(self, number, layout=None):
         """数字转化为坐标"""
-        positions = {
-            '1': (66, 723), '2': (205, 721), '3': (328, 720),
-            '4': (64, 792), '5': (201, 785), '6': (332, 783),
-            '7': (66, 853), '8': (201, 846), '9': (326, 852),
-            '0': (197, 916)
-        }
+        positions = layout or DEFAULT_KEYPAD_LAYOUT
         return positions.get(number, (0, 0))
 
-    def subscription(self, user):
-        """执行申购操作"""
+    def run_macro(self, name, args, timeout=30):
+        """
+        在设备上执行宏脚本，每次连接只推送一次。
+
+        Args:
+            name (str): 宏名称（见 device_macros.MACROS）。
+            args (list): 脚本参数。
+            timeout (float, optional): 最长执行秒数。 Defaults to 30.
+
+        Returns:
+            bool: 脚本是否执行成功（最后输出 OK）。
+        """
+        if name not in MACROS:
+            raise KeyError(f"未定义设备端宏: {name}")
+        if name not in self._pushed_macros:
+            self.shell(push_command(name))
+            self._pushed_macros.add(name)
+        output = self.shell(f"sh {macro_path(name)} {' '.join(args)}", timeout=timeout)
+        if output.splitlines()[-1:] == ['OK']:
+            return True
+        logger.warning("设备端宏 {} 执行失败: {}", name, output or '无输出')
+        # 可能是脚本被清理，下次重新推送
+        self._pushed_macros.discard(name)
+        return False
+
+    def get_cached_keypad_layout(self, package, app_version):
+        """已校准过的键盘布局（不需要先弹出键盘），未校准时返回 None"""
+        if not self.screen_size or not all(self.screen_size):
+            return None
+        width, height = self.screen_size
+        return self.keypad_cache.lookup(self.keypad_cache.make_key(width, height, package, app_version),
+                                        self.screen_size)
+
+    def invalidate_keypad_layout(self, package, app_version):
+        """删除当前分辨率和APP版本的键盘布局缓存（登录失败时调用），下次输入密码时重新校准"""
+        if not self.screen_size or not all(self.screen_size):
+            return
+        width, height = self.screen_size
+        self.keypad_cache.invalidate(self.keypad_cache.make_key(width, height, package, app_version))
+
+    def get_keypad_layout(self, package, app_version):
+        """获取当前分辨率和APP版本下的数字键盘布局（首次使用时校准）"""
+        if not self.screen_size or not all(self.screen_size):
+            self.screen_size = self.device.window_size()
+        return self.keypad_cache.calibrate(self.device, package, app_version, self.screen_size)
+
+    def begin_step(self, name):
+        """进入申购流程的下一个步骤，并记录上一步骤的耗时"""
+        now = time.perf_counter()
+        if self.current_step is not None:
+            elapsed = now - self._step_started
+            self.step_times[self.current_step] = round(elapsed, 3)
+            STEP_SECONDS.observe(elapsed, step=self.current_step)
+        self.current_step = name
+        self._step_started = now
+
+    def subscription(self, user, stop_before=None, force=False):
+        """
+        执行申购操作，并在 last_run 中记录结果、失败步骤和各步骤耗时。
+
+        今天已完成申购的账号、以及今天已确认没有新股时直接跳过（last_run 的结果为 skipped，
+        message 为跳过原因），申购成功后写入台账。
+
+        Args:
+            user (dict | User): 账号信息。
+            stop_before (str, optional): 流程到达该状态时暂停并保持APP界面，
+                之后由 fire_apply 完成最后一步。 Defaults to None.
+            force (bool, optional): 今天已完成或已确认没有新股时也重新申购。 Defaults to False.
+
+        Returns:
+            bool: 是否成功（暂停时表示已就位，跳过时也返回 True）。
+        """
+        started = time.perf_counter()
+        self.current_step = None
+        self.step_times = {}
+        self._held = None
+        self._no_issue = False
+        account = self._user_value(user, 'account')
+        package = self._user_value(user, 'broker_package') or HEXIN_PACKAGE
+        self._run_account = (account, self._user_value(user, 'run_id') or None)
+        if not force and account and self._completed_today(account):
+            logger.info("账号 {} 今天已完成申购，跳过", account)
+            self.last_run = {'outcome': 'skipped', 'failed_step': None, 'duration': 0, 'steps': {},
+                             'message': '今天已完成申购'}
+            return True
+        if not force and self.issue_calendar.is_empty(package):
+            logger.info("今天没有可申购的新股，账号 {} 跳过", account)
+            self.last_run = {'outcome': 'skipped', 'failed_step': None, 'duration': 0, 'steps': {},
+                             'message': NO_ISSUE_MESSAGE}
+            return True
+
+        # 整个流程持有连接锁，心跳不会在流程中途替换设备会话
+        with self._connection_lock:
+            success = self._subscription(user, stop_before)
+
+        failed_step = None if success else self.current_step
+        self.begin_step(None)
+        if self._no_issue:
+            outcome, failed_step = 'skipped', None
+        elif success:
+            outcome = 'ready' if self._held else 'success'
+        else:
+            outcome = 'cancelled' if self.cancel_token.is_cancelled() else 'failed'
+        self.last_run = {
+            'outcome': outcome,
+            'failed_step': failed_step,
+            'duration': round(time.perf_counter() - started, 3),
+            'steps': dict(self.step_times),
+        }
+        if self._no_issue:
+            self.last_run['message'] = NO_ISSUE_MESSAGE
+            self.issue_calendar.mark_empty(package)
+            return True
+        if outcome == 'success':
+            self._mark_completed()
+        return success
+
+    @staticmethod
+    def _user_value(user, key):
+        """读取账号信息中的字段（dict 或 User 对象）"""
+        return user.get(key) if isinstance(user, dict) else getattr(user, key, '')
+
+    def _completed_today(self, account):
+        """台账中该账号今天是否已完成（读取失败时按未完成处理）"""
+        try:
+            return self.ledger.is_completed(account)
+        except Exception as e:
+            logger.warning("读取申购台账失败: {}", str(e))
+            return False
+
+    def _mark_completed(self):
+        """把当前账号写入今天的台账"""
+        account, run_id = self._run_account or (None, None)
+        if not account:
+            return
+        try:
+            self.ledger.mark_completed(account, run_id)
+        except Exception as e:
+            logger.error("写入申购台账失败: {}", str(e))
+
+    def prepare_subscription(self, user, state='apply', force=False):
+        """提前执行流程，停在申购按钮已出现的界面上等待 fire_apply"""
+        return self.subscription(user, stop_before=state, force=force)
+
+    def fire_apply(self):
+        """
+        在已就位的会话中执行暂停状态的动作（一次设备调用点击申购），随后按流程定义关闭APP。
+
+        Returns:
+            bool: 是否点击成功。
+        """
+        # 点击期间持有连接锁，心跳不会替换设备会话
+        with self._connection_lock:
+            return self._fire_apply()
+
+    def _fire_apply(self):
+        held, self._held = self._held, None
+        if not held:
+            logger.error("没有已就位的申购会话")
+            return False
+
+        flow, state = held
+        started = time.perf_counter()
+        success = False
+        try:
+            name = self.get_selectors(flow['package']).click_first_of(state['targets'])
+            success = bool(name)
+            if success:
+                logger.info("点击 {} 成功，申购操作完成", name)
+            else:
+                logger.error("找不到申购按钮")
+        except Exception as e:
+            logger.error("申购操作失败: {}", str(e))
+        finally:
+            elapsed = time.perf_counter() - started
+            STEP_SECONDS.observe(elapsed, step='fire')
+            if flow.get('stop_app_after', True):
+                self.stop_app(flow['package'])
+
+        run = self.last_run or {'steps': {}, 'duration': 0}
+        run['steps']['fire'] = round(elapsed, 3)
+        run['duration'] = round(run['duration'] + elapsed, 3)
+        if success:
+            run['outcome'] = 'success'
+            self._mark_completed()
+        else:
+            run['outcome'] = 'cancelled' if self.cancel_token.is_cancelled() else 'failed'
+        run['failed_step'] = None if success else 'fire'
+        self.last_run = run
+        return success
+
+    def release_held(self):
+        """放弃已就位的会话（取消时调用），关闭APP"""
+        held, self._held = self._held, None
+        if not held:
+            return
+        flow, _ = held
+        self.stop_app(flow['package'])
+        if self.last_run:
+            self.last_run.update(outcome='cancelled', failed_step='fire')
+
+    def stop_app(self, package):
+        """关闭APP并清空会话账号"""
+        try:
+            self.device.app_stop(package)
+            self.session_account = None
+            logger.info("已关闭 {}", package)
+        except Exception as e:
+            logger.error("关闭 {} 失败: {}", package, str(e))
+
+    def _subscription(self, user, stop_before=None):
+        """申购流程主体，按券商APP的流程定义执行"""
+        self.begin_step('connect')
         if not self.ensure_connection():
             logger.error("无法建立设备连接")
             return False
 
+        get_value = lambda key: self._user_value(user, key)
+        broker_package = get_value('broker_package') or HEXIN_PACKAGE
+        flow = get_flow(broker_package)
+        if not flow:
+            logger.error("未定义 {} 的申购流程", broker_package)
+            return False
+
         try:
-            account = user.get('account') if isinstance(user, dict) else getattr(user, 'account', '')
-            password = user.get('password') if isinstance(user, dict) else getattr(user, 'password', '')
+            account = get_value('account')
+            password = get_value('password')
 
             if not account or not password:
                 logger.error("账号或密码为空")
@@ -298,145 +734,36 @@ class SimpleEmulator:
 
             logger.info("开始为账号 {} 执行申购操作", account)
 
-            # 检查同花顺app是否已安装
-            broker_package = 'com.hexin.plat.android'
-            if not self.device.app_info(broker_package):
+            # 检查券商app是否已安装（版本号来自设备信息缓存，不再每个账号查询）
+            self.begin_step('check_app')
+            app_version = self.get_app_version(broker_package)
+            if not app_version:
                 logger.error("{} 未安装", broker_package)
                 return False
 
-            # 将资金账号中间变为*号
-            account_with_fix = self.mask_string(account)
-
-            # 启动同花顺app
-            logger.info("启动同花顺app")
-            self.device.app_start(broker_package, wait=True)
-
-            # 等待APP完全启动并验证
-            logger.info("等待APP完全加载...")
-            app_loaded = False
-            for i in range(15):  # 最多等待15秒
-                time.sleep(1)
-                try:
-                    current_app = self.device.app_current()
-                    if current_app.get('package') == broker_package:
-                        app_loaded = True
-                        break
-                except Exception:
-                    continue
-
-            if not app_loaded:
-                logger.error("APP启动超时或失败")
-                return False
-
-            logger.info("同花顺app已成功打开")
-
-            # 处理启动弹窗
-            self.handle_popups()
-
-            # 查找并点击交易按钮
-            trade_selectors = [
-                ("文本", self.device(text="交易")),
-                ("xpath", self.device.xpath('//*[@content-desc="交易"]/android.widget.ImageView[1]')),
-                ("描述", self.device(description="交易")),
-                ("资源ID", self.device(resourceId="com.hexin.plat.android:id/tab_trade")),
-            ]
-
-            trade_button_found = False
-            for name, selector in trade_selectors:
-                if self.wait_for_element(selector, timeout=20, description=f"交易按钮({name})"):
-                    logger.info("点击交易按钮({})", name)
-                    selector.click()
-                    trade_button_found = True
-                    break
-
-            if not trade_button_found:
-                logger.error("未找到交易按钮")
-                return False
-
-            # 等待交易界面加载
-            logger.info("等待交易界面加载...")
-            time.sleep(3)
-
-            # 等待账号列表加载
-            account_selector = self.device(resourceId="com.hexin.plat.android:id/txt_account_value")
-            if not self.wait_for_element(account_selector, timeout=10, description="账号列表"):
-                return False
-
-            account_count = account_selector.count
-            logger.info("找到 {} 个账号", account_count)
-
-            account_found = False
-            for i in range(account_count):
-                account_item = self.device(resourceId="com.hexin.plat.android:id/txt_account_value", instance=i)
-                if not account_item.exists:
-                    continue
-
-                element_text = account_item.get_text().strip()
-                logger.info("检查账号 {}: {}", i+1, element_text)
-
-                if account_with_fix != element_text:
-                    continue
-
-                account_found = True
-                logger.info("找到匹配账号【{}】,准备点击", account)
-                account_item.click()
-                time.sleep(1)
-
-                # 等待密码输入框出现
-                if not self.device(resourceId="com.hexin.plat.android:id/weituo_edit_trade_password").exists:
-                    logger.error("密码框未出现")
-                    return False
-
-                # 点击密码框
-                logger.info("点击密码框")
-                self.device(resourceId="com.hexin.plat.android:id/weituo_edit_trade_password").click()
-                time.sleep(1)
-
-                # 输入密码
-                logger.info("开始输入密码")
-                for key in password:
-                    x, y = self.num_to_coordinate(key)
-                    logger.info("点击坐标: ({}, {})", x, y)
-                    self.device.click(x, y)
-                    time.sleep(0.2)
-
-                # 点击登录
-                login_btn = self.device(resourceId="com.hexin.plat.android:id/weituo_btn_login")
-                if login_btn.exists:
-                    login_btn.click()
-                    logger.info("点击登录按钮成功")
-                    time.sleep(3)
-                else:
-                    logger.error("找不到登录按钮")
-                    return False
-
-                # 处理可能的中签弹窗
-                if self.device(resourceId="com.hexin.plat.android:id/iv_operate_cancel").exists:
-                    logger.info("关闭中签弹窗")
-                    self.device(resourceId="com.hexin.plat.android:id/iv_operate_cancel").click()
-
-                # 查找并点击申购按钮
-                if self.device(resourceId="com.hexin.plat.android:id/option_apply").exists:
-                    logger.info("点击一键申购按钮")
-                    self.device(resourceId="com.hexin.plat.android:id/option_apply").click()
-                    logger.info("申购操作完成")
-                    return True
-                else:
-                    logger.error("找不到申购按钮")
-                    return False
-
-            if not account_found:
-                logger.error("没有找到匹配的账号")
+            context = {
+                'account': account,
+                'password': password,
+                # 账号列表中显示的是中间打码的资金账号
+                'masked_account': self.mask_string(account),
+                'app_version': app_version,
+            }
+
+            engine = FlowEngine(self, flow)
+            if not engine.run(context, stop_before=stop_before):
+                self._no_issue = engine.empty_state is not None
                 return False
+            if engine.paused_state:
+                # 保持在当前界面，等待 fire_apply
+                self._held = (flow, engine.paused_state)
+                return True
+            logger.info("申购操作完成")
+            return True
 
         except Exception as e:
             logger.error("申购操作失败: {}", str(e))
             return False
         finally:
-            try:
-                # 确保关闭app
-                broker_package = 'com.hexin.plat.android'
-                self.device.app_stop(broker_package)
-                logger.info("已关闭同花顺app")
-            except Exception as e:
-                logger.error("关闭同花顺app失败: {}", str(e))
+            # 确保关闭app（已就位等待点击的会话除外）
+            if flow.get('stop_app_after', True) and not self._held:
+                self.stop_app(broker_package)
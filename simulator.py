@@ -3,6 +3,8 @@ import json
 import subprocess
 from loguru import logger
 from simple_emulator import SimpleEmulator
+from metrics import ADB_COMMANDS
+from cancellation import Cancelled, run_process
 
 class SimulatorController:
     def __init__(self, path=None):
@@ -29,23 +31,23 @@ class SimulatorController:
         self.emulator = SimpleEmulator(self.path)
         self.is_connected = False
     
-    def execute_adb_command(self, command):
-        """执行ADB命令"""
+    def execute_adb_command(self, command, timeout=30):
+        """执行ADB命令（超时或取消时结束 adb 进程并返回空字符串）"""
+        ADB_COMMANDS.inc(kind='spawn')
         try:
             full_command = f'"{os.path.join(self.path, "adb.exe")}" {command}'
             logger.debug(f"执行ADB命令: {full_command}")
-            process = subprocess.run(
-                full_command, 
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding='utf-8',
-                errors='ignore'
-            )
+            process = run_process(full_command, timeout, self.emulator.cancel_token)
             if process.returncode != 0:
                 logger.warning(f"ADB命令返回非零状态: {process.returncode}")
                 logger.warning(f"错误输出: {process.stderr}")
             return process.stdout.strip()
+        except subprocess.TimeoutExpired:
+            logger.error(f"ADB命令超时 ({timeout}s): {command}")
+            return ""
+        except Cancelled:
+            logger.warning(f"ADB命令已取消: {command}")
+            return ""
         except Exception as e:
             logger.error(f"执行ADB命令失败: {e}")
             return ""
@@ -91,23 +93,31 @@ class SimulatorController:
     def tap_screen(self, x, y):
         """模拟屏幕点击"""
         try:
-            command = f'shell input tap {x} {y}'
-            result = self.execute_adb_command(command)
+            # 通过常驻 shell 通道发送，只需一次管道写入
+            result = self.emulator.shell(f'input tap {x} {y}')
             logger.debug(f"点击屏幕坐标 ({x}, {y}) 结果: {result}")
             return True
         except Exception as e:
             logger.error(f"点击屏幕失败: {e}")
             return False
+
+    def getprop(self, name):
+        """读取设备系统属性"""
+        return self.emulator.shell(f'getprop {name}')
+
+    def is_package_installed(self, package):
+        """检查APP是否已安装"""
+        return self.emulator.shell(f'pm path {package}').startswith('package:')
     
-    def subscription(self, user):
-        """进行申购操作"""
+    def subscription(self, user, force=False):
+        """进行申购操作（force 为 True 时今天已完成的账号也重新申购）"""
         try:
             # 检查user是字典还是对象
             account = user.get('account') if isinstance(user, dict) else getattr(user, 'account', '')
             logger.info(f"用户 {account} 开始申购操作（使用已有连接）")
 
             # 使用简化模拟器进行申购
-            result = self.emulator.subscription(user)
+            result = self.emulator.subscription(user, force=force)
             logger.info(f"用户 {account} 申购结果: {result}")
             return result
         except Exception as e:
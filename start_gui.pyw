@@ -7,6 +7,7 @@ GUI启动器 - 无控制台窗口版本
 
 import sys
 import os
+import multiprocessing
 
 # 确保当前目录在Python路径中
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -35,6 +36,8 @@ try:
         sys.exit(exit_code)
 
     if __name__ == '__main__':
+        # 打包为 exe 后，进程模式的设备子进程由此进入工作函数，而不是重新启动界面
+        multiprocessing.freeze_support()
         main()
 
 except ImportError as e:
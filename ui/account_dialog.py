@@ -1,7 +1,9 @@
-from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QTableWidget, QTableWidgetItem,
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QTableView, QAbstractItemView,
                              QHeaderView, QFormLayout, QLineEdit, QHBoxLayout,
-                             QPushButton, QDialogButtonBox, QMessageBox)
+                             QPushButton, QDialogButtonBox, QMessageBox, QFileDialog)
 from entity.user import User # 假设 User 类在 entity/user.py 中
+from account_io import import_accounts, export_accounts
+from ui.account_table_model import AccountTableModel
 
 class AccountDialog(QDialog):
     """账号管理对话框"""
@@ -19,9 +21,11 @@ class AccountDialog(QDialog):
         # 创建主布局
         layout = QVBoxLayout(self)
 
-        # 创建账号表格
-        self.account_table = QTableWidget(0, 3) # 0行，3列（账号、密码、姓名）
-        self.account_table.setHorizontalHeaderLabels(["资金账号", "密码", "持有人姓名"])
+        # 创建账号表格（模型按页懒加载，滚动到底部时再取下一页）
+        self.account_model = AccountTableModel(parent=self)
+        self.account_table = QTableView()
+        self.account_table.setModel(self.account_model)
+        self.account_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.account_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         self.account_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
         self.account_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeMode.Stretch)
@@ -53,6 +57,14 @@ class AccountDialog(QDialog):
         self.del_btn.clicked.connect(self.delete_account)
         button_layout.addWidget(self.del_btn)
 
+        self.import_btn = QPushButton("批量导入")
+        self.import_btn.clicked.connect(self.import_accounts)
+        button_layout.addWidget(self.import_btn)
+
+        self.export_btn = QPushButton("导出账号")
+        self.export_btn.clicked.connect(self.export_accounts)
+        button_layout.addWidget(self.export_btn)
+
         layout.addLayout(button_layout)
 
         # 添加确定/取消按钮 (这里只保留OK，因为添加/删除是即时生效的)
@@ -64,22 +76,12 @@ class AccountDialog(QDialog):
         self.load_accounts()
 
     def load_accounts(self):
-        """从数据库加载账号并显示在表格中"""
+        """重置表格模型，视图按需从数据库加载第一页账号"""
         try:
-            # 清空表格
-            self.account_table.setRowCount(0)
-
-            # 查询所有用户
-            users = User.select()
-
-            # 添加到表格
-            for user in users:
-                row_position = self.account_table.rowCount()
-                self.account_table.insertRow(row_position)
-
-                self.account_table.setItem(row_position, 0, QTableWidgetItem(user.account))
-                self.account_table.setItem(row_position, 1, QTableWidgetItem(user.password)) # 注意：显示密码可能不安全
-                self.account_table.setItem(row_position, 2, QTableWidgetItem(user.user_name))
+            self.account_model.reload()
+            # 注意：表格中显示密码可能不安全
+            if self.account_model.canFetchMore():
+                self.account_model.fetchMore()
         except Exception as e:
             QMessageBox.critical(self, "数据库错误", f"读取账号数据失败: {str(e)}")
 
@@ -104,8 +106,8 @@ class AccountDialog(QDialog):
             user = User(account=account, password=password, user_name=user_name)
             user.save()
 
-            # 刷新表格
-            self.load_accounts()
+            # 只插入新增的一行
+            self.account_model.append_user(user)
 
             # 清空输入框
             self.account_edit.clear()
@@ -118,18 +120,17 @@ class AccountDialog(QDialog):
 
     def delete_account(self):
         """删除选中的账号"""
-        selected_rows = self.account_table.selectedItems()
+        selected_rows = self.account_table.selectionModel().selectedIndexes()
         if not selected_rows:
             QMessageBox.warning(self, "未选择", "请先选择要删除的账号行")
             return
 
         # 获取选中行的账号 (确保只处理选中的第一项所在的行)
         row = selected_rows[0].row()
-        account_item = self.account_table.item(row, 0)
-        if not account_item:
+        account = self.account_model.account_at(row)
+        if not account:
             QMessageBox.warning(self, "错误", "无法获取选中行的账号信息")
             return
-        account = account_item.text()
 
         # 确认删除
         reply = QMessageBox.question(self, "确认删除",
@@ -143,11 +144,56 @@ class AccountDialog(QDialog):
                 deleted_rows = User.delete().where(User.account == account).execute()
 
                 if deleted_rows > 0:
-                    # 刷新表格
-                    self.load_accounts()
+                    # 只移除被删除的一行
+                    self.account_model.remove_account(account)
                     QMessageBox.information(self, "删除成功", f"账号 {account} 已删除")
                 else:
                      QMessageBox.warning(self, "删除失败", f"数据库中未找到账号 {account}")
 
             except Exception as e:
-                QMessageBox.critical(self, "删除失败", f"删除账号失败: {str(e)}")
\ No newline at end of file
+                QMessageBox.critical(self, "删除失败", f"删除账号失败: {str(e)}")
+
+    def import_accounts(self):
+        """从 CSV/JSON 文件批量导入账号"""
+        path, _ = QFileDialog.getOpenFileName(self, "选择账号文件", "",
+                                              "账号文件 (*.csv *.json)")
+        if not path:
+            return
+
+        reply = QMessageBox.question(self, "导入方式",
+            "文件中已存在的账号是否覆盖密码和姓名？\n选择\"否\"将跳过已存在的账号。",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel,
+            QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Cancel:
+            return
+
+        try:
+            summary = import_accounts(path, overwrite=reply == QMessageBox.StandardButton.Yes)
+        except Exception as e:
+            QMessageBox.critical(self, "导入失败", f"导入账号失败: {str(e)}")
+            return
+
+        # 整批导入完成后只刷新一次表格
+        self.load_accounts()
+
+        message = (f"新增 {summary['inserted']} 个，覆盖 {summary['updated']} 个，"
+                   f"跳过 {summary['skipped']} 个，无效 {summary['invalid']} 条")
+        if summary['errors']:
+            # 只展示前10条错误，避免对话框过长
+            message += "\n\n" + "\n".join(summary['errors'][:10])
+            if len(summary['errors']) > 10:
+                message += f"\n... 共 {len(summary['errors'])} 条错误"
+        QMessageBox.information(self, "导入完成", message)
+
+    def export_accounts(self):
+        """导出全部账号到 CSV/JSON 文件"""
+        path, _ = QFileDialog.getSaveFileName(self, "导出账号", "accounts.csv",
+                                              "CSV 文件 (*.csv);;JSON 文件 (*.json)")
+        if not path:
+            return
+
+        try:
+            count = export_accounts(path)
+            QMessageBox.information(self, "导出完成", f"已导出 {count} 个账号到 {path}")
+        except Exception as e:
+            QMessageBox.critical(self, "导出失败", f"导出账号失败: {str(e)}")
@@ -0,0 +1,112 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from entity.user import User
+
+
+class AccountTableModel(QAbstractTableModel):
+    """账号表格模型，按页懒加载数据库中的账号"""
+
+    HEADERS = ["资金账号", "密码", "持有人姓名"]
+
+    def __init__(self, page_size=200, parent=None):
+        """
+        初始化 AccountTableModel。
+
+        Args:
+            page_size (int, optional): 每次 fetchMore 加载的行数。 Defaults to 200.
+            parent (QObject, optional): 父对象。 Defaults to None.
+        """
+        super().__init__(parent)
+        self.page_size = page_size
+        # 每行为 (id, account, password, user_name)
+        self._rows = []
+        # 按主键翻页（keyset），避免 OFFSET 越翻越慢
+        self._last_id = 0
+        self._exhausted = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        # 第0列是主键，不显示
+        return self._rows[index.row()][index.column() + 1]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return section + 1
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        """从数据库加载下一页账号"""
+        if parent.isValid() or self._exhausted:
+            return
+
+        rows = list(User.select(User.id, User.account, User.password, User.user_name)
+                    .where(User.id > self._last_id)
+                    .order_by(User.id)
+                    .limit(self.page_size)
+                    .tuples())
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self._last_id = rows[-1][0]
+        self.endInsertRows()
+
+    def reload(self):
+        """清空已加载的数据，视图会重新按需加载第一页"""
+        self.beginResetModel()
+        self._rows = []
+        self._last_id = 0
+        self._exhausted = False
+        self.endResetModel()
+
+    def append_user(self, user):
+        """
+        新增账号后只插入对应的一行。
+
+        如果还有未加载的页，新账号的主键更大，会在后续 fetchMore 中加载，这里无需处理。
+
+        Args:
+            user (User): 新保存的用户对象。
+        """
+        if not self._exhausted:
+            return
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.append((user.id, user.account, user.password, user.user_name))
+        self._last_id = user.id
+        self.endInsertRows()
+
+    def remove_account(self, account):
+        """
+        删除账号后只移除对应的一行。
+
+        Args:
+            account (str): 被删除的资金账号。
+        """
+        for row, values in enumerate(self._rows):
+            if values[1] == account:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._rows[row]
+                self.endRemoveRows()
+                return
+
+    def account_at(self, row):
+        """返回指定行的资金账号"""
+        if 0 <= row < len(self._rows):
+            return self._rows[row][1]
+        return None
@@ -0,0 +1,336 @@
+import time
+import zlib
+import threading
+import collections
+import subprocess
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QThread, QRect, pyqtSignal
+from PyQt6.QtGui import QImage, QPainter, QColor
+from loguru import logger
+from cancellation import Cancelled, run_process
+from metrics import PREVIEW_FRAMES
+
+# 帧率范围：画面变化时按最高帧率抓取，连续不变时逐步降到最低帧率
+MAX_FPS = 10
+MIN_FPS = 1
+# 每抓到一帧未变化的画面，抓取间隔放大的倍数
+BACKOFF = 1.5
+
+# screencap 原始格式的像素格式 -> QImage 格式（小端序下 BGRA 字节顺序即 ARGB32）
+PIXEL_FORMATS = {
+    1: QImage.Format.Format_RGBA8888,
+    5: QImage.Format.Format_ARGB32,
+}
+
+
+class AdbFrameSource:
+    """通过 adb exec-out screencap 抓取设备画面（原始像素，不经过 PNG 编解码）"""
+
+    def __init__(self, adb_path, serial=None, timeout=5):
+        """
+        初始化 AdbFrameSource。
+
+        Args:
+            adb_path (str): adb 路径。
+            serial (str, optional): 设备序列号，只连接一台设备时可以不指定。 Defaults to None.
+            timeout (float, optional): 单次抓取的超时秒数。 Defaults to 5.
+        """
+        self.adb_path = adb_path
+        self.serial = serial
+        self.timeout = timeout
+
+    def _command(self, *args):
+        command = [self.adb_path]
+        if self.serial:
+            command += ['-s', self.serial]
+        return command + list(args)
+
+    def grab(self):
+        """
+        抓取一帧。
+
+        Returns:
+            tuple: (宽, 高, QImage 格式, 像素字节)。
+        """
+        result = run_process(self._command('exec-out', 'screencap'), self.timeout,
+                             shell=False, text=False)
+        return parse_raw_screencap(result.stdout)
+
+    def tap(self, x, y):
+        """点击设备坐标"""
+        run_process(self._command('shell', 'input', 'tap', str(x), str(y)), self.timeout, shell=False)
+
+
+def parse_raw_screencap(data):
+    """
+    解析 screencap 的原始输出：宽、高、像素格式各4字节（Android 9 起另有4字节色彩空间），之后是像素。
+
+    Returns:
+        tuple: (宽, 高, QImage 格式, 像素字节)。
+
+    Raises:
+        ValueError: 输出不完整或像素格式不支持。
+    """
+    if len(data) < 12:
+        raise ValueError(f"screencap 输出过短: {len(data)} 字节")
+    width = int.from_bytes(data[0:4], 'little')
+    height = int.from_bytes(data[4:8], 'little')
+    pixel_format = int.from_bytes(data[8:12], 'little')
+    header = len(data) - width * height * 4
+    if header not in (12, 16):
+        raise ValueError(f"screencap 输出长度与画面尺寸 {width}x{height} 不符")
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(f"不支持的像素格式: {pixel_format}")
+    return width, height, PIXEL_FORMATS[pixel_format], data[header:]
+
+
+class FakeFrameSource:
+    """假画面源：生成固定尺寸的画面，只在指定帧和点击时变化，用于在没有设备时调试预览"""
+
+    def __init__(self, width=360, height=640, change_every=5):
+        """
+        初始化 FakeFrameSource。
+
+        Args:
+            width (int, optional): 画面宽度。 Defaults to 360.
+            height (int, optional): 画面高度。 Defaults to 640.
+            change_every (int, optional): 每抓取多少帧画面变化一次。 Defaults to 5.
+        """
+        self.width = width
+        self.height = height
+        self.change_every = change_every
+        self.grabs = 0
+        self.taps = []
+        self._frame = bytearray(width * height * 4)
+        self._dirty = True
+
+    def _fill_rect(self, x, y, w, h, rgba):
+        row = bytes(rgba) * min(w, self.width - x)
+        for line in range(max(y, 0), min(y + h, self.height)):
+            start = (line * self.width + x) * 4
+            self._frame[start:start + len(row)] = row
+
+    def grab(self):
+        if self._dirty or self.grabs % self.change_every == 0:
+            self._dirty = False
+            # 一条色带从上往下移动
+            band = (self.grabs // self.change_every) % 16
+            self._fill_rect(0, 0, self.width, self.height, (40, 44, 52, 255))
+            self._fill_rect(0, band * self.height // 16, self.width, self.height // 16, (52, 152, 219, 255))
+            for x, y in self.taps[-5:]:
+                self._fill_rect(max(x - 5, 0), y - 5, 10, 10, (231, 76, 60, 255))
+        self.grabs += 1
+        return self.width, self.height, QImage.Format.Format_RGBA8888, bytes(self._frame)
+
+    def tap(self, x, y):
+        self.taps.append((x, y))
+        # 下一次抓取时重新绘制
+        self._dirty = True
+
+
+class FrameGrabber(QThread):
+    """
+    后台抓帧线程。
+
+    画面与上一帧相同（按哈希比较）时不通知界面，并逐步拉长抓取间隔；
+    画面变化或有点击时恢复最高帧率。界面只取最新一帧，处理不过来时中间的帧直接丢弃。
+    """
+    frame_ready = pyqtSignal()
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, source, max_fps=MAX_FPS, min_fps=MIN_FPS):
+        """
+        初始化 FrameGrabber。
+
+        Args:
+            source: 画面源，提供 grab() 和 tap(x, y)。
+            max_fps (float, optional): 最高帧率。 Defaults to MAX_FPS.
+            min_fps (float, optional): 画面不变时的最低帧率。 Defaults to MIN_FPS.
+        """
+        super().__init__()
+        self.source = source
+        self.min_interval = 1 / max_fps
+        self.max_interval = 1 / min_fps
+        self.interval = self.min_interval
+        self._latest = None
+        self._last_hash = None
+        self._lock = threading.Lock()
+        self._taps = collections.deque()
+        self._wake = threading.Event()
+        self._running = False
+        self._paused = False
+
+    def take_frame(self):
+        """取出最新一帧 (宽, 高, 格式, 像素字节)，没有新帧时返回 None"""
+        with self._lock:
+            frame, self._latest = self._latest, None
+        return frame
+
+    def tap(self, x, y):
+        """在抓帧线程中点击设备坐标，并立即抓取下一帧"""
+        self._taps.append((x, y))
+        self._wake.set()
+
+    def set_paused(self, paused):
+        """暂停或恢复抓帧（预览不可见时暂停，避免占用 adb）"""
+        self._paused = paused
+        self._wake.set()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def run(self):
+        self._running = True
+        failed = False
+        while self._running:
+            if self._paused:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            started = time.perf_counter()
+            try:
+                while self._taps:
+                    self.source.tap(*self._taps.popleft())
+                    self.interval = self.min_interval
+                frame = self.source.grab()
+                failed = False
+            except (ValueError, OSError, subprocess.TimeoutExpired, Cancelled) as e:
+                if not failed:
+                    logger.warning("抓取设备画面失败: {}", str(e))
+                    self.error_occurred.emit(str(e))
+                failed = True
+                self.interval = self.max_interval
+            else:
+                frame_hash = zlib.crc32(frame[3])
+                if frame_hash == self._last_hash:
+                    PREVIEW_FRAMES.inc(result='unchanged')
+                    self.interval = min(self.interval * BACKOFF, self.max_interval)
+                else:
+                    PREVIEW_FRAMES.inc(result='changed')
+                    self._last_hash = frame_hash
+                    self.interval = self.min_interval
+                    with self._lock:
+                        self._latest = frame
+                    self.frame_ready.emit()
+
+            self._wake.wait(max(self.interval - (time.perf_counter() - started), 0))
+            self._wake.clear()
+
+
+class ScreenPreview(QWidget):
+    """设备画面预览：按比例缩放显示，点击转换为设备坐标后转发到设备"""
+
+    def __init__(self, source, parent=None):
+        """
+        初始化 ScreenPreview。
+
+        Args:
+            source: 画面源（AdbFrameSource 或 FakeFrameSource）。
+            parent (QWidget, optional): 父控件。 Defaults to None.
+        """
+        super().__init__(parent)
+        self.grabber = FrameGrabber(source)
+        self.grabber.frame_ready.connect(self.on_frame_ready)
+        self.grabber.error_occurred.connect(self.on_error)
+        # 复用同一个 QImage，尺寸或格式变化时才重新创建
+        self.image = None
+        self.message = "正在获取设备画面..."
+        self.setMinimumSize(180, 320)
+
+    def start(self):
+        if not self.grabber.isRunning():
+            self.grabber.start()
+
+    def stop(self):
+        self.grabber.stop()
+        self.grabber.wait(5000)
+
+    def on_frame_ready(self):
+        frame = self.grabber.take_frame()
+        if frame is None:
+            return
+        width, height, image_format, pixels = frame
+        if self.image is None or (self.image.width(), self.image.height(), self.image.format()) \
+                != (width, height, image_format):
+            self.image = QImage(width, height, image_format)
+        buffer = self.image.bits()
+        buffer.setsize(self.image.sizeInBytes())
+        memoryview(buffer)[:] = pixels
+        self.message = None
+        self.update()
+
+    def on_error(self, message):
+        if self.image is None:
+            self.message = f"无法获取设备画面\n{message}"
+            self.update()
+
+    def image_rect(self):
+        """画面在控件中的显示区域（保持宽高比居中）"""
+        if self.image is None:
+            return QRect()
+        scale = min(self.width() / self.image.width(), self.height() / self.image.height())
+        width = int(self.image.width() * scale)
+        height = int(self.image.height() * scale)
+        return QRect((self.width() - width) // 2, (self.height() - height) // 2, width, height)
+
+    def to_device(self, x, y):
+        """控件坐标转换为设备坐标，不在画面内时返回 None"""
+        rect = self.image_rect()
+        if rect.isEmpty() or not rect.contains(int(x), int(y)):
+            return None
+        return (int((x - rect.x()) * self.image.width() / rect.width()),
+                int((y - rect.y()) * self.image.height() / rect.height()))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor('#34495e'))
+        if self.image is not None:
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawImage(self.image_rect(), self.image)
+        elif self.message:
+            painter.setPen(QColor('#bdc3c7'))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, self.message)
+        painter.end()
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.MouseButton.LeftButton:
+            return super().mousePressEvent(event)
+        point = self.to_device(event.position().x(), event.position().y())
+        if point:
+            self.grabber.tap(*point)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.grabber.set_paused(False)
+        self.start()
+
+    def hideEvent(self, event):
+        self.grabber.set_paused(True)
+        super().hideEvent(event)
+
+    def closeEvent(self, event):
+        self.stop()
+        super().closeEvent(event)
+
+
+if __name__ == "__main__":
+    # 用假画面源运行预览: python -m ui.screen_preview [--bench]
+    import sys
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QTimer
+
+    app = QApplication(sys.argv)
+    source = FakeFrameSource(720, 1280)
+    preview = ScreenPreview(source)
+    preview.resize(360, 640)
+    preview.show()
+    if '--bench' in sys.argv:
+        QTimer.singleShot(5000, app.quit)
+        app.exec()
+        preview.stop()
+        changed = PREVIEW_FRAMES.value(result='changed')
+        unchanged = PREVIEW_FRAMES.value(result='unchanged')
+        print(f"5 秒内抓取 {source.grabs} 帧，绘制 {changed:.0f} 帧，跳过未变化的 {unchanged:.0f} 帧")
+    else:
+        sys.exit(app.exec())
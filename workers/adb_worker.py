@@ -1,25 +1,44 @@
 import os
+import json
 from PyQt6.QtCore import QThread, pyqtSignal
 from simulator import SimulatorController
+from keypad_layout import DEFAULT_KEYPAD_LAYOUT
+from entity.subscription_result import SubscriptionResult
+from entity.base_model import db_writer
+from scheduler import SubscriptionScheduler
+from metrics import ACCOUNTS_PROCESSED, FAILURES
+from profiling import profile_job
+from cancellation import CancelToken, Cancelled
 
 class AdbWorker(QThread):
     """后台ADB操作线程"""
     update_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(bool, str)
 
-    def __init__(self, adb_path, cmd_type, params=None):
+    def __init__(self, adb_path, cmd_type, params=None, simulator=None, cancel_token=None):
         """
         初始化 AdbWorker。
 
         Args:
             adb_path (str): adb.exe 的路径。
-            cmd_type (str): 要执行的命令类型 ('connect', 'check', 'subscribe' 等)。
+            cmd_type (str): 要执行的命令类型 ('connect', 'check', 'subscribe', 'scheduled_subscribe' 等)。
             params (dict, optional): 命令所需的额外参数。 Defaults to None.
+            simulator (SimulatorController, optional): 复用的模拟器控制器，
+                多个账号之间保持同一个连接和心跳。 Defaults to None.
+            cancel_token (CancelToken, optional): 取消标记，界面停止申购时取消。 Defaults to None.
         """
         super().__init__()
         self.adb_path = adb_path
         self.cmd_type = cmd_type
         self.params = params or {}
+        self.simulator = simulator
+        self.cancel_token = cancel_token or CancelToken()
+        # connect / check 成功时连接到的设备序列号，供画面预览使用
+        self.serial = None
+
+    def cancel(self):
+        """请求停止当前任务（设备调用和等待会在1秒内返回）"""
+        self.cancel_token.cancel()
 
     def get_numeric_key_position(self, digit):
         """
@@ -31,17 +50,60 @@ class AdbWorker(QThread):
         Returns:
             tuple: (x, y) 坐标。
         """
-        positions = {
-            '1': (66, 723), '2': (205, 721), '3': (328, 720),
-            '4': (64, 792), '5': (201, 785), '6': (332, 783),
-            '7': (66, 853), '8': (201, 846), '9': (326, 852),
-            '0': (197, 916)
-        }
-        return positions.get(digit, (197, 916)) # 默认返回0的位置
+        # 布局统一由 keypad_layout 维护，实际申购时会按设备校准
+        return DEFAULT_KEYPAD_LAYOUT.get(digit, DEFAULT_KEYPAD_LAYOUT['0']) # 默认返回0的位置
+
+    def record_result(self, run_info):
+        """
+        保存申购结果（同时计入运行指标）。写操作交给数据库写线程排队执行，不等待数据库锁。
+
+        Args:
+            run_info (dict): SimpleEmulator.last_run，包含 outcome、failed_step、duration、steps。
+        """
+        if not run_info:
+            return
+        outcome = run_info.get('outcome', 'error')
+        ACCOUNTS_PROCESSED.inc(outcome=outcome)
+        if outcome not in ('success', 'skipped'):
+            FAILURES.inc(step=run_info.get('failed_step') or 'unknown')
+
+        params = self.params if isinstance(self.params, dict) else {}
+        if not params.get('run_id'):
+            return
+        message = run_info.get('message')
+        if run_info.get('fire'):
+            # 定时申购把触发延迟一并保存
+            message = json.dumps(run_info['fire'], ensure_ascii=False)
+        future = db_writer.submit(
+            SubscriptionResult.record,
+            run_id=params['run_id'],
+            account=params.get('account', ''),
+            outcome=outcome,
+            failed_step=run_info.get('failed_step'),
+            duration=run_info.get('duration', 0),
+            message=message,
+            steps=run_info.get('steps'),
+        )
+        update_signal = self.update_signal
+
+        def report_failure(done):
+            if done.exception():
+                update_signal.emit(f"保存申购结果失败: {done.exception()}")
+
+        future.add_done_callback(report_failure)
 
     def run(self):
         """
-        线程执行的主函数，根据 cmd_type 执行不同的 ADB 操作。
+        线程执行的主函数。开启性能分析时每个任务生成一份报告。
+        """
+        account = self.params.get('account', '') if isinstance(self.params, dict) else ''
+        job_name = f"{self.cmd_type}_{account}".rstrip('_')
+        with profile_job(job_name):
+            self.execute()
+
+    def execute(self):
+        """
+        根据 cmd_type 执行不同的 ADB 操作。
         """
         try:
             if not os.path.exists(self.adb_path):
@@ -60,6 +122,7 @@ class AdbWorker(QThread):
                     # 执行连接操作
                     self.update_signal.emit("开始执行连接检查...")
                     if simulator.check_connection():
+                        self.serial = simulator.emulator.serial
                         self.update_signal.emit("模拟器连接成功!")
                         self.finished_signal.emit(True, "模拟器连接成功")
                     else:
@@ -81,6 +144,7 @@ class AdbWorker(QThread):
                     # 执行连接检查
                     self.update_signal.emit("开始执行连接检查...")
                     if simulator.check_connection():
+                        self.serial = simulator.emulator.serial
                         self.update_signal.emit("模拟器已连接!")
                         self.finished_signal.emit(True, "模拟器已连接")
                     else:
@@ -91,19 +155,25 @@ class AdbWorker(QThread):
                     self.finished_signal.emit(False, f"检查错误: {str(e)}")
 
                 return
-            elif self.cmd_type == 'subscribe':
+            elif self.cmd_type in ('subscribe', 'scheduled_subscribe'):
                 self.update_signal.emit("开始全自动申购流程...")
                 
                 # 检查设备连接状态
                 self.update_signal.emit("检查设备连接状态...")
+                # 复用主窗口的SimulatorController，连接状态由心跳维护
+                simulator = self.simulator or SimulatorController()
+                simulator.emulator.set_cancel_token(self.cancel_token)
+                # SimpleEmulator 在账号之间复用，清掉上一个账号的结果，流程开始前取消或失败时不会记到本账号名下
+                simulator.emulator.last_run = None
                 try:
-                    # 使用SimulatorController，它现在也使用EmulatorImproved
-                    simulator = SimulatorController()
-                    if not simulator.check_adb_connection():
+                    if not simulator.ensure_connection():
                         self.update_signal.emit("ADB连接失败，尝试重新连接...")
                         connect_success = simulator.start_simulator()
+                        self.cancel_token.raise_if_cancelled()
                         if not connect_success:
                             self.update_signal.emit("无法连接到模拟器，请确认模拟器已启动")
+                            self.record_result({'outcome': 'failed', 'failed_step': 'connect',
+                                                'message': "无法连接到模拟器"})
                             self.finished_signal.emit(False, "无法连接到模拟器")
                             return
                     
@@ -113,23 +183,59 @@ class AdbWorker(QThread):
                     # 确保params是字典类型
                     if not isinstance(self.params, dict):
                         self.update_signal.emit("参数错误: 需要字典类型参数")
+                        self.record_result({'outcome': 'error', 'failed_step': 'params',
+                                            'message': "参数格式错误"})
                         self.finished_signal.emit(False, "参数格式错误")
                         return
                         
                     # 执行完整的申购流程
                     self.update_signal.emit(f"尝试为用户 {self.params.get('account', '未知账号')} 执行申购...")
-                    operation_success = simulator.subscription(self.params)
+                    if self.cmd_type == 'scheduled_subscribe':
+                        scheduler = SubscriptionScheduler(
+                            simulator.emulator,
+                            self.params['fire_at'],
+                            lead_seconds=self.params.get('lead_seconds', 90),
+                            use_device_clock=self.params.get('use_device_clock', False),
+                            force=self.params.get('force', False)
+                        )
+                        operation_success = scheduler.run(self.params)
+                        fire = (simulator.emulator.last_run or {}).get('fire')
+                        if fire:
+                            self.update_signal.emit(
+                                f"定时触发: 目标 {fire['target']}，延迟 {fire['send_delay_ms']} ms，"
+                                f"点击耗时 {fire['click_ms']} ms，设备时钟偏差 {fire['clock_offset_ms']} ms")
+                    else:
+                        operation_success = simulator.subscription(self.params,
+                                                                   force=self.params.get('force', False))
+                    # 定时申购在准备之前失败时没有 last_run
+                    self.record_result(simulator.emulator.last_run
+                                       or {'outcome': 'failed', 'failed_step': 'connect'})
                     
-                    if operation_success:
+                    last_run = simulator.emulator.last_run or {}
+                    if self.cancel_token.is_cancelled():
+                        self.update_signal.emit("申购已停止")
+                        self.finished_signal.emit(False, "申购已取消")
+                    elif last_run.get('outcome') == 'skipped':
+                        self.finished_signal.emit(True, f"{last_run.get('message')}，已跳过")
+                    elif operation_success:
                         self.update_signal.emit("申购操作执行完成")
                         self.finished_signal.emit(True, "申购操作已完成")
                     else:
                         self.update_signal.emit("申购操作执行失败")
                         self.finished_signal.emit(False, "申购流程执行失败")
                     
+                except Cancelled:
+                    self.record_result(simulator.emulator.last_run
+                                       or {'outcome': 'cancelled', 'failed_step': 'connect'})
+                    self.update_signal.emit("申购已停止")
+                    self.finished_signal.emit(False, "申购已取消")
                 except Exception as e:
+                    self.record_result({'outcome': 'error', 'message': str(e)})
                     self.update_signal.emit(f"执行出错: {str(e)}")
                     self.finished_signal.emit(False, f"操作失败: {str(e)}")
+                finally:
+                    # 下一个任务会设置新的取消标记，这里换回不会被取消的标记
+                    simulator.emulator.set_cancel_token()
                 
                 return
 
@@ -0,0 +1,55 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from device_pool import DevicePool, run_batch
+from report import OUTCOME_LABELS
+from cancellation import CancelToken
+
+
+class PoolWorker(QThread):
+    """进程模式的申购批次：每台设备一个子进程，本线程只负责分派任务和接收结果"""
+    update_signal = pyqtSignal(str)
+    finished_signal = pyqtSignal(bool, str)
+
+    def __init__(self, simulator_path, ports, tasks, execution, cancel_token=None, profiling_config=None):
+        """
+        初始化 PoolWorker。
+
+        Args:
+            simulator_path (str): 夜神模拟器 bin 目录。
+            ports (list): 设备的 adb 端口。
+            tasks (list): 每个账号的申购参数。
+            execution (dict): 执行方式配置（task_timeout、max_restarts）。
+            cancel_token (CancelToken, optional): 取消标记，界面停止申购时取消。 Defaults to None.
+            profiling_config (dict, optional): 传给子进程的性能分析配置。 Defaults to None.
+        """
+        super().__init__()
+        self.simulator_path = simulator_path
+        self.ports = ports
+        self.tasks = tasks
+        self.execution = execution
+        self.cancel_token = cancel_token or CancelToken()
+        self.profiling_config = profiling_config
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        pool = DevicePool(self.simulator_path, self.ports,
+                          task_timeout=self.execution['task_timeout'],
+                          max_restarts=self.execution['max_restarts'],
+                          options={'profiling': self.profiling_config})
+        try:
+            pool.start()
+            self.update_signal.emit(f"已为 {len(self.ports)} 台设备启动申购进程: {', '.join(pool.ports)}")
+            counts = run_batch(pool, self.tasks, self.update_signal.emit, self.cancel_token)
+        except Exception as e:
+            self.finished_signal.emit(False, f"进程池执行出错: {str(e)}")
+            return
+        finally:
+            pool.close()
+
+        summary = '，'.join(f"{OUTCOME_LABELS.get(outcome, '未处理')} {count}"
+                           for outcome, count in sorted(counts.items()))
+        if self.cancel_token.is_cancelled():
+            self.finished_signal.emit(False, f"申购已停止（{summary}）。")
+        else:
+            self.finished_signal.emit(True, f"所有账号申购流程执行完毕（{summary}）。")
@@ -0,0 +1,31 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+from report import generate_report
+from entity.base_model import db, db_writer
+
+
+class ReportWorker(QThread):
+    """后台生成批次报告，不阻塞界面"""
+    finished_signal = pyqtSignal(bool, str)
+
+    def __init__(self, run_id):
+        """
+        初始化 ReportWorker。
+
+        Args:
+            run_id (str): 批次ID。
+        """
+        super().__init__()
+        self.run_id = run_id
+
+    def run(self):
+        try:
+            # 先等写线程把本批次的结果写完；本线程的连接用完即关闭
+            db_writer.flush(timeout=30)
+            with db.connection_context():
+                result = generate_report(self.run_id)
+            if result:
+                self.finished_signal.emit(True, f"申购报告已生成: {result[0]}，{result[1]}")
+            else:
+                self.finished_signal.emit(False, "本批次没有申购记录，未生成报告")
+        except Exception as e:
+            self.finished_signal.emit(False, f"生成申购报告失败: {str(e)}")